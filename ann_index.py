@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+from array_bundle import save_array_bundle, open_array_bundle
+from embedding_io import load_embeddings, file_fingerprint
+
+# Índice IVF (inverted file) sobre los embeddings de ítems normalizados:
+# k-means agrupa los ítems en `nlist` listas y en servicio solo se puntúan
+# los ítems de las `nprobe` listas cuyos centroides son más cercanos.
+IVF_MAGIC = b'RECIVF01'
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def _assign(vectors, centroids, block_size=65536):
+    """Centroide más cercano (máximo producto escalar) de cada vector."""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        block = _normalize(np.asarray(vectors[start:start + block_size], dtype=np.float32))
+        labels[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def kmeans(vectors, n_clusters, iterations=20, seed=42):
+    """k-means esférico (similitud coseno) en NumPy puro."""
+    rng = np.random.default_rng(seed)
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+
+        # Recalcular centroides como la media normalizada de cada grupo
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=n_clusters)
+
+        # Reiniciar los grupos vacíos con puntos aleatorios
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+        centroids = _normalize(sums)
+
+    return centroids
+
+
+def build_ivf_index(item_embeddings, nlist=None, iterations=20, sample_size=None, seed=42):
+    """Entrena los centroides y reparte los ítems en listas invertidas."""
+    num_items = len(item_embeddings)
+    if nlist is None:
+        nlist = max(1, int(4 * np.sqrt(num_items)))
+    nlist = min(nlist, num_items)
+
+    # Entrenar k-means sobre una muestra (~256 puntos por lista)
+    sample_size = min(num_items, sample_size or nlist * 256)
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(num_items, sample_size, replace=False))
+    centroids = kmeans(item_embeddings[sample], nlist, iterations, seed)
+
+    # Asignar todos los ítems y agruparlos por lista
+    labels = _assign(item_embeddings, centroids)
+    list_rows = np.argsort(labels, kind='stable').astype(np.int64)
+    list_offsets = np.searchsorted(labels[list_rows], np.arange(nlist + 1)).astype(np.int64)
+
+    return {
+        'centroids': centroids.astype(np.float32),
+        'list_offsets': list_offsets,
+        'list_rows': list_rows
+    }
+
+
+def save_ivf_index(path, index, item_path):
+    """Guarda el índice IVF en `path` (mapeable en memoria).
+
+    Los metadatos identifican los embeddings de `item_path` con los que se
+    construyó, para no servir un índice de otro entrenamiento.
+    """
+    save_array_bundle(path, IVF_MAGIC, index, {
+        'nlist': len(index['centroids']),
+        'num_items': len(index['list_rows']),
+        'dim': int(index['centroids'].shape[1]),
+        'items': file_fingerprint(item_path)
+    })
+
+
+class IVFIndex:
+    """Búsqueda aproximada de ítems sobre un índice IVF."""
+
+    def __init__(self, centroids, list_offsets, list_rows, meta=None):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.meta = meta or {}
+
+    @classmethod
+    def open(cls, path):
+        arrays, meta = open_array_bundle(path, IVF_MAGIC)
+        return cls(np.asarray(arrays['centroids']), arrays['list_offsets'], arrays['list_rows'],
+                   meta)
+
+    def matches(self, item_path, num_items, dim):
+        """Indica si el índice se construyó con los embeddings de `item_path`."""
+        return (self.meta.get('num_items') == num_items and self.meta.get('dim') == dim and
+                self.meta.get('items') == file_fingerprint(item_path))
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def candidates(self, query, nprobe):
+        """Filas de ítems de las `nprobe` listas más cercanas a `query`."""
+        nprobe = min(nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([
+            self.list_rows[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes
+        ])
+
+
+def recall_at_k(engine, index, nprobe_values, top_k=10, num_queries=1000, seed=42):
+    """Compara la búsqueda IVF con la exacta: recall@K y latencia por nprobe."""
+    rng = np.random.default_rng(seed)
+    num_users = len(engine.user_ids)
+    rows = rng.choice(num_users, min(num_queries, num_users), replace=False)
+    users = engine.user_vectors(rows)
+
+    start = time.perf_counter()
+    exact = [set(engine.top_items(user, top_k)) for user in users]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(users)
+
+    report = {'top_k': top_k, 'queries': len(users), 'exact_ms': exact_ms, 'nprobe': []}
+    for nprobe in nprobe_values:
+        start = time.perf_counter()
+        approx = [engine.top_items(user, top_k, ann_index=index, nprobe=nprobe) for user in users]
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(users)
+
+        hits = sum(len(truth.intersection(found)) for truth, found in zip(exact, approx))
+        report['nprobe'].append({
+            'nprobe': nprobe,
+            'recall': hits / max(sum(len(truth) for truth in exact), 1),
+            'latency_ms': elapsed_ms
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Construye el índice IVF de ítems')
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--nlist', type=int, default=None,
+                        help='Número de listas (por defecto 4 * sqrt(ítems))')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--evaluate', action='store_true',
+                        help='Mide recall@K frente a la búsqueda exacta')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+
+    item_path = os.path.join(args.models_dir, 'item_embeddings.bin')
+    index_path = os.path.join(args.models_dir, 'item_ivf.bin')
+
+    print("Cargando embeddings de ítems...")
+    _, item_embeddings = load_embeddings(item_path)
+
+    print(f"Construyendo índice IVF sobre {len(item_embeddings)} ítems...")
+    start = time.perf_counter()
+    index = build_ivf_index(item_embeddings, args.nlist, args.iterations)
+    save_ivf_index(index_path, index, item_path)
+    print(f"Índice con {len(index['centroids'])} listas guardado en {index_path} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    if args.evaluate:
+        from scoring_engine import ScoringEngine
+
+        engine = ScoringEngine(os.path.join(args.models_dir, 'user_embeddings.bin'), item_path)
+        report = recall_at_k(engine, IVFIndex.open(index_path), args.nprobe, args.top_k)
+        print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
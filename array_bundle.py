@@ -0,0 +1,94 @@
+import json
+import struct
+import numpy as np
+
+from atomic_file import atomic_write
+
+# Contenedor binario de arrays NumPy mapeables en memoria:
+#   magic (8 bytes) + uint32 longitud de la cabecera JSON + cabecera JSON
+#   arrays contiguos, cada uno alineado a 64 bytes
+# La cabecera describe cada array como {"dtype", "shape", "offset"} y puede
+# llevar metadatos adicionales en "meta".
+ALIGNMENT = 64
+_LENGTH = struct.Struct('<I')
+
+
+def _align(offset, alignment=ALIGNMENT):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _layout(magic, descriptions, meta):
+    """Cabecera y posición de cada array a partir de {nombre: (dtype, shape)}."""
+    # Los offsets dependen de la longitud de la cabecera: repetir hasta que
+    # la cabecera quepa en el espacio reservado (se rellena con espacios)
+    entries = {}
+    header = b''
+    while True:
+        offset = _align(len(magic) + _LENGTH.size + len(header))
+        for name, (dtype, shape) in descriptions.items():
+            dtype = np.dtype(dtype)
+            entries[name] = {
+                'dtype': dtype.newbyteorder('<').str,
+                'shape': list(shape),
+                'offset': offset
+            }
+            offset = _align(offset + dtype.itemsize * int(np.prod(shape)))
+        encoded = json.dumps({'arrays': entries, 'meta': meta or {}}).encode('utf-8')
+        if len(encoded) <= len(header):
+            return encoded.ljust(len(header)), entries
+        header = encoded
+
+
+def save_array_bundle(path, magic, arrays, meta=None):
+    """Guarda varios arrays en un único archivo mapeable en memoria."""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    header, entries = _layout(magic, {name: (array.dtype, array.shape)
+                                      for name, array in arrays.items()}, meta)
+
+    with atomic_write(path) as f:
+        f.write(magic)
+        f.write(_LENGTH.pack(len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.write(b'\0' * (entries[name]['offset'] - f.tell()))
+            f.write(array.astype(entries[name]['dtype'], copy=False).tobytes())
+
+
+def allocate_array_bundle(path, magic, descriptions, meta=None):
+    """Crea un archivo de arrays a ceros ({nombre: (dtype, shape)}).
+
+    Sirve para escribir arrays que no caben en memoria por partes (incluso
+    desde varios procesos) con `open_array_bundle(path, magic, mode='r+')`.
+    No es atómico: conviene crearlo con otro nombre y renombrarlo al acabar.
+    """
+    header, entries = _layout(magic, descriptions, meta)
+    size = max([entry['offset'] + np.dtype(entry['dtype']).itemsize * int(np.prod(entry['shape']))
+                for entry in entries.values()] + [len(magic) + _LENGTH.size + len(header)])
+    with open(path, 'wb') as f:
+        f.write(magic)
+        f.write(_LENGTH.pack(len(header)))
+        f.write(header)
+        f.truncate(size)
+
+
+def open_array_bundle(path, magic, mode='r'):
+    """Abre un archivo de arrays sin copiarlos.
+
+    Devuelve un dict nombre -> np.memmap (de solo lectura salvo con
+    `mode='r+'`) y los metadatos.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"Formato de archivo no reconocido: {path}")
+        (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+        header = json.loads(f.read(length).decode('utf-8'))
+
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        shape = tuple(entry['shape'])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=entry['dtype'])
+        else:
+            arrays[name] = np.memmap(path, dtype=entry['dtype'], mode=mode,
+                                     offset=entry['offset'], shape=shape)
+    return arrays, header.get('meta', {})
@@ -0,0 +1,22 @@
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='wb', **kwargs):
+    """Escribe `path` a través de un archivo temporal y un rename atómico.
+
+    Un lector nunca ve el archivo a medio escribir: o ve la versión anterior
+    o la nueva completa. Si la escritura falla, el temporal se elimina.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import gzip
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from generate_test_data import generate_model
+
+# Benchmark reproducible del pipeline: ingesta -> modelo -> servicio.
+# Cada medida se ejecuta en un proceso nuevo para que el pico de memoria
+# (RSS) corresponda solo a esa medida. Los resultados se guardan en JSON
+# y, con --compare, se contrastan con una ejecución anterior.
+
+DEFAULT_SIZES = '10000x32,100000x64,1000000x128'
+DEFAULT_REVIEWS = os.path.join('data', 'Magazine_Subscriptions_5.json',
+                               'Magazine_Subscriptions_5.json')
+
+
+def peak_rss_mb(children=False):
+    """Pico de memoria residente del proceso actual en MB (None si no se puede medir).
+
+    Con `children=True`, el mayor pico de los procesos hijos ya terminados.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def bench_serving(model_dir, num_queries, batch_size, top_k, seed):
+    """Carga del modelo, latencia por consulta y rendimiento por lotes."""
+    from scoring_engine import ScoringEngine
+
+    start = time.perf_counter()
+    engine = ScoringEngine(os.path.join(model_dir, 'user_embeddings.bin'),
+                           os.path.join(model_dir, 'item_embeddings.bin'),
+                           block_size=batch_size)
+    engine.get_recommendations(engine.user_ids[0], top_k)
+    load_time = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    users = [engine.user_ids[i] for i in rng.integers(0, len(engine.user_ids), num_queries)]
+
+    latencies = np.empty(num_queries)
+    for i, user_id in enumerate(users):
+        start = time.perf_counter()
+        engine.get_recommendations(user_id, top_k)
+        latencies[i] = time.perf_counter() - start
+
+    # recommend_batch puntúa cada usuario una sola vez: el rendimiento se
+    # mide en usuarios distintos, no en IDs pedidos
+    unique_users = len(set(users))
+    start = time.perf_counter()
+    engine.recommend_batch(users, top_k)
+    batch_time = time.perf_counter() - start
+
+    return {
+        'load_time_s': load_time,
+        'latency_p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'latency_p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'batch_unique_users': unique_users,
+        'batch_users_per_s': unique_users / batch_time,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def parse_json_gz(path):
+    """Lector de referencia: una llamada a json.loads por línea del .json.gz."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def bench_ingestion(loader, path):
+    """Filas por segundo de uno de los cargadores de reseñas."""
+    start = time.perf_counter()
+    if loader == 'train_model.load_data':
+        import train_model
+        rows = len(train_model.load_data(path))
+    elif loader == 'benchmark.parse_json_gz':
+        rows = sum(1 for _ in parse_json_gz(path))
+    elif loader == 'ingest.parallel_interactions':
+        import ingest
+        rows = len(ingest.parallel_interactions(path))
+    else:
+        raise ValueError(f"Cargador desconocido: {loader}")
+    elapsed = time.perf_counter() - start
+
+    return {
+        'loader': loader,
+        'rows': rows,
+        'time_s': elapsed,
+        'rows_per_s': rows / elapsed,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def run_isolated(func, *args):
+    """Ejecuta `func` en un proceso nuevo."""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(func, *args).result()
+
+
+def parse_sizes(text):
+    sizes = []
+    for part in text.split(','):
+        items, dim = part.lower().split('x')
+        sizes.append((int(float(items)), int(dim)))
+    return sizes
+
+
+def compare(results, baseline_path, max_regression):
+    """Compara con una ejecución anterior; devuelve las regresiones encontradas."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    # (clave, métrica, mayor es mejor)
+    metrics = [('load_time_s', False), ('latency_p50_ms', False), ('latency_p99_ms', False),
+               ('batch_users_per_s', True)]
+    previous = {(r['items'], r['dim']): r for r in baseline.get('serving', [])}
+    regressions = []
+    for result in results['serving']:
+        old = previous.get((result['items'], result['dim']))
+        if old is None:
+            continue
+        for metric, higher_is_better in metrics:
+            change = (result[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+            worse = -change if higher_is_better else change
+            if worse > max_regression:
+                regressions.append(f"{result['items']}x{result['dim']} {metric}: "
+                                   f"{old[metric]:.4g} -> {result[metric]:.4g}")
+
+    previous = {r['loader']: r for r in baseline.get('ingestion', [])}
+    for result in results['ingestion']:
+        old = previous.get(result['loader'])
+        if old and (old['rows_per_s'] - result['rows_per_s']) / old['rows_per_s'] > max_regression:
+            regressions.append(f"{result['loader']} rows_per_s: "
+                               f"{old['rows_per_s']:.4g} -> {result['rows_per_s']:.4g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de ingesta, carga y servicio')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='Tamaños de modelo "ítems x dim" separados por comas, p. ej. 1e4x32,1e7x256')
+    parser.add_argument('--users', type=int, default=10000, help='Usuarios del modelo sintético')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reviews', default=DEFAULT_REVIEWS,
+                        help='Archivo de reseñas para medir la ingesta')
+    parser.add_argument('--reviews-repeat', type=int, default=20,
+                        help='Veces que se replica el archivo de reseñas')
+    parser.add_argument('--output', default=None,
+                        help='Archivo JSON de resultados (por defecto benchmarks/<fecha>.json)')
+    parser.add_argument('--compare', default=None, help='JSON de una ejecución anterior')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'config': vars(args),
+        'serving': [],
+        'ingestion': []
+    }
+
+    workdir = tempfile.mkdtemp(prefix='recommender_bench_')
+    try:
+        for num_items, dim in parse_sizes(args.sizes):
+            print(f"Modelo sintético: {args.users} usuarios, {num_items} ítems, dim={dim}...")
+            model_dir = os.path.join(workdir, f'{num_items}x{dim}')
+            generate_model(model_dir, args.users, num_items, dim, args.seed)
+
+            result = run_isolated(bench_serving, model_dir, args.queries,
+                                  args.batch_size, args.top_k, args.seed)
+            result.update({'users': args.users, 'items': num_items, 'dim': dim})
+            results['serving'].append(result)
+            print(f"  carga {result['load_time_s']:.3f}s, p50 {result['latency_p50_ms']:.3f}ms, "
+                  f"p99 {result['latency_p99_ms']:.3f}ms, "
+                  f"lotes {result['batch_users_per_s']:,.0f} usuarios distintos/s")
+            shutil.rmtree(model_dir)
+
+        if os.path.exists(args.reviews):
+            # Replicar el archivo de reseñas (en texto y en .gz)
+            plain_path = os.path.join(workdir, 'reviews.json')
+            gz_path = plain_path + '.gz'
+            with open(args.reviews, 'rb') as f:
+                reviews = f.read()
+            if not reviews.endswith(b'\n'):
+                reviews += b'\n'
+            with open(plain_path, 'wb') as f, gzip.open(gz_path, 'wb') as gz:
+                for _ in range(args.reviews_repeat):
+                    f.write(reviews)
+                    gz.write(reviews)
+
+            for loader, path in [('train_model.load_data', plain_path),
+                                 ('benchmark.parse_json_gz', gz_path),
+                                 ('ingest.parallel_interactions', gz_path)]:
+                print(f"Ingesta: {loader}...")
+                result = run_isolated(bench_ingestion, loader, path)
+                results['ingestion'].append(result)
+                print(f"  {result['rows_per_s']:,.0f} filas/s")
+        else:
+            print(f"ADVERTENCIA: no se encontró {args.reviews}; se omite la ingesta")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join('benchmarks', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    print(f"Resultados guardados en {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_regression)
+        if regressions:
+            print("Regresiones detectadas:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("Sin regresiones respecto a la ejecución anterior")
+
+
+if __name__ == "__main__":
+    main()
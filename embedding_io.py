@@ -0,0 +1,284 @@
+import os
+import struct
+import hashlib
+import functools
+import numpy as np
+
+from atomic_file import atomic_write
+from id_index import index_path, save_id_index
+
+# Formato v2 (little-endian):
+#   cabecera fija de 64 bytes (ver HEADER)
+#   tabla de IDs en `ids_offset`: uint64[count + 1] offsets + bytes UTF-8
+#   matriz (count, dim) en `matrix_offset`, alineada a 64 bytes, en float32,
+#   float16 o int8 según el campo `dtype`
+#   con int8: escala float32 por fila en `scales_offset` (fila = q * escala)
+#   norma L2 float32 de cada fila almacenada en `norms_offset`; el bit
+#   FLAG_NORMALIZED de `flags` indica que todas las filas tienen norma 1
+MAGIC = b'RECEMB02'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<8sIIQIIQQQQ')
+ALIGNMENT = 64
+
+DTYPE_FLOAT32 = 0
+DTYPE_FLOAT16 = 1
+DTYPE_INT8 = 2
+
+FLAG_NORMALIZED = 1
+# Tolerancia para considerar que una fila tiene norma unitaria
+NORM_TOLERANCE = 1e-5
+
+# Nombre -> (código en la cabecera, tipo de numpy)
+STORAGE_DTYPES = {
+    'float32': (DTYPE_FLOAT32, np.dtype('<f4')),
+    'float16': (DTYPE_FLOAT16, np.dtype('<f2')),
+    'int8': (DTYPE_INT8, np.dtype('i1')),
+}
+_NUMPY_DTYPES = {code: dtype for code, dtype in STORAGE_DTYPES.values()}
+
+
+def _align(offset, alignment=ALIGNMENT):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class IdTable:
+    """Tabla de IDs de un archivo v2; decodifica cada ID bajo demanda."""
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        return bytes(self._blob[start:end]).decode('utf-8')
+
+    def __iter__(self):
+        offsets = np.asarray(self._offsets)
+        blob = bytes(self._blob)
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield blob[start:end].decode('utf-8')
+
+
+def quantize(embeddings, dtype='float32'):
+    """Convierte una matriz float32 al tipo de almacenamiento `dtype`.
+
+    Devuelve la matriz cuantizada y, para int8, la escala simétrica de cada
+    fila (max |x| / 127); para float32 y float16 la escala es None.
+    """
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Tipo de almacenamiento no soportado: {dtype}")
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype != 'int8':
+        return embeddings.astype(STORAGE_DTYPES[dtype][1]), None
+
+    scales = np.abs(embeddings).max(axis=1) / 127.0 if len(embeddings) else np.zeros(0)
+    scales = scales.astype(np.float32)
+    safe = np.where(scales > 0, scales, 1.0)[:, None]
+    quantized = np.clip(np.rint(embeddings / safe), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def dequantize(matrix, scales=None):
+    """Matriz float32 a partir de la almacenada (inversa de `quantize`)."""
+    result = np.asarray(matrix, dtype=np.float32)
+    if scales is not None:
+        result = result * np.asarray(scales, dtype=np.float32)[:, None]
+    return result
+
+
+def save_embeddings(path, embeddings, ids, with_index=True, dtype='float32'):
+    """Guarda los embeddings en formato v2 (IDs en un único bloque).
+
+    `dtype` elige el almacenamiento de la matriz: 'float32', 'float16' o
+    'int8' (con una escala por fila). Junto a la matriz se guardan las normas
+    de las filas y, si todas valen 1, el flag FLAG_NORMALIZED. Con
+    `with_index` también escribe el índice ID -> fila (`.idx`). Cada archivo
+    se escribe en un temporal y se renombra de forma atómica.
+    """
+    matrix, scales = quantize(embeddings, dtype)
+    matrix = np.ascontiguousarray(matrix)
+    num_items = len(ids)
+    dim = matrix.shape[1] if num_items > 0 else 0
+
+    # Normas de las filas tal como quedan almacenadas
+    norms = np.linalg.norm(dequantize(matrix, scales), axis=1).astype('<f4')
+    flags = 0
+    if num_items > 0 and np.all(np.abs(norms - 1.0) <= NORM_TOLERANCE):
+        flags |= FLAG_NORMALIZED
+
+    # Tabla de IDs: offsets acumulados y un único blob contiguo
+    encoded = [str(item_id).encode('utf-8') for item_id in ids]
+    offsets = np.zeros(num_items + 1, dtype='<u8')
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = b''.join(encoded)
+
+    ids_offset = HEADER.size
+    matrix_offset = _align(ids_offset + offsets.nbytes + len(blob))
+    scales_offset = _align(matrix_offset + matrix.nbytes) if scales is not None else 0
+    norms_offset = _align(max(matrix_offset + matrix.nbytes,
+                              scales_offset + (scales.nbytes if scales is not None else 0)))
+
+    with atomic_write(path) as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, STORAGE_DTYPES[dtype][0], num_items, dim,
+                            flags, ids_offset, matrix_offset, scales_offset, norms_offset))
+        f.write(offsets.tobytes())
+        f.write(blob)
+        f.write(b'\0' * (matrix_offset - f.tell()))
+        f.write(matrix.tobytes())
+        if scales is not None:
+            f.write(b'\0' * (scales_offset - f.tell()))
+            f.write(scales.astype('<f4').tobytes())
+        f.write(b'\0' * (norms_offset - f.tell()))
+        f.write(norms.tobytes())
+
+    if with_index:
+        save_id_index(index_path(path), ids)
+
+
+def open_quantized_embeddings(path):
+    """Abre un archivo v2 sin copiar ni convertir la matriz.
+
+    Devuelve la tabla de IDs (perezosa), la matriz mapeada en memoria en su
+    tipo de almacenamiento y las escalas por fila (None salvo en int8).
+    """
+    (_, _, dtype, num_items, dim, _flags,
+     ids_offset, matrix_offset, scales_offset, _) = _read_header(path)
+
+    matrix_dtype = _NUMPY_DTYPES[dtype]
+    if num_items == 0:
+        scales = np.zeros(0, dtype='<f4') if dtype == DTYPE_INT8 else None
+        return (IdTable(np.zeros(1, dtype='<u8'), b''),
+                np.zeros((0, dim), dtype=matrix_dtype), scales)
+
+    offsets = np.memmap(path, dtype='<u8', mode='r', offset=ids_offset,
+                        shape=(num_items + 1,))
+    blob_offset = ids_offset + offsets.nbytes
+    blob_size = int(offsets[-1])
+    blob = (np.memmap(path, dtype=np.uint8, mode='r', offset=blob_offset, shape=(blob_size,))
+            if blob_size else b'')
+    matrix = np.memmap(path, dtype=matrix_dtype, mode='r', offset=matrix_offset,
+                       shape=(num_items, dim))
+    scales = None
+    if dtype == DTYPE_INT8:
+        scales = np.memmap(path, dtype='<f4', mode='r', offset=scales_offset,
+                           shape=(num_items,))
+    return IdTable(offsets, blob), matrix, scales
+
+
+def _read_header(path):
+    """Lee y valida la cabecera de un archivo v2."""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"Archivo de embeddings truncado: {path}")
+
+    fields = HEADER.unpack(header)
+    magic, version, dtype = fields[:3]
+    if magic != MAGIC:
+        raise ValueError(f"No es un archivo de embeddings v2: {path}")
+    if version != FORMAT_VERSION or dtype not in _NUMPY_DTYPES:
+        raise ValueError(f"Versión o tipo de datos no soportado en {path}")
+    if dtype == DTYPE_INT8 and not fields[8]:
+        raise ValueError(f"Archivo int8 sin escalas por fila: {path}")
+    return fields
+
+
+def file_fingerprint(path):
+    """Huella de un archivo de embeddings: tamaño y hash de todo su contenido.
+
+    La guardan los archivos derivados (índice IVF, tablas precalculadas,
+    checkpoint) para detectar que se generaron con otros embeddings. Se hashea
+    el archivo entero porque un reentrenamiento con los mismos IDs solo
+    cambia la matriz y las normas. El resultado se reutiliza mientras el
+    archivo no cambie (mismo inodo, tamaño y fecha de modificación).
+    """
+    st = os.stat(path)
+    return dict(_fingerprint(os.path.abspath(path), st.st_ino, st.st_size, st.st_mtime_ns))
+
+
+@functools.lru_cache(maxsize=64)
+def _fingerprint(path, _inode, size, _mtime_ns):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return {'size': size, 'blake2b': digest.hexdigest()}
+
+
+def open_norms(path):
+    """Normas guardadas de las filas y si la matriz está normalizada.
+
+    Devuelve (normas, normalizada). Las normas son None en archivos v1 o v2
+    escritos antes de guardarlas; en ese caso el llamante debe calcularlas.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None, False
+
+    (_, _, _, num_items, _, flags, _, _, _, norms_offset) = _read_header(path)
+    if not norms_offset:
+        return None, False
+    norms = (np.memmap(path, dtype='<f4', mode='r', offset=norms_offset, shape=(num_items,))
+             if num_items else np.zeros(0, dtype='<f4'))
+    return norms, bool(flags & FLAG_NORMALIZED)
+
+
+def open_embeddings(path):
+    """Abre un archivo v2 como matriz float32.
+
+    Con almacenamiento float32 la matriz es un np.memmap de solo lectura (sin
+    copia); con float16 o int8 se descuantiza en memoria.
+    """
+    ids, matrix, scales = open_quantized_embeddings(path)
+    if matrix.dtype == np.float32:
+        return ids, matrix
+    return ids, dequantize(matrix, scales)
+
+
+def load_embeddings(path):
+    """Carga un archivo de embeddings en formato v1 o v2.
+
+    Devuelve los IDs y la matriz de embeddings float32 con forma (n, dim).
+    Los archivos v2 float32 se mapean en memoria sin copiar; los v1
+    (cabecera + IDs + matriz float32) se leen completos.
+    """
+    ids, matrix, scales = load_quantized_embeddings(path)
+    if matrix.dtype == np.float32:
+        return ids, matrix
+    return ids, dequantize(matrix, scales)
+
+
+def load_quantized_embeddings(path):
+    """Como `load_embeddings`, pero sin convertir la matriz a float32.
+
+    Devuelve los IDs, la matriz en su tipo de almacenamiento y las escalas
+    por fila (None salvo en int8).
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            return open_quantized_embeddings(path)
+        f.seek(0)
+
+        # Número de elementos y dimensión
+        num_items, dim = struct.unpack('<II', f.read(8))
+
+        # Leer IDs
+        ids = []
+        for _ in range(num_items):
+            (id_len,) = struct.unpack('<I', f.read(4))
+            ids.append(f.read(id_len).decode('utf-8'))
+
+        # Leer embeddings
+        embeddings = np.fromfile(f, dtype='<f4', count=num_items * dim)
+
+    if embeddings.size != num_items * dim:
+        raise ValueError(f"Archivo de embeddings truncado: {path}")
+
+    return ids, embeddings.reshape(num_items, dim), None
@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.sparse import csr_matrix
+
+import embedding_io
+import train_model
+from process_magazine_data import average_ratings, center_ratings, generate_embeddings
+from ann_index import build_ivf_index, save_ivf_index, IVFIndex
+from benchmark import peak_rss_mb
+from scoring_engine import ScoringEngine, SCORING_METRICS
+from seen_items import SEEN_FILE, SeenItems, save_seen_items
+
+# Evaluación offline de la calidad de las recomendaciones:
+#   reseñas (train_model.load_data) -> partición train/test -> entrenamiento
+#   -> embeddings exportados -> recall@K, NDCG@K y MAP@K de los usuarios de test
+# El ranking lo calcula el mismo ScoringEngine que en servicio (métrica,
+# almacenamiento float16/int8 e IVF incluidos) y excluye los ítems de train.
+
+SPLIT_METHODS = ('time', 'leave_k_out')
+TRAINING_METHODS = ('als', 'svd')
+TEST_FILE = 'test_items.bin'
+IVF_FILE = 'item_ivf.bin'
+
+# Motor y relevantes de test de cada proceso de evaluación (los fija `_init_worker`)
+_ENGINE = None
+_TEST = None
+
+
+def split_interactions(interactions, method='time', test_fraction=0.2, holdout=1, seed=42):
+    """Máscara booleana de las interacciones que van a test.
+
+    'time': las posteriores al cuantil `1 - test_fraction` de las fechas.
+    'leave_k_out': las `holdout` más recientes de cada usuario con más de
+    `holdout` interacciones (al azar si no hay fechas).
+    """
+    timestamps = interactions.timestamps
+    if method == 'time':
+        if timestamps is None:
+            raise ValueError("La partición temporal necesita las fechas de las reseñas")
+        return timestamps > np.quantile(timestamps, 1 - test_fraction)
+    if method != 'leave_k_out':
+        raise ValueError(f"Partición desconocida: {method}")
+
+    # Ordenar por usuario y fecha; los empates se deshacen al azar
+    users = interactions.user_codes
+    tiebreak = np.random.default_rng(seed).random(len(users))
+    keys = [tiebreak, users] if timestamps is None else [tiebreak, timestamps, users]
+    order = np.lexsort(keys)
+
+    counts = np.bincount(users, minlength=len(interactions.user_ids))
+    sorted_users = users[order]
+    # Posición contando desde la interacción más reciente de cada usuario (0 = la última)
+    from_end = np.cumsum(counts)[sorted_users] - 1 - np.arange(len(order))
+    test = np.zeros(len(order), dtype=bool)
+    test[order] = (from_end < holdout) & (counts[sorted_users] > holdout)
+    return test
+
+
+def build_matrices(interactions, test_mask, method='als'):
+    """Matriz de entrenamiento y matriz binaria de ítems relevantes de test.
+
+    Para ALS la de train es como en `train_model.prepare_data`; para SVD se
+    promedian y centran las valoraciones como en `process_magazine_data`. De
+    test se descartan los pares ya presentes en train y los ítems sin
+    ninguna interacción de train (el modelo no los conoce).
+    """
+    shape = (len(interactions.user_ids), len(interactions.item_ids))
+    users, items, ratings = interactions.user_codes, interactions.item_codes, interactions.ratings
+    train = ~test_mask
+
+    if method == 'als':
+        train_matrix = csr_matrix((ratings[train], (users[train], items[train])), shape=shape)
+    else:
+        train_matrix, _ = center_ratings(
+            average_ratings(users[train], items[train], ratings[train], shape))
+
+    train_keys = np.unique(users[train].astype(np.int64) * shape[1] + items[train])
+    test_keys = np.unique(users[test_mask].astype(np.int64) * shape[1] + items[test_mask])
+    known_items = np.bincount(items[train], minlength=shape[1]) > 0
+    kept = ~np.isin(test_keys, train_keys, assume_unique=True) & known_items[test_keys % shape[1]]
+
+    test_keys = test_keys[kept]
+    test_matrix = csr_matrix(
+        (np.ones(len(test_keys), dtype=np.float32), (test_keys // shape[1], test_keys % shape[1])),
+        shape=shape)
+    return train_matrix, test_matrix, int(np.count_nonzero(~kept))
+
+
+def train_embeddings(train_matrix, method='als', factors=50, iterations=15, regularization=0.01,
+                     K1=100, B=0.8, num_threads=0):
+    """Embeddings de usuarios e ítems con el entrenamiento del pipeline elegido.
+
+    `iterations`, `regularization`, `K1`, `B` y `num_threads` solo se usan con ALS.
+    """
+    if method == 'als':
+        model = train_model.train_model(train_matrix, factors, iterations, regularization,
+                                        K1, B, num_threads)
+        return model.user_factors, model.item_factors
+    user_embeddings, item_embeddings, _, _ = generate_embeddings(
+        train_matrix, None, None, n_components=factors)
+    return user_embeddings, item_embeddings
+
+
+def ranking_metrics(ranked, relevant_positions, relevant_items, k_values):
+    """Sumas de recall@K, NDCG@K y AP@K de un bloque de usuarios.
+
+    `ranked` son las filas de ítems recomendadas (usuarios x max(K), -1 en
+    los huecos) y los relevantes llegan como pares (posición en el bloque,
+    fila de ítem). Todo se calcula con operaciones sobre la matriz de
+    aciertos, sin bucles por usuario.
+    """
+    num_users, max_k = ranked.shape
+    num_relevant = np.bincount(relevant_positions, minlength=num_users)
+    width = int(max(ranked.max(initial=0), relevant_items.max(initial=0))) + 1
+
+    relevant_keys = relevant_positions.astype(np.int64) * width + relevant_items
+    ranked_keys = np.arange(num_users, dtype=np.int64)[:, None] * width + ranked
+    hits = np.isin(ranked_keys, relevant_keys) & (ranked >= 0)
+
+    discounts = 1.0 / np.log2(np.arange(2, max_k + 2))
+    ideal_dcg = np.cumsum(discounts)
+    precision = np.cumsum(hits, axis=1) / np.arange(1, max_k + 1)
+
+    sums = {}
+    for k in k_values:
+        top = hits[:, :k]
+        ideal = np.minimum(num_relevant, k)
+        sums[k] = {
+            'recall': float(np.sum(top.sum(axis=1) / num_relevant)),
+            'ndcg': float(np.sum((top @ discounts[:k]) / ideal_dcg[ideal - 1])),
+            'map': float(np.sum((precision[:, :k] * top).sum(axis=1) / ideal))
+        }
+    return sums
+
+
+def _init_worker(model_dir, metric, nprobe, split_dir=None):
+    global _ENGINE, _TEST
+    # Los ítems de train y de test pueden estar en otra carpeta (compartida
+    # entre varios modelos de la misma partición)
+    split_dir = split_dir or model_dir
+    # Los archivos se mapean en memoria: todos los procesos comparten las páginas
+    ann_index = IVFIndex.open(os.path.join(model_dir, IVF_FILE)) if nprobe else None
+    _ENGINE = ScoringEngine(os.path.join(model_dir, 'user_embeddings.bin'),
+                            os.path.join(model_dir, 'item_embeddings.bin'),
+                            ann_index=ann_index, nprobe=nprobe or 8, metric=metric,
+                            shards=1, seen_items=SeenItems(os.path.join(split_dir, SEEN_FILE)))
+    _TEST = SeenItems(os.path.join(split_dir, TEST_FILE))
+
+
+def _evaluate_users(user_rows, k_values, block_size):
+    """Sumas de las métricas de un grupo de usuarios de test."""
+    ranked = _ENGINE.top_item_rows(user_rows, max(k_values), block_size)
+    positions, items = _TEST.rows_coo(user_rows)
+    return len(user_rows), ranking_metrics(ranked, positions, items, k_values)
+
+
+def evaluate_model(model_dir, test_users, k_values=(10,), metric='cosine', nprobe=None,
+                   workers=None, block_size=1024, split_dir=None):
+    """Media de recall, NDCG y MAP@K de `test_users` repartidos entre procesos."""
+    workers = workers or os.cpu_count() or 1
+    chunks = [test_users[start:start + block_size]
+              for start in range(0, len(test_users), block_size)]
+    totals = {k: {'recall': 0.0, 'ndcg': 0.0, 'map': 0.0} for k in k_values}
+
+    def add(result):
+        _, sums = result
+        for k, values in sums.items():
+            for name, value in values.items():
+                totals[k][name] += value
+
+    if workers <= 1:
+        _init_worker(model_dir, metric, nprobe, split_dir)
+        for chunk in chunks:
+            add(_evaluate_users(chunk, k_values, block_size))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_dir, metric, nprobe, split_dir)) as executor:
+            for result in executor.map(_evaluate_users, chunks,
+                                       [k_values] * len(chunks), [block_size] * len(chunks)):
+                add(result)
+
+    num_users = max(len(test_users), 1)
+    return {str(k): {name: value / num_users for name, value in values.items()}
+            for k, values in totals.items()}
+
+
+def run_evaluation(data_path, model_dir, split='time', method='als', test_fraction=0.2,
+                   holdout=1, factors=50, iterations=15, k_values=(10,), metric='cosine',
+                   dtype='float32', nprobe=None, workers=None, block_size=1024, seed=42):
+    """Partición, entrenamiento y evaluación completos; devuelve el informe."""
+    start = time.perf_counter()
+    timings = {}
+
+    print("Cargando datos...")
+    interactions = train_model.load_data(data_path)
+    timings['load_s'] = time.perf_counter() - start
+
+    step = time.perf_counter()
+    test_mask = split_interactions(interactions, split, test_fraction, holdout, seed)
+    train_matrix, test_matrix, dropped = build_matrices(interactions, test_mask, method)
+    has_train = np.diff(train_matrix.indptr) > 0
+    test_users = np.flatnonzero((np.diff(test_matrix.indptr) > 0) & has_train)
+    timings['split_s'] = time.perf_counter() - step
+
+    print(f"Entrenando ({method}) con {int((~test_mask).sum())} interacciones...")
+    step = time.perf_counter()
+    user_embeddings, item_embeddings = train_embeddings(train_matrix, method, factors, iterations)
+    timings['train_s'] = time.perf_counter() - step
+
+    # Exportar como en producción para puntuar con el mismo motor
+    embedding_io.save_embeddings(os.path.join(model_dir, 'user_embeddings.bin'),
+                                 user_embeddings, interactions.user_ids, dtype=dtype)
+    embedding_io.save_embeddings(os.path.join(model_dir, 'item_embeddings.bin'),
+                                 item_embeddings, interactions.item_ids, dtype=dtype)
+    save_seen_items(os.path.join(model_dir, SEEN_FILE), train_matrix)
+    save_seen_items(os.path.join(model_dir, TEST_FILE), test_matrix)
+    if nprobe:
+        save_ivf_index(os.path.join(model_dir, IVF_FILE),
+                       build_ivf_index(np.asarray(item_embeddings, dtype=np.float32)),
+                       os.path.join(model_dir, 'item_embeddings.bin'))
+
+    print(f"Evaluando {len(test_users)} usuarios de test...")
+    step = time.perf_counter()
+    results = evaluate_model(model_dir, test_users, k_values, metric, nprobe, workers, block_size)
+    timings['evaluate_s'] = time.perf_counter() - step
+    timings['wall_s'] = time.perf_counter() - start
+
+    return {
+        'config': {
+            'data': data_path, 'split': split, 'method': method,
+            'test_fraction': test_fraction, 'holdout': holdout, 'factors': factors,
+            'iterations': iterations, 'metric': metric, 'dtype': dtype, 'nprobe': nprobe,
+            'workers': workers or os.cpu_count(), 'seed': seed
+        },
+        'data': {
+            'interactions': len(interactions),
+            'users': len(interactions.user_ids),
+            'items': len(interactions.item_ids),
+            'train_interactions': int((~test_mask).sum()),
+            'test_pairs': int(test_matrix.nnz),
+            'dropped_test_pairs': dropped,
+            'test_users': len(test_users)
+        },
+        'metrics': results,
+        'timings': timings,
+        'peak_rss_mb': {'main': peak_rss_mb(), 'workers': peak_rss_mb(children=True)}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evalúa la calidad de las recomendaciones')
+    parser.add_argument('--data', default=os.path.join(
+        'data', 'Magazine_Subscriptions_5.json', 'Magazine_Subscriptions_5.json'))
+    parser.add_argument('--split', choices=SPLIT_METHODS, default='time')
+    parser.add_argument('--test-fraction', type=float, default=0.2,
+                        help='Fracción de interacciones más recientes para test (split=time)')
+    parser.add_argument('--holdout', type=int, default=1,
+                        help='Interacciones por usuario para test (split=leave_k_out)')
+    parser.add_argument('--method', choices=TRAINING_METHODS, default='als')
+    parser.add_argument('--factors', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=15)
+    parser.add_argument('--k', type=int, nargs='+', default=[5, 10, 20])
+    parser.add_argument('--metric', choices=SCORING_METRICS, default='cosine')
+    parser.add_argument('--dtype', choices=list(embedding_io.STORAGE_DTYPES), default='float32')
+    parser.add_argument('--nprobe', type=int, default=None,
+                        help='Evalúa la búsqueda IVF con este nprobe (por defecto exacta)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--block-size', type=int, default=1024,
+                        help='Usuarios puntuados con cada producto de matrices')
+    parser.add_argument('--output-dir', default=None,
+                        help='Carpeta donde conservar el modelo evaluado (por defecto temporal)')
+    parser.add_argument('--report', default=None, help='Archivo JSON para el informe')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='evaluate_') as tmp_dir:
+        model_dir = args.output_dir or tmp_dir
+        os.makedirs(model_dir, exist_ok=True)
+        report = run_evaluation(
+            args.data, model_dir, args.split, args.method, args.test_fraction, args.holdout,
+            args.factors, args.iterations, args.k, args.metric, args.dtype, args.nprobe,
+            args.workers, args.block_size, args.seed)
+
+    for k, values in report['metrics'].items():
+        print(f"@{k}: recall={values['recall']:.4f}  ndcg={values['ndcg']:.4f}  "
+              f"map={values['map']:.4f}")
+    print(f"Tiempo total: {report['timings']['wall_s']:.1f}s")
+
+    text = json.dumps(report, indent=4)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Informe guardado en {args.report}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
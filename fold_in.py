@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class FoldInSolver:
+    """Fold-in de ALS implícito contra factores congelados.
+
+    Para una fila con interacciones sobre los factores `Y` (con confianzas
+    `c`), el vector que minimiza la pérdida de ALS es
+
+        x = (YᵀY + λI + Yᵢᵀ diag(c - 1) Yᵢ)⁻¹ Yᵢᵀ c
+
+    La matriz de Gram `YᵀY + λI` se precalcula una sola vez, así que cada
+    fold-in es un sistema dim x dim que solo depende de las filas tocadas.
+    """
+
+    def __init__(self, factors, regularization=0.01, scales=None, block_size=65536):
+        # `factors` puede ser una matriz mapeada en memoria y cuantizada
+        # (float16/int8 con `scales` por fila): la Gram se acumula por bloques
+        # en float64 sin copiar la matriz entera
+        self.factors = factors
+        self.scales = scales
+        dim = factors.shape[1]
+        self.gram = regularization * np.eye(dim)
+        for start in range(0, len(factors), block_size):
+            block = self._rows(slice(start, start + block_size))
+            self.gram += block.T @ block
+
+    def _rows(self, rows):
+        Y = np.asarray(self.factors[rows], dtype=np.float64)
+        if self.scales is not None:
+            Y = Y * np.asarray(self.scales[rows], dtype=np.float64)[:, None]
+        return Y
+
+    def solve(self, rows, confidences):
+        """Vector de factores para una fila con interacciones en `rows`."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return np.zeros(self.gram.shape[0], dtype=np.float32)
+
+        confidences = np.asarray(confidences, dtype=np.float64)
+        Y = self._rows(rows)
+        A = self.gram + (Y.T * (confidences - 1.0)) @ Y
+        b = Y.T @ confidences
+        return np.linalg.solve(A, b).astype(np.float32)
+
+    def solve_rows(self, matrix, rows):
+        """Fold-in de varias filas de una matriz CSR de confianzas."""
+        result = np.zeros((len(rows), self.gram.shape[0]), dtype=np.float32)
+        for i, row in enumerate(rows):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            result[i] = self.solve(matrix.indices[start:end], matrix.data[start:end])
+        return result
@@ -1,56 +1,61 @@
 import numpy as np
 import os
-import struct
+import argparse
+import embedding_io
 
-# Create directories if they don't exist
-os.makedirs('models', exist_ok=True)
-os.makedirs('data', exist_ok=True)
-
-def generate_embeddings(num_items, dim):
+def generate_embeddings(num_items, dim, rng=None):
     # Generate random embeddings (normalized)
-    embeddings = np.random.randn(num_items, dim).astype(np.float32)
+    rng = rng if rng is not None else np.random.default_rng()
+    embeddings = rng.standard_normal((num_items, dim), dtype=np.float32)
     norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-    return (embeddings / norms).astype(np.float32)
-
-def save_embeddings(path, embeddings, ids):
-    with open(path, 'wb') as f:
-        # Write number of items and embedding dimension
-        num_items = len(ids)
-        dim = embeddings.shape[1] if num_items > 0 else 0
-        
-        f.write(struct.pack('I', num_items))  # Number of items
-        f.write(struct.pack('I', dim))         # Embedding dimension
-        
-        # Write IDs
-        for item_id in ids:
-            item_id_bytes = item_id.encode('utf-8')
-            f.write(struct.pack('I', len(item_id_bytes)))  # ID length
-            f.write(item_id_bytes)                         # ID bytes
-        
-        # Write embeddings
-        f.write(embeddings.tobytes())
-
-# Generate test data
-num_users = 100
-num_items = 1000
-embedding_dim = 50
-
-# Generate and save user embeddings
-user_ids = [f'user_{i}' for i in range(num_users)]
-user_embeddings = generate_embeddings(num_users, embedding_dim)
-save_embeddings('models/user_embeddings.bin', user_embeddings, user_ids)
-
-# Generate and save item embeddings
-item_ids = [f'item_{i}' for i in range(num_items)]
-item_embeddings = generate_embeddings(num_items, embedding_dim)
-save_embeddings('models/item_embeddings.bin', item_embeddings, item_ids)
-
-# Save user and item IDs as text files
-with open('data/users.txt', 'w') as f:
-    f.write('\n'.join(user_ids))
-
-with open('data/items.txt', 'w') as f:
-    f.write('\n'.join(item_ids))
-
-print(f'Generated test data with {num_users} users and {num_items} items (dim={embedding_dim})')
-print('Files saved to models/ and data/ directories')
+    embeddings /= norms
+    return embeddings
+
+def save_embeddings(path, embeddings, ids, dtype='float32'):
+    # Write header, ID table and aligned matrix (format v2, float32/float16/int8)
+    embedding_io.save_embeddings(path, embeddings, ids, dtype=dtype)
+
+def generate_model(output_dir, num_users, num_items, dim, seed=None, dtype='float32'):
+    """Generate a synthetic model (user and item embeddings) in output_dir."""
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    # Generate and save user embeddings
+    user_ids = [f'user_{i}' for i in range(num_users)]
+    save_embeddings(os.path.join(output_dir, 'user_embeddings.bin'),
+                    generate_embeddings(num_users, dim, rng), user_ids, dtype)
+
+    # Generate and save item embeddings
+    item_ids = [f'item_{i}' for i in range(num_items)]
+    save_embeddings(os.path.join(output_dir, 'item_embeddings.bin'),
+                    generate_embeddings(num_items, dim, rng), item_ids, dtype)
+
+    return user_ids, item_ids
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic test embeddings')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--dim', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output-dir', default='models')
+    parser.add_argument('--dtype', choices=list(embedding_io.STORAGE_DTYPES), default='float32')
+    args = parser.parse_args()
+
+    # Generate test data
+    os.makedirs('data', exist_ok=True)
+    user_ids, item_ids = generate_model(args.output_dir, args.users, args.items,
+                                        args.dim, args.seed, args.dtype)
+
+    # Save user and item IDs as text files
+    with open('data/users.txt', 'w') as f:
+        f.write('\n'.join(user_ids))
+
+    with open('data/items.txt', 'w') as f:
+        f.write('\n'.join(item_ids))
+
+    print(f'Generated test data with {args.users} users and {args.items} items (dim={args.dim})')
+    print(f'Files saved to {args.output_dir}/ and data/ directories')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import os
+import hashlib
+import numpy as np
+
+from array_bundle import save_array_bundle, open_array_bundle
+
+# Índice ID -> fila que acompaña a cada archivo de embeddings (.bin -> .idx).
+#
+# Cada ID se resume en un hash de 64 bits; los hashes se guardan ordenados
+# junto con su fila y un directorio de 2^bits cubetas indexado por los bits
+# altos del hash. Una búsqueda lee una cubeta (en promedio ~1 entrada), por
+# lo que su coste es constante, y al estar mapeado en memoria abrir el
+# índice no depende del tamaño del catálogo.
+INDEX_MAGIC = b'RECIDX01'
+
+
+def index_path(embeddings_path):
+    """Ruta del índice asociado a un archivo de embeddings."""
+    root, _ = os.path.splitext(embeddings_path)
+    return root + '.idx'
+
+
+def hash_id(item_id):
+    """Hash estable de 64 bits de un ID (independiente del proceso)."""
+    if not isinstance(item_id, bytes):
+        item_id = str(item_id).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(item_id, digest_size=8).digest(), 'little')
+
+
+def build_id_index(ids):
+    """Construye los arrays del índice para una secuencia de IDs."""
+    hashes = np.fromiter((hash_id(item_id) for item_id in ids), dtype=np.uint64,
+                         count=len(ids))
+    order = np.argsort(hashes, kind='stable')
+    hashes = hashes[order]
+
+    # Directorio de cubetas: ~1 cubeta por ID, potencia de dos
+    bits = max(int(np.ceil(np.log2(max(len(hashes), 1)))), 0)
+    if bits:
+        buckets = (hashes >> np.uint64(64 - bits)).astype(np.int64)
+    else:
+        buckets = np.zeros(len(hashes), dtype=np.int64)
+    directory = np.searchsorted(buckets, np.arange((1 << bits) + 1)).astype(np.uint64)
+
+    return {
+        'hashes': hashes,
+        'rows': order.astype(np.uint32 if len(ids) < 2**32 else np.uint64),
+        'directory': directory
+    }, {'bits': bits, 'count': len(ids)}
+
+
+def save_id_index(path, ids):
+    """Guarda el índice de IDs en `path`."""
+    arrays, meta = build_id_index(ids)
+    save_array_bundle(path, INDEX_MAGIC, arrays, meta)
+
+
+class IdIndex:
+    """Búsqueda ID -> fila en tiempo constante.
+
+    Usa el archivo `.idx` precalculado si existe (y se abre solo en la
+    primera consulta); si no, construye el índice en memoria a partir de
+    `ids`. Se comporta como un dict de solo lectura.
+    """
+
+    def __init__(self, ids, path=None):
+        self._ids = ids
+        self._path = path
+        self._arrays = None
+
+    @classmethod
+    def for_embeddings(cls, embeddings_path, ids):
+        """Índice para un archivo de embeddings, usando su `.idx` si existe."""
+        path = index_path(embeddings_path)
+        if (os.path.exists(path) and
+                os.path.getmtime(path) >= os.path.getmtime(embeddings_path)):
+            return cls(ids, path)
+        return cls(ids)
+
+    def _load(self):
+        if self._arrays is None:
+            if self._path is not None:
+                arrays, meta = open_array_bundle(self._path, INDEX_MAGIC)
+                if meta.get('count') != len(self._ids):
+                    raise ValueError(f"El índice {self._path} no coincide con los embeddings")
+            else:
+                arrays, meta = build_id_index(self._ids)
+            self._bits = meta['bits']
+            self._arrays = arrays
+        return self._arrays
+
+    def get(self, item_id, default=None):
+        """Fila del ID o `default` si no existe."""
+        arrays = self._load()
+        h = hash_id(item_id)
+        bucket = h >> (64 - self._bits) if self._bits else 0
+        lo, hi = int(arrays['directory'][bucket]), int(arrays['directory'][bucket + 1])
+        for pos in range(lo, hi):
+            if int(arrays['hashes'][pos]) == h:
+                row = int(arrays['rows'][pos])
+                # Confirmar el ID para descartar colisiones de hash
+                if self._ids[row] == item_id:
+                    return row
+        return default
+
+    def get_many(self, ids):
+        """Filas de varios IDs a la vez (-1 para los desconocidos)."""
+        arrays = self._load()
+        hashes = np.fromiter((hash_id(item_id) for item_id in ids), dtype=np.uint64,
+                             count=len(ids))
+        pos = np.searchsorted(arrays['hashes'], hashes)
+        found = pos < len(arrays['hashes'])
+        found[found] = arrays['hashes'][pos[found]] == hashes[found]
+
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        rows[found] = arrays['rows'][pos[found]]
+        # Verificar los IDs encontrados (y resolver colisiones, muy raras)
+        for i in np.flatnonzero(found):
+            if self._ids[rows[i]] != ids[i]:
+                rows[i] = self.get(ids[i], -1)
+        return rows
+
+    def __contains__(self, item_id):
+        return self.get(item_id) is not None
+
+    def __getitem__(self, item_id):
+        row = self.get(item_id)
+        if row is None:
+            raise KeyError(item_id)
+        return row
+
+    def __len__(self):
+        return len(self._ids)
@@ -4,9 +4,20 @@
 #include <vector>
 #include <fstream>
 #include <memory>
+#include <cstdint>
 
 namespace recommender {
 
+    // Magic string at the start of embedding files in format v2
+    constexpr char EMBEDDINGS_V2_MAGIC[] = "RECEMB02";
+
+    // Storage types of the v2 matrix (header field `dtype`)
+    enum EmbeddingDtype : uint32_t {
+        DTYPE_FLOAT32 = 0,
+        DTYPE_FLOAT16 = 1,
+        DTYPE_INT8 = 2   // symmetric, one float32 scale per row
+    };
+
     class Loader {
     public:
         // Load embeddings from binary file
@@ -25,6 +36,10 @@ namespace recommender {
         
     private:
         // Helper methods
+        static bool load_embeddings_v2(std::ifstream& file,
+                                       std::vector<float>& embeddings,
+                                       std::vector<std::string>& ids);
+        static float half_to_float(uint16_t half);
         static bool validate_file(const std::string& path);
         static bool read_binary_file(const std::string& path, std::vector<float>& data);
         static bool write_binary_file(const std::string& path, const std::vector<float>& data);
@@ -3,6 +3,7 @@
 #include <string>
 #include <vector>
 #include <memory>
+#include <unordered_map>
 #include <nlohmann/json.hpp>
 
 namespace recommender {
@@ -30,10 +31,17 @@ namespace recommender {
         std::vector<float> item_embeddings;
         std::vector<std::string> user_ids;
         std::vector<std::string> item_ids;
+        std::vector<double> item_norms;
+        
+        // ID -> row lookup tables
+        std::unordered_map<std::string, size_t> user_index;
+        std::unordered_map<std::string, size_t> item_index;
         
         // Private helper methods
         std::vector<float> get_user_embedding(const std::string& user_id);
         std::vector<float> get_item_embedding(const std::string& item_id);
+        std::vector<float> get_embedding_row(const std::vector<float>& embeddings,
+                                             size_t num_rows, size_t index) const;
         double cosine_similarity(const std::vector<float>& vec1, const std::vector<float>& vec2);
     };
 }
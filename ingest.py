@@ -0,0 +1,307 @@
+import os
+import gzip
+import json
+import time
+import argparse
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class Interactions:
+    """Interacciones usuario-ítem en columnas compactas.
+
+    `user_codes`/`item_codes` son índices enteros en `user_ids`/`item_ids`,
+    `ratings` la valoración de cada interacción y `timestamps` (opcional) su
+    fecha en segundos Unix. `errors` cuenta las líneas omitidas por no ser
+    un objeto JSON válido o por tener una valoración o fecha no numérica.
+    """
+
+    def __init__(self, user_codes, item_codes, ratings, user_ids, item_ids, timestamps=None,
+                 errors=0):
+        self.user_codes = user_codes
+        self.item_codes = item_codes
+        self.ratings = ratings
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.timestamps = timestamps
+        self.errors = errors
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def to_csr(self):
+        """Matriz usuario-ítem dispersa (las interacciones repetidas se suman)."""
+        return csr_matrix(
+            (self.ratings, (self.user_codes, self.item_codes)),
+            shape=(len(self.user_ids), len(self.item_ids))
+        )
+
+
+def open_reviews(path):
+    """Abre un archivo de reseñas `.json` o `.json.gz` en modo binario."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _load_review(line):
+    """Reseña de una línea JSON; None si la línea no es un objeto JSON válido."""
+    try:
+        review = json.loads(line)
+    except ValueError:
+        return None
+    return review if isinstance(review, dict) else None
+
+
+def _numeric_values(review, rating, time_field):
+    """Valoración y fecha de una reseña como números; None si alguna no lo es."""
+    try:
+        timestamp = int(review.get(time_field, 0)) if time_field is not None else 0
+        return float(rating), timestamp
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _report_errors(errors):
+    if errors:
+        print(f"Se omitieron {errors} líneas con JSON inválido o valores no numéricos")
+
+
+def stream_interactions(path, chunk_size=100_000, user_field='reviewerID',
+                        item_field='asin', rating_field='overall', time_field=None):
+    """Lee las reseñas por bloques conservando solo usuario, ítem y valoración.
+
+    Los IDs se convierten en códigos enteros sobre la marcha y las columnas
+    se acumulan en buffers `array`, por lo que la memoria necesaria crece con
+    el número de interacciones y no con el tamaño del JSON. Con `time_field`
+    (p. ej. 'unixReviewTime') también se conserva la fecha de cada reseña.
+    Las líneas vacías se ignoran; las que no son JSON válido o tienen una
+    valoración o fecha no numérica se omiten y se cuentan, igual que en
+    `parallel_interactions`.
+    """
+    user_lookup, item_lookup = {}, {}
+    user_codes, item_codes, ratings = array('i'), array('i'), array('f')
+    timestamps = array('q')
+    errors = 0
+
+    with open_reviews(path) as f:
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                break
+
+            for line in lines:
+                if not line.strip():
+                    continue
+                review = _load_review(line)
+                if review is None:
+                    errors += 1
+                    continue
+                user_id = review.get(user_field)
+                item_id = review.get(item_field)
+                rating = review.get(rating_field)
+                if user_id is None or item_id is None or rating is None:
+                    continue
+                values = _numeric_values(review, rating, time_field)
+                if values is None:
+                    errors += 1
+                    continue
+                rating, timestamp = values
+
+                user_codes.append(user_lookup.setdefault(user_id, len(user_lookup)))
+                item_codes.append(item_lookup.setdefault(item_id, len(item_lookup)))
+                ratings.append(rating)
+                if time_field is not None:
+                    timestamps.append(timestamp)
+
+    _report_errors(errors)
+    return Interactions(
+        np.frombuffer(user_codes, dtype=np.int32),
+        np.frombuffer(item_codes, dtype=np.int32),
+        np.frombuffer(ratings, dtype=np.float32),
+        list(user_lookup),
+        list(item_lookup),
+        np.frombuffer(timestamps, dtype=np.int64) if time_field is not None else None,
+        errors
+    )
+
+
+def _parse_block(block, user_field, item_field, rating_field, time_field):
+    """Parsea un bloque de líneas JSON completas (se ejecuta en un worker).
+
+    Devuelve columnas compactas con códigos locales al bloque y las tablas de
+    IDs locales, para que el proceso principal las fusione.
+    """
+    if isinstance(block, tuple):
+        path, start, end = block
+        with open(path, 'rb') as f:
+            f.seek(start)
+            block = f.read(end - start)
+
+    user_lookup, item_lookup = {}, {}
+    user_codes, item_codes, ratings = array('i'), array('i'), array('f')
+    timestamps = array('q')
+    errors = 0
+
+    for line in block.splitlines():
+        if not line.strip():
+            continue
+        review = _load_review(line)
+        if review is None:
+            errors += 1
+            continue
+        user_id = review.get(user_field)
+        item_id = review.get(item_field)
+        rating = review.get(rating_field)
+        if user_id is None or item_id is None or rating is None:
+            continue
+        values = _numeric_values(review, rating, time_field)
+        if values is None:
+            errors += 1
+            continue
+        rating, timestamp = values
+
+        user_codes.append(user_lookup.setdefault(user_id, len(user_lookup)))
+        item_codes.append(item_lookup.setdefault(item_id, len(item_lookup)))
+        ratings.append(rating)
+        if time_field is not None:
+            timestamps.append(timestamp)
+
+    return (list(user_lookup), list(item_lookup), user_codes.tobytes(),
+            item_codes.tobytes(), ratings.tobytes(), timestamps.tobytes(), errors)
+
+
+def _file_ranges(path, block_size):
+    """Rangos de bytes alineados a líneas de un archivo sin comprimir."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + block_size, size))
+            f.readline()  # avanzar hasta el final de la línea
+            end = min(f.tell(), size)
+            yield (path, start, end)
+            start = end
+
+
+def _gzip_blocks(path, block_size):
+    """Bloques de líneas completas del flujo descomprimido de un `.gz`."""
+    remainder = b''
+    with gzip.open(path, 'rb') as f:
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+            data = remainder + data
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                remainder = data
+                continue
+            remainder = data[cut:]
+            yield data[:cut]
+    if remainder:
+        yield remainder
+
+
+def parallel_interactions(path, workers=None, block_size=8 * 1024 * 1024,
+                          user_field='reviewerID', item_field='asin',
+                          rating_field='overall', time_field=None):
+    """Versión paralela de `stream_interactions` con un ProcessPoolExecutor.
+
+    El flujo (descomprimido si es `.gz`) se divide en bloques de
+    `block_size` bytes alineados a líneas; cada worker devuelve columnas
+    compactas que se fusionan en orden, de modo que los códigos resultantes
+    son idénticos a los de la lectura en serie.
+    """
+    workers = workers or os.cpu_count() or 1
+    if path.endswith('.gz'):
+        blocks = _gzip_blocks(path, block_size)
+    else:
+        blocks = _file_ranges(path, block_size)
+
+    user_lookup, item_lookup = {}, {}
+    user_parts, item_parts, rating_parts, time_parts = [], [], [], []
+    errors = 0
+
+    def merge(result):
+        nonlocal errors
+        local_users, local_items, users, items, ratings, timestamps, block_errors = result
+        user_map = np.fromiter((user_lookup.setdefault(u, len(user_lookup)) for u in local_users),
+                               dtype=np.int32, count=len(local_users))
+        item_map = np.fromiter((item_lookup.setdefault(i, len(item_lookup)) for i in local_items),
+                               dtype=np.int32, count=len(local_items))
+        user_parts.append(user_map[np.frombuffer(users, dtype=np.int32)])
+        item_parts.append(item_map[np.frombuffer(items, dtype=np.int32)])
+        rating_parts.append(np.frombuffer(ratings, dtype=np.float32))
+        time_parts.append(np.frombuffer(timestamps, dtype=np.int64))
+        errors += block_errors
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Limitar los bloques en vuelo para acotar la memoria
+        pending = deque()
+        for block in blocks:
+            pending.append(executor.submit(_parse_block, block, user_field, item_field,
+                                           rating_field, time_field))
+            if len(pending) >= 2 * workers:
+                merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
+
+    _report_errors(errors)
+
+    def concat(parts, dtype):
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+    return Interactions(
+        concat(user_parts, np.int32),
+        concat(item_parts, np.int32),
+        concat(rating_parts, np.float32),
+        list(user_lookup),
+        list(item_lookup),
+        concat(time_parts, np.int64) if time_field is not None else None,
+        errors
+    )
+
+
+def load_interactions(path, workers=1, **kwargs):
+    """Carga las interacciones en serie (`workers=1`) o en paralelo."""
+    if workers is not None and workers <= 1:
+        return stream_interactions(path, **kwargs)
+    return parallel_interactions(path, workers, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compara la lectura en serie y en paralelo de un archivo de reseñas')
+    parser.add_argument('path', help='Archivo .json o .json.gz')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--block-size', type=int, default=8 * 1024 * 1024)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    serial = stream_interactions(args.path)
+    serial_time = time.perf_counter() - start
+    print(f"Serie:    {len(serial)} interacciones en {serial_time:.2f}s "
+          f"({len(serial) / serial_time:,.0f} filas/s)")
+
+    start = time.perf_counter()
+    parallel = parallel_interactions(args.path, args.workers, args.block_size)
+    parallel_time = time.perf_counter() - start
+    print(f"Paralelo: {len(parallel)} interacciones en {parallel_time:.2f}s "
+          f"({len(parallel) / parallel_time:,.0f} filas/s, {args.workers} workers)")
+
+    print(f"Aceleración: {serial_time / parallel_time:.2f}x")
+    same = (serial.user_ids == parallel.user_ids and serial.item_ids == parallel.item_ids and
+            np.array_equal(serial.user_codes, parallel.user_codes) and
+            np.array_equal(serial.item_codes, parallel.item_codes) and
+            np.array_equal(serial.ratings, parallel.ratings) and
+            serial.errors == parallel.errors)
+    print(f"Resultados idénticos: {'sí' if same else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from array_bundle import allocate_array_bundle, open_array_bundle
+from embedding_io import file_fingerprint, load_quantized_embeddings
+from id_index import index_path, save_id_index
+
+# Top-K precalculado de todos los usuarios de user_embeddings.bin: para cada
+# fila de usuario, las filas de sus `top_k` mejores ítems en orden
+# descendente y sus puntuaciones, como matrices de ancho fijo int32/float32
+# mapeables en memoria (-1 / -inf en los huecos). Servir a un usuario
+# conocido es leer una fila.
+TOPK_MAGIC = b'RECTOPK1'
+TOPK_FILE = 'user_topk.bin'
+
+# Estado de cada proceso de cálculo (lo fija `_init_worker`)
+_ENGINE = None
+_ITEMS = None
+_SCORES = None
+
+
+def _init_worker(config_path, models_dir, output_path):
+    global _ENGINE, _ITEMS, _SCORES
+    from scoring_engine import ScoringEngine
+
+    # Cada proceso mapea los embeddings y escribe sus filas directamente en
+    # el archivo de salida, así que el proceso principal no acumula nada. Solo
+    # se puntúan usuarios conocidos: no hace falta la matriz de Gram del fold-in
+    _ENGINE = ScoringEngine.from_config(config_path, model_dir=models_dir, fold_in=False)
+    arrays, _ = open_array_bundle(output_path, TOPK_MAGIC, mode='r+')
+    _ITEMS, _SCORES = arrays['items'], arrays['scores']
+
+
+def _materialize_block(start, stop, top_k, block_size):
+    """Calcula y escribe el top-K de las filas de usuarios [start, stop)."""
+    rows, scores = _ENGINE.top_item_rows(np.arange(start, stop), top_k, block_size,
+                                         return_scores=True)
+    _ITEMS[start:stop] = rows
+    _SCORES[start:stop] = scores
+    _ITEMS.flush()
+    _SCORES.flush()
+    return stop - start
+
+
+def materialize_topk(config_path, models_dir, top_k=100, block_size=1024, workers=None):
+    """Genera `models_dir/user_topk.bin` con el top-K de todos los usuarios.
+
+    Usa la métrica, el índice IVF y el filtrado de ítems vistos de
+    `config_path`, como el motor en vivo. Los usuarios se reparten en
+    bloques de `block_size` (un producto de matrices por bloque) entre
+    `workers` procesos (1 = en este proceso), y la memoria auxiliar de cada
+    uno queda acotada a `block_size * ítems` puntuaciones. Devuelve la ruta
+    del archivo.
+    """
+    global _ENGINE, _ITEMS, _SCORES
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    workers = workers or os.cpu_count() or 1
+
+    paths = config['model_paths']
+    user_path = os.path.join(models_dir, os.path.basename(paths['user_embeddings']))
+    item_path = os.path.join(models_dir, os.path.basename(paths['item_embeddings']))
+    output_path = os.path.join(models_dir, os.path.basename(paths.get('user_topk', TOPK_FILE)))
+
+    user_ids, _, _ = load_quantized_embeddings(user_path)
+    item_ids, _, _ = load_quantized_embeddings(item_path)
+    num_users, num_items = len(user_ids), len(item_ids)
+    top_k = max(min(top_k, num_items), 0)
+
+    # El índice de usuarios sirve la tabla: regenerarlo si falta o es anterior
+    user_index_path = index_path(user_path)
+    if (not os.path.exists(user_index_path) or
+            os.path.getmtime(user_index_path) < os.path.getmtime(user_path)):
+        save_id_index(user_index_path, user_ids)
+
+    recommendation = config.get('recommendation', {})
+    seen_path = os.path.join(models_dir, os.path.basename(paths.get('seen_items', '')))
+    # Las huellas de los embeddings identifican el entrenamiento: un
+    # reentrenamiento con las mismas dimensiones deja la tabla obsoleta
+    meta = {
+        'num_users': num_users,
+        'num_items': num_items,
+        'users': file_fingerprint(user_path),
+        'items': file_fingerprint(item_path),
+        'top_k': top_k,
+        'metric': recommendation.get('metric', 'cosine'),
+        'exclude_seen': bool(recommendation.get('exclude_seen', True) and
+                             'seen_items' in paths and os.path.exists(seen_path))
+    }
+
+    tmp_path = f"{output_path}.tmp{os.getpid()}"
+    allocate_array_bundle(tmp_path, TOPK_MAGIC, {
+        'items': (np.int32, (num_users, top_k)),
+        'scores': (np.float32, (num_users, top_k))
+    }, meta)
+
+    blocks = [(start, min(start + block_size, num_users))
+              for start in range(0, num_users if top_k else 0, block_size)]
+    try:
+        if workers <= 1:
+            _init_worker(config_path, models_dir, tmp_path)
+            try:
+                for start, stop in blocks:
+                    _materialize_block(start, stop, top_k, block_size)
+            finally:
+                _ENGINE = _ITEMS = _SCORES = None
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(config_path, models_dir, tmp_path)) as executor:
+                # Limitar los bloques en vuelo para acotar la memoria
+                pending = deque()
+                for start, stop in blocks:
+                    pending.append(executor.submit(_materialize_block, start, stop,
+                                                   top_k, block_size))
+                    if len(pending) >= 2 * workers:
+                        pending.popleft().result()
+                while pending:
+                    pending.popleft().result()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return output_path
+
+
+class TopKTable:
+    """Consulta del top-K precalculado sobre el archivo mapeado."""
+
+    def __init__(self, path):
+        arrays, meta = open_array_bundle(path, TOPK_MAGIC)
+        self.items = arrays['items']
+        self.scores = arrays['scores']
+        self.meta = meta
+        self.num_users = meta['num_users']
+        self.top_k = meta['top_k']
+
+    def __len__(self):
+        return self.num_users
+
+    def matches(self, user_path, item_path, metric, exclude_seen):
+        """Indica si la tabla se generó con estos embeddings y esta configuración."""
+        return (self.meta.get('users') == file_fingerprint(user_path) and
+                self.meta.get('items') == file_fingerprint(item_path) and
+                self.meta.get('metric') == metric and
+                self.meta.get('exclude_seen') == exclude_seen)
+
+    def _width(self, top_k):
+        # Un top_k negativo recortaría desde el final en lugar de fallar
+        if top_k is None:
+            return self.top_k
+        if not 0 < top_k <= self.top_k:
+            raise ValueError(f"top_k debe estar entre 1 y {self.top_k}")
+        return top_k
+
+    def row(self, user_row, top_k=None):
+        """Filas de los ítems recomendados a un usuario (sin copia, -1 en los huecos)."""
+        return self.items[user_row, :self._width(top_k)]
+
+    def rows(self, user_rows, top_k=None):
+        """Filas de los ítems de varios usuarios, como matriz (usuarios, top_k)."""
+        return self.items[np.asarray(user_rows, dtype=np.int64), :self._width(top_k)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Precalcula el top-K de recomendaciones de todos los usuarios')
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--top-k', type=int, default=100,
+                        help='Ítems por usuario (el máximo que se podrá servir de la tabla)')
+    parser.add_argument('--block-size', type=int, default=1024,
+                        help='Filas de usuarios por tarea')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(f"Calculando el top-{args.top_k} de cada usuario con {args.workers} procesos...")
+    start = time.perf_counter()
+    output_path = materialize_topk(args.config, args.models_dir, args.top_k,
+                                   args.block_size, args.workers)
+    table = TopKTable(output_path)
+    print(f"Tabla de {len(table)} usuarios x {table.top_k} ítems guardada en "
+          f"{output_path} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
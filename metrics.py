@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Métricas del servicio en formato de texto de Prometheus: contadores,
+# histogramas de latencia y temporizadores por etapa del camino caliente
+# (spawn del proceso, carga del modelo, puntuación, ordenación, parseo...).
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = ','.join(f'{name}="{value}"' for name, value in labels)
+    return '{' + parts + '}'
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas."""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(key + (('le', repr(bound)),))
+                    lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+                lines.append(f'{self.name}_bucket{_format_labels(key + (("le", "+Inf"),))} {count}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {total}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return lines
+
+
+class CounterMetric:
+    """Contador monótono con etiquetas."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(key)} {value}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram('recommender_request_duration_seconds',
+                            'Latencia de las peticiones HTTP')
+STAGE_LATENCY = Histogram('recommender_stage_duration_seconds',
+                          'Duración de cada etapa de una recomendación')
+REQUESTS = CounterMetric('recommender_requests_total', 'Peticiones HTTP atendidas')
+ERRORS = CounterMetric('recommender_errors_total', 'Peticiones HTTP con error')
+
+_METRICS = [REQUEST_LATENCY, STAGE_LATENCY, REQUESTS, ERRORS]
+
+
+@contextmanager
+def stage(name):
+    """Mide la duración de una etapa y la añade a su histograma."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=name)
+
+
+def observe_stage(name, seconds):
+    """Registra una etapa medida por otro medio (p. ej. el binario C++)."""
+    STAGE_LATENCY.observe(seconds, stage=name)
+
+
+def render(extra_gauges=None):
+    """Texto de todas las métricas en formato de exposición de Prometheus.
+
+    `extra_gauges` es un dict nombre -> valor que se añade como gauges.
+    """
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for name, value in (extra_gauges or {}).items():
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    """Perfilador por muestreo para peticiones lentas.
+
+    Un hilo en segundo plano muestrea cada `interval_ms` la pila de los hilos
+    que están atendiendo una petición. Si la petición tarda más de
+    `threshold_ms`, sus pilas se escriben en formato "collapsed"
+    (`f1;f2;f3 N`), listo para flamegraph.pl o speedscope.
+    """
+
+    def __init__(self, threshold_ms=500, interval_ms=5, output_dir='profiles'):
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.output_dir = output_dir
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self._thread.start()
+
+    def begin(self):
+        """Empieza a muestrear el hilo actual."""
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def end(self, duration, name='request'):
+        """Deja de muestrear; guarda las pilas si la petición fue lenta."""
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+        if stacks is None or duration < self.threshold or not stacks:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir,
+                            f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{int(duration * 1000)}ms.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    """Pila de un frame como 'raíz;...;hoja'."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
@@ -0,0 +1,85 @@
+import asyncio
+
+
+class MicroBatcher:
+    """Agrupa peticiones concurrentes para puntuarlas con un solo producto.
+
+    Cada `submit` encola una consulta y espera su resultado. Un bucle en
+    segundo plano reúne hasta `max_batch_size` consultas o espera como mucho
+    `max_wait_ms` desde la primera, las puntúa juntas con `score_batch`
+    (en un hilo, para no bloquear el bucle de eventos) y reparte los
+    resultados entre las peticiones.
+
+    `score_batch(user_ids, top_k)` debe devolver un dict user_id -> ítems,
+    como `ScoringEngine.recommend_batch`.
+    """
+
+    def __init__(self, score_batch, max_batch_size=64, max_wait_ms=5.0):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.requests = 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, user_id, top_k):
+        """Encola una consulta y devuelve sus recomendaciones."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((user_id, top_k, future))
+        return await future
+
+    async def _collect(self):
+        """Espera la primera consulta y reúne las que lleguen a tiempo."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            pending = [(user_id, top_k, future) for user_id, top_k, future in batch
+                       if not future.cancelled()]
+            if not pending:
+                continue
+
+            # Un único top_k para el lote; cada petición se recorta después
+            user_ids = [user_id for user_id, _, _ in pending]
+            max_k = max(top_k for _, top_k, _ in pending)
+            try:
+                results = await loop.run_in_executor(None, self.score_batch, user_ids, max_k)
+            except Exception as e:
+                for _, _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.requests += len(pending)
+            for user_id, top_k, future in pending:
+                if not future.done():
+                    future.set_result(results.get(user_id, [])[:top_k])
@@ -0,0 +1,349 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+
+from atomic_file import atomic_write
+from embedding_io import MAGIC, open_quantized_embeddings
+from id_index import index_path
+
+# Registro de versiones del modelo:
+#
+#   models/<versión>/user_embeddings.bin (+ .idx)
+#   models/<versión>/item_embeddings.bin (+ .idx)
+#   models/<versión>/manifest.json   dimensiones, conteos, formato y sha256
+#   models/CURRENT                   nombre de la versión activa
+#
+# Una versión se prepara en un directorio temporal y se renombra entera; el
+# puntero CURRENT se reescribe de forma atómica. Los procesos de servicio
+# vigilan CURRENT con `ModelWatcher` y cambian de versión sin cortar peticiones.
+
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+# Checkpoint de train_model.py: permite actualizar una versión de forma incremental
+CHECKPOINT_FILE = 'checkpoint.json'
+EMBEDDING_FILES = ('user_embeddings.bin', 'item_embeddings.bin')
+# Archivos opcionales que acompañan a una versión si existen en el origen
+OPTIONAL_FILES = ('item_ivf.bin', 'seen_items.bin', 'similar_items.bin', 'user_topk.bin',
+                  CHECKPOINT_FILE)
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _embedding_info(path):
+    """Conteo, dimensión y tipo de almacenamiento de un archivo de embeddings."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"El registro solo admite embeddings en formato v2: {path}")
+    ids, matrix, _ = open_quantized_embeddings(path)
+    return {'format': MAGIC.decode('ascii'), 'count': len(ids),
+            'dim': int(matrix.shape[1]), 'dtype': str(matrix.dtype)}
+
+
+def build_manifest(version_dir, version):
+    """Describe los archivos de una versión (con sus sumas sha256)."""
+    files = {}
+    for name in sorted(os.listdir(version_dir)):
+        path = os.path.join(version_dir, name)
+        if name == MANIFEST_FILE or not os.path.isfile(path):
+            continue
+        entry = {'size': os.path.getsize(path), 'sha256': sha256_file(path)}
+        if name in EMBEDDING_FILES:
+            entry.update(_embedding_info(path))
+        files[name] = entry
+
+    users, items = files[EMBEDDING_FILES[0]], files[EMBEDDING_FILES[1]]
+    if users['dim'] != items['dim']:
+        raise ValueError("Los embeddings de usuarios e ítems tienen dimensiones distintas")
+
+    return {
+        'version': version,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'num_users': users['count'],
+        'num_items': items['count'],
+        'dim': items['dim'],
+        'files': files
+    }
+
+
+def list_versions(registry_dir):
+    """Versiones publicadas (con manifiesto), de la más antigua a la más nueva."""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(name for name in os.listdir(registry_dir)
+                  if os.path.isfile(os.path.join(registry_dir, name, MANIFEST_FILE)))
+
+
+def _next_version(registry_dir):
+    numbers = [int(name[1:]) for name in list_versions(registry_dir)
+               if name.startswith('v') and name[1:].isdigit()]
+    return f'v{max(numbers, default=0) + 1:04d}'
+
+
+def current_version(registry_dir):
+    """Versión activa según CURRENT (None si no hay ninguna)."""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest(registry_dir, version):
+    with open(os.path.join(registry_dir, version, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def verify_version(registry_dir, version):
+    """Comprueba tamaños y sumas sha256 de una versión; lanza ValueError si no cuadran."""
+    manifest = load_manifest(registry_dir, version)
+    for name, entry in manifest['files'].items():
+        path = os.path.join(registry_dir, version, name)
+        if os.path.getsize(path) != entry['size'] or sha256_file(path) != entry['sha256']:
+            raise ValueError(f"Suma de comprobación incorrecta en {path}")
+    return manifest
+
+
+def activate_version(registry_dir, version):
+    """Apunta CURRENT a `version` (también sirve para volver a una anterior)."""
+    if version not in list_versions(registry_dir):
+        raise ValueError(f"Versión desconocida: {version}")
+    with atomic_write(os.path.join(registry_dir, CURRENT_FILE), 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+
+
+def publish_version(source_dir, registry_dir='models', version=None, activate=True):
+    """Copia el modelo de `source_dir` como una nueva versión del registro.
+
+    Los archivos se copian a un directorio temporal, se escribe el
+    manifiesto y el directorio se renombra de una vez, de modo que nunca
+    existe una versión a medias. Devuelve el nombre de la versión.
+    """
+    os.makedirs(registry_dir, exist_ok=True)
+    version = version or _next_version(registry_dir)
+    final_dir = os.path.join(registry_dir, version)
+    if os.path.exists(final_dir):
+        raise FileExistsError(f"La versión {version} ya existe")
+
+    tmp_dir = os.path.join(registry_dir, f'.{version}.tmp{os.getpid()}')
+    os.makedirs(tmp_dir)
+    try:
+        for name in EMBEDDING_FILES:
+            src = os.path.join(source_dir, name)
+            # copy2 conserva las fechas: el .idx sigue siendo más reciente que el .bin
+            shutil.copy2(src, os.path.join(tmp_dir, name))
+            if os.path.exists(index_path(src)):
+                shutil.copy2(index_path(src), index_path(os.path.join(tmp_dir, name)))
+        for name in OPTIONAL_FILES:
+            if os.path.exists(os.path.join(source_dir, name)):
+                shutil.copy2(os.path.join(source_dir, name), os.path.join(tmp_dir, name))
+
+        manifest = build_manifest(tmp_dir, version)
+        with atomic_write(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=4)
+        os.rename(tmp_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if activate:
+        activate_version(registry_dir, version)
+    return version
+
+
+def prune_versions(registry_dir, keep=3):
+    """Borra las versiones más antiguas, conservando `keep` y la activa."""
+    active = current_version(registry_dir)
+    versions = list_versions(registry_dir)
+    removed = []
+    for version in versions[:max(len(versions) - keep, 0)]:
+        if version != active:
+            shutil.rmtree(os.path.join(registry_dir, version))
+            removed.append(version)
+    return removed
+
+
+class ModelHandle:
+    """Una versión cargada del modelo con recuento de referencias.
+
+    Cada petición toma una referencia mientras usa el motor. Cuando la
+    versión se retira (porque hay otra activa) el motor se libera al soltarse
+    la última referencia, de modo que las peticiones en curso terminan con la
+    versión con la que empezaron.
+    """
+
+    def __init__(self, version, engine):
+        self.version = version
+        self.engine = engine
+        self._refs = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            free = self._retired and self._refs == 0
+        if free:
+            self._free()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            free = self._refs == 0
+        if free:
+            self._free()
+
+    def _free(self):
+        # Sin referencias al motor, sus memmaps se cierran al recolectarse;
+        # los hilos de la búsqueda por fragmentos hay que pararlos
+        self.engine.close()
+        self.engine = None
+        print(f"Versión del modelo {self.version} liberada")
+
+
+class ModelWatcher:
+    """Vigila CURRENT y cambia de versión en caliente.
+
+    Un hilo en segundo plano revisa CURRENT cada `check_interval` segundos.
+    Al detectar una versión nueva la verifica (opcionalmente), la carga con
+    `load_engine(directorio)`, la calienta con `warmup_queries` consultas y
+    solo entonces la publica; si algo falla se sigue sirviendo la anterior.
+    `on_swap(versión)` se llama tras cada cambio (p. ej. para vaciar cachés).
+    """
+
+    def __init__(self, registry_dir, load_engine, check_interval=2.0, warmup_queries=8,
+                 verify_checksums=True, on_swap=None):
+        self.registry_dir = registry_dir
+        self.load_engine = load_engine
+        self.check_interval = check_interval
+        self.warmup_queries = warmup_queries
+        self.verify_checksums = verify_checksums
+        self.on_swap = on_swap
+        self._lock = threading.Lock()
+        self._current = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        version = current_version(registry_dir)
+        if version is None:
+            raise FileNotFoundError(f"No hay ninguna versión activa en {registry_dir}")
+        self._current = self._load(version)
+
+    @property
+    def version(self):
+        return self._current.version
+
+    def start(self):
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @contextmanager
+    def lease(self):
+        """Toma la versión activa durante el bloque `with`."""
+        with self._lock:
+            handle = self._current
+            handle.acquire()
+        try:
+            yield handle
+        finally:
+            handle.release()
+
+    def check(self):
+        """Carga y activa la versión de CURRENT si cambió. Devuelve True si cambió."""
+        version = current_version(self.registry_dir)
+        if version is None or version == self._current.version:
+            return False
+
+        handle = self._load(version)
+        with self._lock:
+            previous, self._current = self._current, handle
+        previous.retire()
+        print(f"Modelo cambiado de {previous.version} a {version}")
+        if self.on_swap is not None:
+            self.on_swap(version)
+        return True
+
+    def _load(self, version):
+        if self.verify_checksums:
+            verify_version(self.registry_dir, version)
+        engine = self.load_engine(os.path.join(self.registry_dir, version))
+
+        # Calentar: resolver IDs y tocar las páginas de las matrices
+        for row in range(min(self.warmup_queries, len(engine.user_ids))):
+            engine.get_recommendations(engine.user_ids[row])
+        return ModelHandle(version, engine)
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"ADVERTENCIA: No se pudo cargar la nueva versión del modelo: {e}",
+                      file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Registro de versiones del modelo')
+    parser.add_argument('--registry', default='models', help='Carpeta del registro')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    publish = commands.add_parser('publish', help='Publica el modelo de una carpeta')
+    publish.add_argument('--source', default='models')
+    publish.add_argument('--version', default=None)
+    publish.add_argument('--no-activate', action='store_true')
+    publish.add_argument('--keep', type=int, default=None,
+                         help='Versiones a conservar (por defecto todas)')
+
+    commands.add_parser('list', help='Lista las versiones publicadas')
+
+    activate = commands.add_parser('activate', help='Activa una versión (o vuelve a ella)')
+    activate.add_argument('version')
+
+    verify = commands.add_parser('verify', help='Comprueba las sumas sha256 de una versión')
+    verify.add_argument('version')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        version = publish_version(args.source, args.registry, args.version,
+                                  activate=not args.no_activate)
+        print(f"Publicada la versión {version}")
+        if args.keep:
+            for removed in prune_versions(args.registry, args.keep):
+                print(f"Eliminada la versión {removed}")
+    elif args.command == 'list':
+        active = current_version(args.registry)
+        for version in list_versions(args.registry):
+            manifest = load_manifest(args.registry, version)
+            marker = '*' if version == active else ' '
+            print(f"{marker} {version}  {manifest['num_users']} usuarios, "
+                  f"{manifest['num_items']} ítems, dim={manifest['dim']}  ({manifest['created_at']})")
+    elif args.command == 'activate':
+        activate_version(args.registry, args.version)
+        print(f"Versión activa: {args.version}")
+    else:
+        verify_version(args.registry, args.version)
+        print(f"La versión {args.version} es correcta")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,10 @@
 import shutil
 import sys
 import json
+import argparse
+
+from atomic_file import atomic_write
+from model_registry import publish_version, prune_versions
 
 def copy_files():
     # Crear directorio build si no existe
@@ -17,7 +21,10 @@ def copy_files():
     
     for src, dst in files_to_copy:
         try:
-            shutil.copy2(src, dst)
+            # Copiar a un temporal y renombrar: el motor nunca ve un archivo a medias
+            target = os.path.join(dst, os.path.basename(src))
+            shutil.copy2(src, target + '.tmp')
+            os.replace(target + '.tmp', target)
             print(f"Copiado: {src} -> {dst}")
         except Exception as e:
             print(f"Error al copiar {src}: {e}")
@@ -46,12 +53,29 @@ def copy_files():
     
     # Guardar configuración en la carpeta build
     config_path = os.path.join('build', 'config.json')
-    with open(config_path, 'w') as f:
+    with atomic_write(config_path, 'w') as f:
         json.dump(config, f, indent=4)
     print(f"Creado archivo de configuración en: {config_path}")
 
+def publish_model(keep=None):
+    """Publica models/ como nueva versión del registro y la activa."""
+    version = publish_version('models', 'models')
+    print(f"Publicada la versión del modelo: models/{version}")
+    if keep:
+        for removed in prune_versions('models', keep):
+            print(f"Eliminada la versión antigua: models/{removed}")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Prepara los archivos del motor')
+    parser.add_argument('--publish', action='store_true',
+                        help='Publicar models/ como nueva versión del registro de modelos')
+    parser.add_argument('--keep', type=int, default=None,
+                        help='Versiones del registro a conservar')
+    args = parser.parse_args()
+
     print("Preparando archivos para el motor de recomendaciones...")
     copy_files()
+    if args.publish:
+        publish_model(args.keep)
     print("\nAhora puedes ejecutar el servidor web con:")
     print("python web/app.py")
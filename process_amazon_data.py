@@ -1,89 +1,74 @@
 import os
-import json
-import gzip
 import numpy as np
-from collections import defaultdict
+import argparse
 from implicit.als import AlternatingLeastSquares
 from scipy.sparse import coo_matrix
-import pickle
+import embedding_io
+from atomic_file import atomic_write
+from ingest import load_interactions
+from seen_items import SEEN_FILE, save_seen_items
 
-def parse_json_gz(file_path):
-    """Parse a .json.gz file and yield each JSON object."""
-    with gzip.open(file_path, 'rt', encoding='utf-8') as f:
-        for line in f:
-            yield json.loads(line)
-
-def process_amazon_data(input_file, output_dir='models'):
+def process_amazon_data(input_file, output_dir='models', workers=1, dtype='float32'):
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
     # Read and process data
     print(f"Processing {input_file}...")
     
-    # Collect user-item interactions
-    user_interactions = defaultdict(dict)
-    user_ids = set()
-    item_ids = set()
-    
-    # Parse the gzipped JSON file
-    for review in parse_json_gz(input_file):
-        user_id = review.get('reviewerID')
-        item_id = review.get('asin')
-        rating = float(review.get('overall', 0))
-        
-        if user_id and item_id and rating > 0:
-            user_interactions[user_id][item_id] = rating
-            user_ids.add(user_id)
-            item_ids.add(item_id)
-    
-    # Convert to lists for indexing
-    user_list = list(user_ids)
-    item_list = list(item_ids)
+    # Collect user-item interactions (in parallel when workers > 1)
+    interactions = load_interactions(input_file, workers=workers)
     
-    # Create mappings
-    user_to_idx = {user: idx for idx, user in enumerate(user_list)}
-    item_to_idx = {item: idx for idx, item in enumerate(item_list)}
+    # Keep positive ratings only (users and items without any are dropped),
+    # then the last positive one for each (user, item) pair
+    positive = np.flatnonzero(interactions.ratings > 0)
+    used_users, user_codes = np.unique(interactions.user_codes[positive], return_inverse=True)
+    used_items, item_codes = np.unique(interactions.item_codes[positive], return_inverse=True)
+    user_list = [interactions.user_ids[code] for code in used_users]
+    item_list = [interactions.item_ids[code] for code in used_items]
     
-    # Create interaction matrix
-    rows, cols, data = [], [], []
-    for user, items in user_interactions.items():
-        for item, rating in items.items():
-            rows.append(user_to_idx[user])
-            cols.append(item_to_idx[item])
-            data.append(rating)
+    keys = user_codes.astype(np.int64) * len(item_list) + item_codes
+    _, last = np.unique(keys[::-1], return_index=True)
+    keep = len(keys) - 1 - last
     
     # Create sparse matrix
-    interaction_matrix = coo_matrix((data, (rows, cols)), 
-                                  shape=(len(user_list), len(item_list)))
+    interaction_matrix = coo_matrix(
+        (interactions.ratings[positive[keep]], (user_codes[keep], item_codes[keep])),
+        shape=(len(user_list), len(item_list)))
     
     # Train ALS model
     print("Training ALS model...")
     model = AlternatingLeastSquares(factors=64, regularization=0.01, iterations=20)
-    model.fit(2 * interaction_matrix.T)  # 2 * for confidence in implicit feedback
+    # implicit >= 0.5 expects a user x item matrix
+    model.fit(2 * interaction_matrix.tocsr())  # 2 * for confidence in implicit feedback
     
-    # Save user and item embeddings
-    print("Saving embeddings...")
-    with open(os.path.join(output_dir, 'user_embeddings.bin'), 'wb') as f:
-        pickle.dump({
-            'ids': user_list,
-            'embeddings': model.user_factors.astype(np.float32)
-        }, f)
+    if len(model.user_factors) != len(user_list) or len(model.item_factors) != len(item_list):
+        raise ValueError("Factor counts do not match the user/item lists")
     
-    with open(os.path.join(output_dir, 'item_embeddings.bin'), 'wb') as f:
-        pickle.dump({
-            'ids': item_list,
-            'embeddings': model.item_factors.astype(np.float32)
-        }, f)
+    # Save user and item embeddings (binary format v2, atomic writes)
+    print("Saving embeddings...")
+    embedding_io.save_embeddings(os.path.join(output_dir, 'user_embeddings.bin'),
+                                 model.user_factors, user_list, dtype=dtype)
+    embedding_io.save_embeddings(os.path.join(output_dir, 'item_embeddings.bin'),
+                                 model.item_factors, item_list, dtype=dtype)
+    save_seen_items(os.path.join(output_dir, SEEN_FILE), interaction_matrix)
     
     # Save user and item lists
-    with open(os.path.join('data', 'users.txt'), 'w') as f:
+    os.makedirs('data', exist_ok=True)
+    with atomic_write(os.path.join('data', 'users.txt'), 'w', encoding='utf-8') as f:
         f.write('\n'.join(user_list))
     
-    with open(os.path.join('data', 'items.txt'), 'w') as f:
+    with atomic_write(os.path.join('data', 'items.txt'), 'w', encoding='utf-8') as f:
         f.write('\n'.join(item_list))
     
     print(f"Processing complete. Processed {len(user_list)} users and {len(item_list)} items.")
 
 if __name__ == "__main__":
-    input_file = os.path.join('data', 'Magazine_Subscriptions_5.json.gz')
-    process_amazon_data(input_file)
+    parser = argparse.ArgumentParser(description='Process Amazon reviews and train ALS')
+    parser.add_argument('--input', default=os.path.join('data', 'Magazine_Subscriptions_5.json.gz'))
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for JSON parsing (1 = serial)')
+    parser.add_argument('--output-dir', default='models')
+    parser.add_argument('--dtype', choices=list(embedding_io.STORAGE_DTYPES), default='float32',
+                        help='Storage type of the exported embeddings')
+    args = parser.parse_args()
+    process_amazon_data(args.input, args.output_dir, workers=args.workers, dtype=args.dtype)
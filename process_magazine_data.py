@@ -7,10 +7,26 @@
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.decomposition import TruncatedSVD
 from collections import defaultdict
-import struct
+from scipy.sparse import coo_matrix
+import argparse
+import embedding_io
+from ingest import parallel_interactions
+from seen_items import SEEN_FILE, save_seen_items
+
+def load_magazine_data(file_path, workers=1):
+    """Carga los datos de las revistas desde el archivo JSON.
+
+    Con `workers > 1` el JSON se parsea en paralelo y solo se conservan las
+    columnas que usa el pipeline (sin el texto de las reseñas).
+    """
+    if workers > 1:
+        interactions = parallel_interactions(file_path, workers)
+        return pd.DataFrame({
+            'user_id': np.asarray(interactions.user_ids, dtype=object)[interactions.user_codes],
+            'item_id': np.asarray(interactions.item_ids, dtype=object)[interactions.item_codes],
+            'rating': interactions.ratings.astype(float)
+        })
 
-def load_magazine_data(file_path):
-    """Carga los datos de las revistas desde el archivo JSON."""
     reviews = []
     with gzip.open(file_path, 'rt', encoding='utf-8') as f:
         for line in f:
@@ -45,55 +61,58 @@ def preprocess_data(df):
     return filtered_df
 
 def create_interaction_matrix(df):
-    """Crea una matriz de interacciones usuario-ítem."""
-    # Crear matriz de interacciones
-    interactions = df.pivot_table(
-        index='user_id', 
-        columns='item_id', 
-        values='rating', 
-        fill_value=0
-    )
+    """Crea una matriz dispersa de interacciones usuario-ítem."""
+    # Códigos enteros de usuarios e ítems (IDs ordenados, como pivot_table)
+    users = pd.Categorical(df['user_id'])
+    items = pd.Categorical(df['item_id'])
+    shape = (len(users.categories), len(items.categories))
     
-    # Normalizar las calificaciones
-    user_means = interactions.mean(axis=1)
-    interactions = interactions.sub(user_means, axis=0)
+    interactions = average_ratings(users.codes, items.codes,
+                                   df['rating'].to_numpy(dtype=np.float32), shape)
+    interactions, user_means = center_ratings(interactions)
     
+    return interactions, user_means, users.categories, items.categories
+
+def average_ratings(user_codes, item_codes, ratings, shape):
+    """Matriz CSR de valoraciones; las repetidas del mismo par se promedian."""
+    sums = coo_matrix((ratings, (user_codes, item_codes)), shape=shape).tocsr()
+    counts = coo_matrix((np.ones_like(ratings), (user_codes, item_codes)), shape=shape).tocsr()
+    interactions = sums.copy()
+    interactions.data = sums.data / counts.data
+    return interactions
+
+def center_ratings(interactions):
+    """Resta a cada usuario su media, solo en las entradas observadas."""
+    interactions = interactions.copy()
+    observed = np.diff(interactions.indptr)
+    user_means = np.asarray(interactions.sum(axis=1)).ravel() / np.maximum(observed, 1)
+    interactions.data -= np.repeat(user_means, observed).astype(interactions.dtype)
     return interactions, user_means
 
-def generate_embeddings(interactions, n_components=50):
+def generate_embeddings(interactions, user_ids, item_ids, n_components=50):
     """Genera embeddings de usuarios e ítems usando SVD."""
-    # Aplicar SVD a la matriz de interacciones
+    # Aplicar SVD a la matriz dispersa de interacciones (ítems x usuarios)
+    n_components = min(n_components, min(interactions.shape) - 1)
     svd = TruncatedSVD(n_components=n_components, random_state=42)
-    item_embeddings = svd.fit_transform(interactions.T)
+    item_embeddings = svd.fit_transform(interactions.T.tocsr())
     
-    # Calcular embeddings de usuarios
-    user_embeddings = interactions.values @ item_embeddings @ np.linalg.pinv(np.diag(svd.singular_values_[:n_components]))
+    # Calcular embeddings de usuarios: X V = U S -> U = X V / S
+    singular_values = svd.singular_values_
+    user_embeddings = interactions @ (item_embeddings / np.where(singular_values > 0, singular_values, 1))
     
     # Normalizar los embeddings
-    item_embeddings = item_embeddings / np.linalg.norm(item_embeddings, axis=1, keepdims=True)
-    user_embeddings = user_embeddings / np.linalg.norm(user_embeddings, axis=1, keepdims=True)
+    item_embeddings = _normalize_rows(item_embeddings)
+    user_embeddings = _normalize_rows(user_embeddings)
     
-    return user_embeddings, item_embeddings, interactions.columns, interactions.index
+    return user_embeddings, item_embeddings, item_ids, user_ids
+
+def _normalize_rows(embeddings):
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
 
-def save_embeddings(embeddings, ids, path):
-    """Guarda los embeddings en un archivo binario."""
-    with open(path, 'wb') as f:
-        # Número de elementos y dimensión
-        num_items = len(ids)
-        dim = embeddings.shape[1] if num_items > 0 else 0
-        
-        # Escribir encabezado
-        f.write(struct.pack('I', num_items))  # Número de elementos
-        f.write(struct.pack('I', dim))        # Dimensión de los embeddings
-        
-        # Escribir IDs
-        for item_id in ids:
-            item_id_bytes = str(item_id).encode('utf-8')
-            f.write(struct.pack('I', len(item_id_bytes)))  # Longitud del ID
-            f.write(item_id_bytes)                         # Bytes del ID
-        
-        # Escribir embeddings
-        f.write(embeddings.astype(np.float32).tobytes())
+def save_embeddings(embeddings, ids, path, dtype='float32'):
+    """Guarda los embeddings en un archivo binario ('float32', 'float16' o 'int8')."""
+    embedding_io.save_embeddings(path, embeddings, ids, dtype=dtype)
 
 def save_ids(ids, path):
     """Guarda los IDs en un archivo de texto."""
@@ -101,6 +120,13 @@ def save_ids(ids, path):
         f.write('\n'.join(str(id) for id in ids))
 
 def main():
+    parser = argparse.ArgumentParser(description='Genera los embeddings de revistas con SVD')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Procesos para parsear el JSON (1 = en serie)')
+    parser.add_argument('--dtype', choices=list(embedding_io.STORAGE_DTYPES), default='float32',
+                        help='Tipo de almacenamiento de los embeddings')
+    args = parser.parse_args()
+    
     # Rutas de archivos
     data_dir = 'data'
     models_dir = 'models'
@@ -109,7 +135,8 @@ def main():
     
     # Cargar datos
     print("Cargando datos de revistas...")
-    df = load_magazine_data(os.path.join(data_dir, 'Magazine_Subscriptions_5.json.gz'))
+    df = load_magazine_data(os.path.join(data_dir, 'Magazine_Subscriptions_5.json.gz'),
+                            workers=args.workers)
     print(f"Se cargaron {len(df)} reseñas de {df['user_id'].nunique()} usuarios y {df['item_id'].nunique()} revistas.")
     
     # Preprocesar datos
@@ -119,16 +146,22 @@ def main():
     
     # Crear matriz de interacciones
     print("\nCreando matriz de interacciones...")
-    interactions, user_means = create_interaction_matrix(df)
+    interactions, user_means, user_ids, item_ids = create_interaction_matrix(df)
     
     # Generar embeddings
     print("\nGenerando embeddings...")
-    user_embeddings, item_embeddings, item_ids, user_ids = generate_embeddings(interactions)
+    user_embeddings, item_embeddings, item_ids, user_ids = generate_embeddings(
+        interactions, user_ids, item_ids)
     
     # Guardar embeddings
     print("\nGuardando modelos...")
-    save_embeddings(user_embeddings, user_ids, os.path.join(models_dir, 'user_embeddings.bin'))
-    save_embeddings(item_embeddings, item_ids, os.path.join(models_dir, 'item_embeddings.bin'))
+    save_embeddings(user_embeddings, user_ids, os.path.join(models_dir, 'user_embeddings.bin'),
+                    args.dtype)
+    save_embeddings(item_embeddings, item_ids, os.path.join(models_dir, 'item_embeddings.bin'),
+                    args.dtype)
+    
+    # Ítems ya valorados por cada usuario (para no volver a recomendarlos)
+    save_seen_items(os.path.join(models_dir, SEEN_FILE), interactions)
     
     # Guardar IDs
     save_ids(user_ids, os.path.join(data_dir, 'users.txt'))
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+import embedding_io
+from scoring_engine import ScoringEngine
+
+# Convierte un modelo float32 a float16 o int8 (escala por fila) y mide
+# cuánto se parecen sus recomendaciones a las del modelo original.
+
+MODEL_FILES = ('user_embeddings.bin', 'item_embeddings.bin')
+
+
+def quantize_model(models_dir, output_dir, dtype):
+    """Reescribe los embeddings de `models_dir` en `output_dir` con el tipo `dtype`."""
+    os.makedirs(output_dir, exist_ok=True)
+    for name in MODEL_FILES:
+        ids, embeddings = embedding_io.load_embeddings(os.path.join(models_dir, name))
+        embedding_io.save_embeddings(os.path.join(output_dir, name), embeddings,
+                                     list(ids), dtype=dtype)
+
+
+def _engine(models_dir):
+    return ScoringEngine(os.path.join(models_dir, MODEL_FILES[0]),
+                         os.path.join(models_dir, MODEL_FILES[1]))
+
+
+def accuracy_report(reference, engine, top_k=10, num_queries=1000, seed=42):
+    """Solapamiento top-K entre el modelo de referencia y el cuantizado.
+
+    Para una muestra de usuarios compara los `top_k` ítems de ambos motores:
+    `overlap` es la fracción media de ítems compartidos y `exact_match` la
+    fracción de usuarios con la misma lista en el mismo orden.
+    """
+    rng = np.random.default_rng(seed)
+    num_users = len(reference.user_ids)
+    rows = rng.choice(num_users, min(num_queries, num_users), replace=False)
+
+    overlaps = np.empty(len(rows))
+    exact = 0
+    timings = {'reference': 0.0, 'quantized': 0.0}
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        expected = reference.top_items(reference.user_vectors(row), top_k)
+        timings['reference'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = engine.top_items(engine.user_vectors(row), top_k)
+        timings['quantized'] += time.perf_counter() - start
+
+        overlaps[i] = len(set(expected.tolist()) & set(found.tolist())) / max(len(expected), 1)
+        exact += int(np.array_equal(expected, found))
+
+    return {
+        'top_k': top_k,
+        'queries': len(rows),
+        'overlap': float(overlaps.mean()) if len(rows) else 1.0,
+        'overlap_min': float(overlaps.min()) if len(rows) else 1.0,
+        'exact_match': exact / max(len(rows), 1),
+        'reference_ms': timings['reference'] * 1000 / max(len(rows), 1),
+        'quantized_ms': timings['quantized'] * 1000 / max(len(rows), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cuantiza los embeddings y compara su precisión')
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--output-dir', required=True,
+                        help='Carpeta donde escribir el modelo cuantizado')
+    parser.add_argument('--dtype', choices=['float16', 'int8'], default='int8')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--num-queries', type=int, default=1000)
+    parser.add_argument('--report', default=None, help='Archivo JSON para el informe')
+    args = parser.parse_args()
+
+    print(f"Cuantizando {args.models_dir} a {args.dtype} en {args.output_dir}...")
+    quantize_model(args.models_dir, args.output_dir, args.dtype)
+
+    report = accuracy_report(_engine(args.models_dir), _engine(args.output_dir),
+                             args.top_k, args.num_queries)
+    report['dtype'] = args.dtype
+    report['sizes_mb'] = {
+        name: {
+            'float32': os.path.getsize(os.path.join(args.models_dir, name)) / 2**20,
+            args.dtype: os.path.getsize(os.path.join(args.output_dir, name)) / 2**20
+        }
+        for name in MODEL_FILES
+    }
+
+    for name, sizes in report['sizes_mb'].items():
+        print(f"{name}: {sizes['float32']:.2f} MB -> {sizes[args.dtype]:.2f} MB")
+    print(f"Solapamiento top-{args.top_k}: {report['overlap']:.4f} "
+          f"(mínimo {report['overlap_min']:.2f}, idénticas {report['exact_match']:.1%})")
+    print(f"Latencia por consulta: {report['reference_ms']:.3f} ms -> {report['quantized_ms']:.3f} ms")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        print(f"Informe guardado en {args.report}")
+
+
+if __name__ == '__main__':
+    main()
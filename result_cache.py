@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Caché LRU de resultados con caducidad (TTL) opcional.
+
+    Es segura entre hilos y cuenta aciertos, fallos, expulsiones por tamaño,
+    caducidades e invalidaciones para poder dimensionarla en producción.
+    """
+
+    def __init__(self, max_size=1000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Valor guardado para `key` o None si no está (o ha caducado)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Guarda `value` expulsando las entradas menos usadas si hace falta."""
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Vacía la caché (p. ej. al cambiar el modelo)."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+
+class FileVersion:
+    """Versión de un conjunto de archivos según su fecha y tamaño.
+
+    Para no consultar el disco en cada petición, los archivos se revisan
+    como mucho una vez cada `check_interval` segundos.
+    """
+
+    def __init__(self, paths, check_interval=1.0):
+        self.paths = list(paths)
+        self.check_interval = check_interval
+        self._version = self._stat()
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        version = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                version.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    def current(self):
+        """Devuelve (versión, cambió) revisando los archivos si toca."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.check_interval:
+                return self._version, False
+            self._checked_at = now
+            version = self._stat()
+            changed = version != self._version
+            self._version = version
+            return version, changed
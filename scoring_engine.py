@@ -0,0 +1,525 @@
+import os
+import json
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from embedding_io import load_quantized_embeddings, open_norms
+from id_index import IdIndex
+from ann_index import IVFIndex
+from fold_in import FoldInSolver
+from result_cache import ResultCache
+from metrics import stage
+from seen_items import SeenItems
+from similar_items import SimilarItems
+from materialize_topk import TopKTable
+
+# Filas de ítems que se convierten a float32 de una vez al puntuar una matriz
+# cuantizada (float16/int8): el bloque convertido cabe en caché (~1 MB con dim=64)
+ITEM_BLOCK = 4096
+
+# Métricas de puntuación: coseno, producto escalar (el que optimiza ALS) y
+# distancia euclídea (como `utils::euclidean_distance`)
+SCORING_METRICS = ('cosine', 'dot', 'euclidean')
+
+# Por debajo de este número de ítems por fragmento no compensa repartir la
+# búsqueda entre hilos
+MIN_SHARD_ITEMS = 16384
+
+
+class ScoringEngine:
+    """Motor de recomendaciones residente en memoria.
+
+    Carga los embeddings una sola vez y responde las consultas en el propio
+    proceso. Con `metric='cosine'` (por defecto) tiene la misma semántica que
+    `Recommender::get_recommendations`; 'dot' ordena por producto escalar y
+    'euclidean' por distancia euclídea ascendente.
+    """
+
+    def __init__(self, user_embeddings_path, item_embeddings_path, block_size=1024,
+                 ann_index=None, nprobe=8, metric='cosine', shards=None, seen_items=None,
+                 similar_items=None, regularization=0.01, fold_in_cache_size=1000,
+                 topk_table=None, fold_in=False):
+        if metric not in SCORING_METRICS:
+            raise ValueError(f"Métrica desconocida: {metric}")
+        self.metric = metric
+        self.block_size = block_size
+        # Fragmentos de filas de ítems que se puntúan en paralelo (1 = sin hilos)
+        self.shards = shards or os.cpu_count() or 1
+        self._executor = None
+        # Ítems ya vistos por cada usuario (SeenItems); se excluyen del top-K
+        self.seen_items = seen_items
+        # Tabla precalculada de ítems similares (SimilarItems) para /api/similar
+        self.similar_items = similar_items
+        # Top-K precalculado por usuario (TopKTable): los usuarios conocidos se
+        # responden con una lectura de fila
+        self.topk_table = topk_table
+        # Fold-in de usuarios desconocidos (solo con `fold_in`): la matriz de
+        # Gram YᵀY + λI se calcula al cargar, no en la primera petición, y los
+        # vectores se guardan por historial
+        self.regularization = regularization
+        self.fold_in_cache = ResultCache(max_size=fold_in_cache_size)
+        self._fold_in = None
+        # Índice IVF opcional: si está presente se puntúan solo las listas probadas
+        self.ann_index = ann_index
+        self.nprobe = nprobe
+        # Matrices en su tipo de almacenamiento (float32, float16 o int8 + escalas)
+        self.user_ids, self.user_embeddings, self.user_scales = \
+            load_quantized_embeddings(user_embeddings_path)
+        self.item_ids, self.item_embeddings, self.item_scales = \
+            load_quantized_embeddings(item_embeddings_path)
+
+        if self.user_embeddings.shape[1] != self.item_embeddings.shape[1]:
+            raise ValueError("Los embeddings de usuarios e ítems tienen dimensiones distintas")
+
+        # Índices ID -> fila (perezosos)
+        self.user_index = IdIndex.for_embeddings(user_embeddings_path, self.user_ids)
+        self.item_index = IdIndex.for_embeddings(item_embeddings_path, self.item_ids)
+
+        # Normas de los ítems: las guardadas en el archivo o calculadas al cargar.
+        # Si la matriz ya está normalizada el coseno es directamente el producto.
+        norms, self.items_normalized = open_norms(item_embeddings_path)
+        self.item_norms = np.asarray(norms) if norms is not None else self._item_norms()
+        self._inv_item_norms = np.divide(1.0, self.item_norms,
+                                         out=np.zeros_like(self.item_norms),
+                                         where=self.item_norms > 0)
+        self._item_sq_norms = np.square(self.item_norms)
+
+        if seen_items is not None and (seen_items.num_users != len(self.user_ids) or
+                                       seen_items.num_items != len(self.item_ids)):
+            print("ADVERTENCIA: Los ítems vistos no corresponden a los embeddings "
+                  "(otro entrenamiento); no se excluirán")
+            self.seen_items = None
+
+        if ann_index is not None and not ann_index.matches(
+                item_embeddings_path, len(self.item_ids), self.item_embeddings.shape[1]):
+            print("ADVERTENCIA: El índice IVF no corresponde a los embeddings de ítems "
+                  "(reconstrúyelo con ann_index.py); se usará la búsqueda exacta")
+            self.ann_index = None
+
+        if similar_items is not None and (len(similar_items) != len(self.item_ids) or
+                                          not similar_items.matches(item_embeddings_path)):
+            print("ADVERTENCIA: La tabla de ítems similares no corresponde a los "
+                  "embeddings de ítems; se ignorará")
+            self.similar_items = None
+
+        if topk_table is not None and not topk_table.matches(
+                user_embeddings_path, item_embeddings_path, metric,
+                self.seen_items is not None):
+            print("ADVERTENCIA: La tabla de top-K precalculado no corresponde al modelo "
+                  "o a la configuración; se puntuará en vivo")
+            self.topk_table = None
+
+        if fold_in:
+            self._fold_in = FoldInSolver(self.item_embeddings, self.regularization,
+                                         self.item_scales)
+
+    @classmethod
+    def from_config(cls, config_path, base_dir=None, model_dir=None, materialized=False,
+                    fold_in=None):
+        """Crea el motor a partir de las rutas de `model_paths` en config.json.
+
+        Con `model_dir` (p. ej. una versión del registro) los archivos del
+        modelo se buscan en esa carpeta con el mismo nombre. Con
+        `materialized` se abre además la tabla de top-K precalculado.
+        `fold_in` sustituye a `serving.fold_in` (p. ej. False en procesos
+        que solo puntúan usuarios conocidos).
+        """
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        if base_dir is None:
+            base_dir = os.path.dirname(os.path.abspath(config_path))
+
+        def model_path(path):
+            if model_dir is not None:
+                return os.path.join(model_dir, os.path.basename(path))
+            return os.path.join(base_dir, path)
+
+        paths = config['model_paths']
+        serving = config.get('serving', {})
+        ann = config.get('ann', {})
+        recommendation = config.get('recommendation', {})
+        training = config.get('training', {})
+        system = config.get('system', {})
+
+        seen_items = None
+        if recommendation.get('exclude_seen', True) and 'seen_items' in paths:
+            seen_path = model_path(paths['seen_items'])
+            if os.path.exists(seen_path):
+                seen_items = SeenItems(seen_path)
+
+        similar_items = None
+        if 'similar_items' in paths and os.path.exists(model_path(paths['similar_items'])):
+            similar_items = SimilarItems(model_path(paths['similar_items']))
+
+        topk_table = None
+        if materialized and 'user_topk' in paths:
+            topk_path = model_path(paths['user_topk'])
+            if os.path.exists(topk_path):
+                topk_table = TopKTable(topk_path)
+            else:
+                print(f"ADVERTENCIA: {topk_path} no existe; se puntuará en vivo")
+
+        ann_index = None
+        if ann.get('enabled', False):
+            ann_path = model_path(ann['index_path'])
+            if os.path.exists(ann_path) or model_dir is None:
+                ann_index = IVFIndex.open(ann_path)
+            else:
+                print(f"ADVERTENCIA: {ann_path} no existe; se usará la búsqueda exacta")
+
+        return cls(
+            model_path(paths['user_embeddings']),
+            model_path(paths['item_embeddings']),
+            block_size=serving.get('batch_block_size', 1024),
+            ann_index=ann_index,
+            nprobe=ann.get('nprobe', 8),
+            metric=recommendation.get('metric', 'cosine'),
+            shards=serving.get('shards'),
+            seen_items=seen_items,
+            similar_items=similar_items,
+            regularization=training.get('regularization', 0.01),
+            fold_in_cache_size=system.get('cache_size', 1000),
+            topk_table=topk_table,
+            fold_in=serving.get('fold_in', True) if fold_in is None else fold_in
+        )
+
+    def close(self):
+        """Detiene los hilos de la búsqueda por fragmentos (si se crearon)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def get_recommendations(self, user_id, top_k=10, items=None, ratings=None):
+        """Devuelve los `top_k` ítems más similares al usuario.
+
+        Si el usuario no está en el modelo pero se pasan los `items` con los
+        que ha interactuado (y opcionalmente sus `ratings`), su vector se
+        calcula al vuelo con `fold_in`.
+        """
+        idx = self.user_index.get(user_id) if user_id is not None else None
+        if idx is None:
+            return self.recommend_for_items(items, ratings, top_k) if items else []
+
+        if self.topk_table is not None and 0 < top_k <= self.topk_table.top_k:
+            return [self.item_ids[i] for i in self.topk_table.row(idx, top_k) if i >= 0]
+
+        rows = self.top_items(self.user_vectors(idx), top_k, self.ann_index, self.nprobe,
+                              exclude=self.seen_rows(idx))
+        return [self.item_ids[i] for i in rows]
+
+    def recommend_for_items(self, items, ratings=None, top_k=10):
+        """Recomendaciones para un historial de ítems; los ítems enviados se excluyen."""
+        folded = self.fold_in(items, ratings)
+        if folded is None:
+            return []
+
+        vector, item_rows = folded
+        rows = self.top_items(vector, top_k, self.ann_index, self.nprobe, exclude=item_rows)
+        return [self.item_ids[i] for i in rows]
+
+    def fold_in(self, items, ratings=None):
+        """Vector de usuario para una lista de IDs de ítems (con valoraciones opcionales).
+
+        Resuelve el problema de mínimos cuadrados regularizado de ALS contra
+        los factores de ítems congelados. Sin `ratings` cada interacción
+        cuenta como 1 y las repetidas se suman. Devuelve (vector, filas de
+        ítems ordenadas) o None si ningún ítem es conocido o el motor se
+        creó sin `fold_in`.
+        """
+        if self._fold_in is None:
+            return None
+        rows = self.item_index.get_many([str(item) for item in items])
+        if ratings is None:
+            confidences = np.ones(len(rows), dtype=np.float64)
+        else:
+            confidences = np.asarray(ratings, dtype=np.float64)
+            if confidences.shape != rows.shape:
+                raise ValueError("Se necesita una valoración por ítem")
+
+        known = rows >= 0
+        if not known.any():
+            return None
+        rows, inverse = np.unique(rows[known], return_inverse=True)
+        confidences = np.bincount(inverse, weights=confidences[known])
+
+        key = (rows.tobytes(), confidences.tobytes())
+        vector = self.fold_in_cache.get(key)
+        if vector is None:
+            with stage('fold_in'):
+                vector = self._fold_in.solve(rows, confidences)
+            self.fold_in_cache.put(key, vector)
+        return vector, rows
+
+    def seen_rows(self, user_row):
+        """Filas de ítems ya vistas por un usuario (None si no se filtran)."""
+        if self.seen_items is None:
+            return None
+        return self.seen_items.row(user_row)
+
+    def top_items(self, user, top_k, ann_index=None, nprobe=None, exclude=None):
+        """Filas de los `top_k` ítems más similares a un vector de usuario.
+
+        Sin `ann_index` la búsqueda es exacta sobre todo el catálogo; con él
+        solo se puntúan los ítems de las `nprobe` listas más cercanas. Las
+        filas de `exclude` (ordenadas) se descartan antes de elegir el top-K.
+        """
+        if exclude is not None and len(exclude) == 0:
+            exclude = None
+
+        if ann_index is None:
+            if self._num_shards() > 1:
+                return self._sharded_top_items(user, top_k, exclude)
+            with stage('scoring'):
+                scores = self._scores(user)
+                if exclude is not None:
+                    scores[exclude] = -np.inf
+            with stage('sorting'):
+                return _drop_excluded(top_k_indices(scores, top_k), scores, exclude)
+
+        with stage('scoring'):
+            candidates = ann_index.candidates(user, nprobe or self.nprobe)
+            scores = self._scores(user, candidates)
+            if exclude is not None:
+                scores[np.isin(candidates, exclude)] = -np.inf
+        with stage('sorting'):
+            top = _drop_excluded(top_k_indices(scores, top_k), scores, exclude)
+            return candidates[top]
+
+    def _num_shards(self):
+        return max(min(self.shards, len(self.item_ids) // MIN_SHARD_ITEMS), 1)
+
+    def _sharded_top_items(self, user, top_k, exclude=None):
+        """Búsqueda exacta repartida en fragmentos contiguos de filas de ítems.
+
+        Cada fragmento es una vista de la matriz (mapeada en memoria, sin
+        copias) que un hilo puntúa y reduce a su propio top-K; numpy libera
+        el GIL durante el producto. Las listas de los fragmentos se mezclan
+        después con un heap.
+        """
+        num_shards = self._num_shards()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.shards,
+                                                thread_name_prefix='scoring-shard')
+        bounds = np.linspace(0, len(self.item_ids), num_shards + 1).astype(np.int64)
+
+        def score_shard(start, stop):
+            scores = self._scores(user, slice(start, stop))
+            if exclude is not None:
+                lo, hi = np.searchsorted(exclude, [start, stop])
+                scores[exclude[lo:hi] - start] = -np.inf
+            rows = _drop_excluded(top_k_indices(scores, top_k), scores, exclude)
+            return list(zip(scores[rows].tolist(), (rows + start).tolist()))
+
+        with stage('scoring'):
+            shard_results = list(self._executor.map(score_shard, bounds[:-1], bounds[1:]))
+        with stage('sorting'):
+            merged = heapq.merge(*shard_results, key=lambda entry: -entry[0])
+            return np.array([row for _, row in itertools.islice(merged, top_k)],
+                            dtype=np.int64)
+
+    def recommend_batch(self, user_ids, top_k=10, block_size=None):
+        """Recomendaciones para muchos usuarios a la vez.
+
+        Los usuarios se puntúan por bloques de `block_size` filas con un único
+        producto `U_bloque @ I.T`, de modo que la memoria auxiliar queda
+        acotada a `block_size * num_items` puntuaciones. Si hay tabla de top-K
+        precalculado y `top_k` cabe en ella, se leen sus filas. Devuelve un
+        dict user_id -> lista de ítems (vacía para usuarios desconocidos).
+        """
+        results = {user_id: [] for user_id in user_ids}
+
+        unique_ids = list(results)
+        rows = self.user_index.get_many(unique_ids)
+        known = np.flatnonzero(rows >= 0)
+
+        if self.topk_table is not None and 0 < top_k <= self.topk_table.top_k:
+            top = self.topk_table.rows(rows[known], top_k)
+        else:
+            top = self.top_item_rows(rows[known], top_k, block_size)
+        for pos, item_rows in zip(known, top):
+            results[unique_ids[pos]] = [self.item_ids[i] for i in item_rows if i >= 0]
+        return results
+
+    def top_item_rows(self, user_rows, top_k=10, block_size=None, return_scores=False):
+        """Filas de los `top_k` ítems de varias filas de usuarios.
+
+        Devuelve una matriz (usuarios, top_k); si al excluir los ítems vistos
+        no quedan suficientes, los huecos del final valen -1. Con
+        `return_scores` devuelve además sus puntuaciones (float32, -inf en
+        los huecos).
+        """
+        block_size = block_size or self.block_size
+        user_rows = np.asarray(user_rows, dtype=np.int64)
+        top_k = max(min(top_k, len(self.item_ids)), 0)
+        result = np.full((len(user_rows), top_k), -1, dtype=np.int64)
+        result_scores = np.full((len(user_rows), top_k), -np.inf, dtype=np.float32)
+
+        if self.ann_index is not None:
+            for i, row in enumerate(user_rows):
+                user = self.user_vectors(row)
+                item_rows = self.top_items(user, top_k, self.ann_index, self.nprobe,
+                                           exclude=self.seen_rows(row))
+                result[i, :len(item_rows)] = item_rows
+                if return_scores and len(item_rows):
+                    result_scores[i, :len(item_rows)] = self._scores(user, item_rows)
+            return (result, result_scores) if return_scores else result
+
+        for start in range(0, len(user_rows), block_size):
+            block = user_rows[start:start + block_size]
+            with stage('scoring'):
+                scores = self._scores(self.user_vectors(block))
+                if self.seen_items is not None:
+                    # Enmascarar todo el bloque de una vez con los pares (usuario, ítem)
+                    scores[self.seen_items.rows_coo(block)] = -np.inf
+            with stage('sorting'):
+                top = top_k_indices(scores, top_k)
+                top_scores = np.take_along_axis(scores, top, axis=-1)
+                if self.seen_items is not None:
+                    top[~np.isfinite(top_scores)] = -1
+            result[start:start + len(block)] = top
+            result_scores[start:start + len(block)] = top_scores
+        return (result, result_scores) if return_scores else result
+
+    def get_similar_items(self, item_id, top_k=10):
+        """Los `top_k` ítems más parecidos a `item_id` según la tabla precalculada.
+
+        Es una sola lectura de fila; devuelve None si no hay tabla y una
+        lista vacía si el ítem no existe.
+        """
+        if self.similar_items is None:
+            return None
+        idx = self.item_index.get(item_id)
+        if idx is None:
+            return []
+
+        rows, similarities = self.similar_items.row(idx, top_k)
+        return [{'item_id': self.item_ids[row], 'similarity': float(similarity)}
+                for row, similarity in zip(rows, similarities)]
+
+    def get_similarity(self, user_id, item_id):
+        """Similitud coseno entre un usuario y un ítem (-1.0 si no existen)."""
+        user_idx = self.user_index.get(user_id)
+        item_idx = self.item_index.get(item_id)
+        if user_idx is None or item_idx is None:
+            return -1.0
+
+        user = self.user_vectors(user_idx)
+        item = _dequantize_rows(self.item_embeddings, self.item_scales, item_idx)
+        denom = np.linalg.norm(user) * self.item_norms[item_idx]
+        if denom <= 0:
+            return 0.0
+        return float(np.dot(user, item) / denom)
+
+    def user_vectors(self, rows):
+        """Vectores float32 de una o varias filas de usuarios."""
+        return _dequantize_rows(self.user_embeddings, self.user_scales, rows)
+
+    def _item_norms(self):
+        """Norma L2 de cada ítem, calculada por bloques sobre la matriz almacenada."""
+        items = self.item_embeddings
+        if items.dtype == np.float32:
+            return np.linalg.norm(items, axis=1)
+
+        norms = np.empty(len(items), dtype=np.float32)
+        for start in range(0, len(items), ITEM_BLOCK):
+            block = np.asarray(items[start:start + ITEM_BLOCK], dtype=np.float32)
+            norms[start:start + ITEM_BLOCK] = np.linalg.norm(block, axis=1)
+        if self.item_scales is not None:
+            norms *= self.item_scales
+        return norms
+
+    def _item_dots(self, users, item_rows=None):
+        """Productos escalares usuario-ítem sobre la matriz almacenada.
+
+        Con float32 es un único producto de matrices. Con float16/int8 los
+        ítems se convierten a float32 por bloques de ITEM_BLOCK filas (no hay
+        GEMM de enteros en numpy) y, en int8, el resultado de cada columna se
+        multiplica por la escala de su fila.
+        """
+        items, scales = self.item_embeddings, self.item_scales
+        if item_rows is not None:
+            items = items[item_rows]
+            scales = scales[item_rows] if scales is not None else None
+
+        if items.dtype == np.float32:
+            dots = users @ items.T
+        else:
+            dots = np.empty(users.shape[:-1] + (len(items),), dtype=np.float32)
+            for start in range(0, len(items), ITEM_BLOCK):
+                block = np.asarray(items[start:start + ITEM_BLOCK], dtype=np.float32)
+                dots[..., start:start + ITEM_BLOCK] = users @ block.T
+
+        if scales is not None:
+            dots *= scales
+        return dots
+
+    def _scores(self, users, item_rows=None):
+        """Puntuaciones (mayor es mejor) de uno o varios usuarios contra los ítems.
+
+        Todas las métricas parten de un único producto usuario-ítem más las
+        normas precalculadas: coseno = dot / (|u| |i|), producto escalar tal
+        cual y, para la euclídea, menos la distancia al cuadrado
+        (2 u·i - |i|² - |u|²). Por defecto contra todo el catálogo;
+        `item_rows` (filas o un slice, que no copia) limita el cálculo a un
+        subconjunto de ítems.
+        """
+        dots = self._item_dots(users, item_rows)
+        if self.metric == 'dot':
+            return dots
+
+        keepdims = users.ndim > 1
+        if self.metric == 'euclidean':
+            item_sq_norms = self._item_sq_norms
+            if item_rows is not None:
+                item_sq_norms = item_sq_norms[item_rows]
+            dots *= 2
+            dots -= item_sq_norms
+            dots -= np.sum(np.square(users), axis=-1, keepdims=keepdims)
+            return dots
+
+        if not self.items_normalized:
+            inv_item_norms = self._inv_item_norms
+            if item_rows is not None:
+                inv_item_norms = inv_item_norms[item_rows]
+            dots *= inv_item_norms
+        user_norms = np.linalg.norm(users, axis=-1, keepdims=keepdims)
+        dots *= np.divide(1.0, user_norms, out=np.zeros_like(user_norms), where=user_norms > 0)
+        return dots
+
+
+def _dequantize_rows(matrix, scales, rows):
+    """Filas `rows` de una matriz almacenada, como float32."""
+    vectors = np.asarray(matrix[rows], dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales[rows], dtype=np.float32)[..., None]
+    return vectors
+
+
+def _drop_excluded(rows, scores, exclude):
+    """Quita del top-K los ítems excluidos (con puntuación -inf)."""
+    if exclude is None:
+        return rows
+    return rows[np.isfinite(scores[rows])]
+
+
+def top_k_indices(scores, k):
+    """Índices de las `k` mayores puntuaciones (por fila), en orden descendente.
+
+    Usa `argpartition` para seleccionar los candidatos en O(n) y solo ordena
+    los `k` elegidos.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=-1)
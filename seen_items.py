@@ -0,0 +1,59 @@
+import numpy as np
+
+from array_bundle import save_array_bundle, open_array_bundle
+
+# Ítems con los que ya interactuó cada usuario, como matriz CSR compacta
+# (indptr int64 + indices int32 ordenados por fila) mapeable en memoria.
+# Las filas siguen el orden de user_embeddings.bin y las columnas el de
+# item_embeddings.bin.
+SEEN_MAGIC = b'RECSEEN1'
+SEEN_FILE = 'seen_items.bin'
+
+
+def save_seen_items(path, interactions):
+    """Guarda el patrón de una matriz usuario x ítem (scipy.sparse)."""
+    csr = interactions.tocsr(copy=True)
+    csr.sum_duplicates()
+    csr.sort_indices()
+    save_array_bundle(path, SEEN_MAGIC, {
+        'indptr': csr.indptr.astype(np.int64),
+        'indices': csr.indices.astype(np.int32)
+    }, {'num_users': csr.shape[0], 'num_items': csr.shape[1]})
+
+
+class SeenItems:
+    """Consulta de los ítems vistos por usuario sobre el archivo mapeado."""
+
+    def __init__(self, path):
+        arrays, meta = open_array_bundle(path, SEEN_MAGIC)
+        self.indptr = arrays['indptr']
+        self.indices = arrays['indices']
+        self.num_users = meta['num_users']
+        self.num_items = meta['num_items']
+
+    def __len__(self):
+        return self.num_users
+
+    def row(self, user_row):
+        """Filas de ítems vistas por un usuario (vista ordenada, sin copia)."""
+        if user_row >= self.num_users:
+            return self.indices[:0]
+        return self.indices[self.indptr[user_row]:self.indptr[user_row + 1]]
+
+    def rows_coo(self, user_rows):
+        """Pares (posición en `user_rows`, fila de ítem) de varios usuarios.
+
+        Sirve para enmascarar de una vez un bloque de puntuaciones
+        `scores[positions, items]`.
+        """
+        user_rows = np.asarray(user_rows, dtype=np.int64)
+        known = user_rows < self.num_users
+        starts = np.where(known, self.indptr[np.minimum(user_rows, self.num_users - 1)], 0)
+        ends = np.where(known, self.indptr[np.minimum(user_rows, self.num_users - 1) + 1], 0)
+        lengths = ends - starts
+        total = int(lengths.sum())
+
+        positions = np.repeat(np.arange(len(user_rows)), lengths)
+        # Índice dentro de `indices`: inicio de la fila + desplazamiento dentro de ella
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return positions, np.asarray(self.indices[np.repeat(starts, lengths) + offsets])
@@ -0,0 +1,208 @@
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from array_bundle import save_array_bundle, open_array_bundle
+from embedding_io import file_fingerprint, load_quantized_embeddings, open_norms
+
+# Tabla de vecinos ítem -> ítem precalculada: para cada fila de
+# item_embeddings.bin, las filas de sus `top_m` ítems más similares (coseno)
+# en orden descendente, como matrices de ancho fijo int32 (filas) y float32
+# (similitudes) mapeables en memoria. Responder a un ítem es leer una fila.
+SIMILAR_MAGIC = b'RECSIM01'
+SIMILAR_FILE = 'similar_items.bin'
+
+# Estado de cada proceso de cálculo (lo fija `_init_worker`)
+_ITEMS = None
+_SCALES = None
+_INV_NORMS = None
+
+
+def _init_worker(item_path, inv_norms):
+    global _ITEMS, _SCALES, _INV_NORMS
+    # Los archivos v2 se mapean: todos los procesos comparten las páginas
+    _, _ITEMS, _SCALES = load_quantized_embeddings(item_path)
+    _INV_NORMS = inv_norms
+
+
+def _unit_rows(start, stop):
+    """Filas [start, stop) como vectores float32 de norma 1."""
+    vectors = np.asarray(_ITEMS[start:stop], dtype=np.float32)
+    factors = _INV_NORMS[start:stop]
+    if _SCALES is not None:
+        factors = factors * _SCALES[start:stop]
+    return vectors * factors[:, None]
+
+
+def _select(rows, scores, top_m):
+    """Los `top_m` mejores candidatos de cada fila de `scores` (sin ordenar).
+
+    `rows` da la fila de ítem de cada columna: un vector común a todas las
+    filas o una matriz con la misma forma que `scores`.
+    """
+    if scores.shape[1] <= top_m:
+        return np.broadcast_to(rows, scores.shape), scores
+    keep = np.argpartition(-scores, top_m - 1, axis=1)[:, :top_m]
+    rows = rows[keep] if rows.ndim == 1 else np.take_along_axis(rows, keep, axis=1)
+    return rows, np.take_along_axis(scores, keep, axis=1)
+
+
+def _neighbour_block(start, stop, top_m, tile_size):
+    """Vecinos de las filas [start, stop) recorriendo el catálogo por tiles.
+
+    Cada tile produce una matriz de (stop - start) x tile_size similitudes;
+    de ella solo se conservan los `top_m` mejores candidatos por fila, que se
+    fusionan con los acumulados, así que la memoria no depende del número
+    de ítems.
+    """
+    queries = _unit_rows(start, stop)
+    num_items = len(_ITEMS)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+    for tile_start in range(0, num_items, tile_size):
+        tile_stop = min(tile_start + tile_size, num_items)
+        scores = queries @ _unit_rows(tile_start, tile_stop).T
+
+        # Un ítem no es vecino de sí mismo
+        lo, hi = max(start, tile_start), min(stop, tile_stop)
+        if lo < hi:
+            diagonal = np.arange(lo, hi)
+            scores[diagonal - start, diagonal - tile_start] = -np.inf
+
+        rows, scores = _select(np.arange(tile_start, tile_stop), scores, top_m)
+        best_rows, best_scores = _select(np.concatenate([best_rows, rows], axis=1),
+                                         np.concatenate([best_scores, scores], axis=1), top_m)
+
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return (start,
+            np.take_along_axis(best_rows, order, axis=1).astype(np.int32),
+            np.take_along_axis(best_scores, order, axis=1))
+
+
+def _inverse_norms(item_path):
+    """Inversas de las normas de los ítems (0 para vectores nulos)."""
+    norms, _ = open_norms(item_path)
+    if norms is None:
+        _, matrix, scales = load_quantized_embeddings(item_path)
+        norms = np.linalg.norm(np.asarray(matrix, dtype=np.float32), axis=1)
+        if scales is not None:
+            norms *= scales
+    norms = np.asarray(norms, dtype=np.float32)
+    return np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+
+def build_similar_items(item_path, top_m=20, block_size=1024, tile_size=8192, workers=None):
+    """Calcula los `top_m` vecinos de cada ítem.
+
+    Las filas se reparten en bloques de `block_size` entre `workers`
+    procesos (1 = en este proceso). Devuelve las matrices de filas (int32)
+    y similitudes (float32) con forma (ítems, top_m).
+    """
+    workers = workers or os.cpu_count() or 1
+    inv_norms = _inverse_norms(item_path)
+    num_items = len(inv_norms)
+    top_m = min(top_m, max(num_items - 1, 0))
+
+    neighbours = np.zeros((num_items, top_m), dtype=np.int32)
+    similarities = np.zeros((num_items, top_m), dtype=np.float32)
+    if top_m == 0:
+        return neighbours, similarities
+
+    def store(result):
+        start, rows, scores = result
+        neighbours[start:start + len(rows)] = rows
+        similarities[start:start + len(rows)] = scores
+
+    blocks = [(start, min(start + block_size, num_items))
+              for start in range(0, num_items, block_size)]
+    if workers <= 1:
+        _init_worker(item_path, inv_norms)
+        for start, stop in blocks:
+            store(_neighbour_block(start, stop, top_m, tile_size))
+        return neighbours, similarities
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(item_path, inv_norms)) as executor:
+        # Limitar los bloques en vuelo para acotar la memoria
+        pending = deque()
+        for start, stop in blocks:
+            pending.append(executor.submit(_neighbour_block, start, stop, top_m, tile_size))
+            if len(pending) >= 2 * workers:
+                store(pending.popleft().result())
+        while pending:
+            store(pending.popleft().result())
+    return neighbours, similarities
+
+
+def save_similar_items(path, neighbours, similarities, item_path):
+    """Guarda la tabla de vecinos en `path` (mapeable en memoria).
+
+    Los metadatos guardan la huella de los embeddings de `item_path` con los
+    que se calculó, para no servir la tabla de otro entrenamiento.
+    """
+    save_array_bundle(path, SIMILAR_MAGIC, {
+        'neighbours': neighbours.astype(np.int32),
+        'similarities': similarities.astype(np.float32)
+    }, {'num_items': len(neighbours), 'top_m': int(neighbours.shape[1]),
+        'items': file_fingerprint(item_path)})
+
+
+class SimilarItems:
+    """Consulta de la tabla de vecinos sobre el archivo mapeado."""
+
+    def __init__(self, path):
+        arrays, meta = open_array_bundle(path, SIMILAR_MAGIC)
+        self.neighbours = arrays['neighbours']
+        self.similarities = arrays['similarities']
+        self.meta = meta
+        self.num_items = meta['num_items']
+        self.top_m = meta['top_m']
+
+    def __len__(self):
+        return self.num_items
+
+    def matches(self, item_path):
+        """Indica si la tabla se calculó con los embeddings de `item_path`."""
+        return self.meta.get('items') == file_fingerprint(item_path)
+
+    def row(self, item_row, top_k=None):
+        """Filas de los vecinos de un ítem y sus similitudes (sin copia).
+
+        Con `top_k` mayor que `top_m` se devuelven los `top_m` guardados.
+        """
+        # Un top_k negativo recortaría desde el final en lugar de fallar
+        top_k = self.top_m if top_k is None else top_k
+        if top_k < 1:
+            raise ValueError("top_k debe ser un entero positivo")
+        return self.neighbours[item_row, :top_k], self.similarities[item_row, :top_k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precalcula los ítems similares de cada ítem')
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--top-m', type=int, default=20, help='Vecinos por ítem')
+    parser.add_argument('--block-size', type=int, default=1024,
+                        help='Filas de ítems por tarea')
+    parser.add_argument('--tile-size', type=int, default=8192,
+                        help='Ítems puntuados de una vez contra cada bloque')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    item_path = os.path.join(args.models_dir, 'item_embeddings.bin')
+    output_path = os.path.join(args.models_dir, SIMILAR_FILE)
+
+    print(f"Calculando los {args.top_m} vecinos de cada ítem con {args.workers} procesos...")
+    start = time.perf_counter()
+    neighbours, similarities = build_similar_items(
+        item_path, args.top_m, args.block_size, args.tile_size, args.workers)
+    save_similar_items(output_path, neighbours, similarities, item_path)
+    print(f"Tabla de {len(neighbours)} ítems x {neighbours.shape[1]} vecinos guardada en "
+          f"{output_path} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@
 #include <iostream>
 #include <sstream>
 #include <stdexcept>
+#include <cstring>
+#include <cstdint>
 
 namespace recommender {
 
@@ -19,6 +21,15 @@ bool Loader::load_embeddings(const std::string& path,
             return false;
         }
         
+        // Files in format v2 start with a magic string
+        char magic[sizeof(EMBEDDINGS_V2_MAGIC) - 1];
+        file.read(magic, sizeof(magic));
+        if (file && std::memcmp(magic, EMBEDDINGS_V2_MAGIC, sizeof(magic)) == 0) {
+            return load_embeddings_v2(file, embeddings, ids);
+        }
+        file.clear();
+        file.seekg(0);
+        
         // Read number of items and embedding dimension
         uint32_t num_items, dim;
         file.read(reinterpret_cast<char*>(&num_items), sizeof(num_items));
@@ -48,6 +59,106 @@ bool Loader::load_embeddings(const std::string& path,
     }
 }
 
+bool Loader::load_embeddings_v2(std::ifstream& file,
+                               std::vector<float>& embeddings,
+                               std::vector<std::string>& ids) {
+    // Fixed 64-byte header (magic already consumed)
+    uint32_t version, dtype, dim, flags;
+    uint64_t num_items, ids_offset, matrix_offset, scales_offset, norms_offset;
+    file.read(reinterpret_cast<char*>(&version), sizeof(version));
+    file.read(reinterpret_cast<char*>(&dtype), sizeof(dtype));
+    file.read(reinterpret_cast<char*>(&num_items), sizeof(num_items));
+    file.read(reinterpret_cast<char*>(&dim), sizeof(dim));
+    file.read(reinterpret_cast<char*>(&flags), sizeof(flags));
+    file.read(reinterpret_cast<char*>(&ids_offset), sizeof(ids_offset));
+    file.read(reinterpret_cast<char*>(&matrix_offset), sizeof(matrix_offset));
+    file.read(reinterpret_cast<char*>(&scales_offset), sizeof(scales_offset));
+    // Stored row norms are not needed here: Recommender computes them at load
+    file.read(reinterpret_cast<char*>(&norms_offset), sizeof(norms_offset));
+    
+    bool known_dtype = dtype == DTYPE_FLOAT32 || dtype == DTYPE_FLOAT16 ||
+                       (dtype == DTYPE_INT8 && scales_offset != 0);
+    if (!file || version != 2 || !known_dtype) {
+        std::cerr << "Unsupported embeddings file (version " << version
+                  << ", dtype " << dtype << ")" << std::endl;
+        return false;
+    }
+    
+    // Read ID offsets and the contiguous ID blob
+    std::vector<uint64_t> offsets(num_items + 1);
+    file.seekg(static_cast<std::streamoff>(ids_offset));
+    file.read(reinterpret_cast<char*>(offsets.data()), offsets.size() * sizeof(uint64_t));
+    
+    std::string blob(offsets.back(), '\0');
+    file.read(&blob[0], static_cast<std::streamsize>(blob.size()));
+    
+    ids.resize(num_items);
+    for (uint64_t i = 0; i < num_items; ++i) {
+        ids[i] = blob.substr(offsets[i], offsets[i + 1] - offsets[i]);
+    }
+    
+    // Read embeddings from the aligned matrix block
+    size_t total_floats = static_cast<size_t>(num_items) * dim;
+    embeddings.resize(total_floats);
+    file.seekg(static_cast<std::streamoff>(matrix_offset));
+    
+    if (dtype == DTYPE_FLOAT32) {
+        file.read(reinterpret_cast<char*>(embeddings.data()),
+                 total_floats * sizeof(float));
+    } else if (dtype == DTYPE_FLOAT16) {
+        // Dequantize half-precision values to float
+        std::vector<uint16_t> halves(total_floats);
+        file.read(reinterpret_cast<char*>(halves.data()), total_floats * sizeof(uint16_t));
+        for (size_t i = 0; i < total_floats; ++i) {
+            embeddings[i] = half_to_float(halves[i]);
+        }
+    } else {
+        // Dequantize int8 values with the per-row scale
+        std::vector<int8_t> values(total_floats);
+        file.read(reinterpret_cast<char*>(values.data()), total_floats);
+        std::vector<float> scales(num_items);
+        file.seekg(static_cast<std::streamoff>(scales_offset));
+        file.read(reinterpret_cast<char*>(scales.data()), num_items * sizeof(float));
+        for (uint64_t row = 0; row < num_items; ++row) {
+            for (uint32_t col = 0; col < dim; ++col) {
+                size_t i = static_cast<size_t>(row) * dim + col;
+                embeddings[i] = values[i] * scales[row];
+            }
+        }
+    }
+    
+    return file.good();
+}
+
+float Loader::half_to_float(uint16_t half) {
+    uint32_t sign = static_cast<uint32_t>(half & 0x8000) << 16;
+    uint32_t exponent = (half >> 10) & 0x1F;
+    uint32_t mantissa = half & 0x3FF;
+    
+    uint32_t bits;
+    if (exponent == 0) {
+        if (mantissa == 0) {
+            bits = sign;
+        } else {
+            // Subnormal: normalize the mantissa
+            exponent = 127 - 15 + 1;
+            while ((mantissa & 0x400) == 0) {
+                mantissa <<= 1;
+                --exponent;
+            }
+            bits = sign | (exponent << 23) | ((mantissa & 0x3FF) << 13);
+        }
+    } else if (exponent == 0x1F) {
+        bits = sign | 0x7F800000 | (mantissa << 13);  // Inf / NaN
+    } else {
+        bits = sign | ((exponent + 127 - 15) << 23) | (mantissa << 13);
+    }
+    
+    float value;
+    std::memcpy(&value, &bits, sizeof(value));
+    return value;
+}
+
 bool Loader::load_text_data(const std::string& path, 
                            std::vector<std::string>& data) {
     if (!validate_file(path)) {
@@ -1,5 +1,6 @@
 #include <iostream>
 #include <string>
+#include <chrono>
 #include <filesystem>
 #include <nlohmann/json.hpp>
 #include "recommender.hpp"
@@ -19,6 +20,7 @@ int main(int argc, char* argv[]) {
     fs::path config_path = exe_path.parent_path() / "config.json";
 
     // Initialize recommender
+    auto start = std::chrono::steady_clock::now();
     recommender::Recommender recommender(config_path.string());
     
     // Initialize with embeddings and data
@@ -27,9 +29,17 @@ int main(int argc, char* argv[]) {
         return 1;
     }
 
+    auto loaded = std::chrono::steady_clock::now();
+
     // Get recommendations
     std::string user_id = argv[1];
     std::vector<std::string> recommendations = recommender.get_recommendations(user_id);
+    auto scored = std::chrono::steady_clock::now();
+
+    // Stage timings for the web service metrics (stderr keeps stdout unchanged)
+    using ms = std::chrono::duration<double, std::milli>;
+    std::cerr << "timing load_ms=" << ms(loaded - start).count()
+              << " recommend_ms=" << ms(scored - loaded).count() << std::endl;
 
     // Print results
     std::cout << "Recommendations for user " << user_id << ":" << std::endl;
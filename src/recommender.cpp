@@ -5,6 +5,7 @@
 #include <iostream>
 #include <stdexcept>
 #include <algorithm>
+#include <cmath>
 
 using json = nlohmann::json;
 
@@ -29,6 +30,28 @@ bool Recommender::initialize() {
             return false;
         }
         
+        // Build ID -> row lookup tables
+        user_index.reserve(user_ids.size());
+        for (size_t i = 0; i < user_ids.size(); ++i) {
+            user_index.emplace(user_ids[i], i);
+        }
+        item_index.reserve(item_ids.size());
+        for (size_t i = 0; i < item_ids.size(); ++i) {
+            item_index.emplace(item_ids[i], i);
+        }
+        
+        // Precompute item norms once instead of on every request
+        size_t dim = item_ids.empty() ? 0 : item_embeddings.size() / item_ids.size();
+        item_norms.assign(item_ids.size(), 0.0);
+        for (size_t i = 0; i < item_ids.size(); ++i) {
+            const float* item = item_embeddings.data() + i * dim;
+            double norm = 0.0;
+            for (size_t j = 0; j < dim; ++j) {
+                norm += item[j] * item[j];
+            }
+            item_norms[i] = std::sqrt(norm);
+        }
+        
         return true;
     } catch (const std::exception& e) {
         std::cerr << "Initialization error: " << e.what() << std::endl;
@@ -45,11 +68,24 @@ std::vector<std::string> Recommender::get_recommendations(const std::string& use
         return {};
     }
     
-    // Calculate similarity with all items
+    // Cosine similarity with all items: the user norm is computed once and
+    // item norms come precomputed, so each item costs a single dot product
+    size_t dim = user_emb.size();
+    double user_norm = 0.0;
+    for (float value : user_emb) {
+        user_norm += value * value;
+    }
+    user_norm = std::sqrt(user_norm);
+    
+    scores.reserve(item_ids.size());
     for (size_t i = 0; i < item_ids.size(); ++i) {
-        auto item_emb = get_item_embedding(item_ids[i]);
-        double similarity = cosine_similarity(user_emb, item_emb);
-        scores.emplace_back(item_ids[i], similarity);
+        const float* item = item_embeddings.data() + i * dim;
+        double dot = 0.0;
+        for (size_t j = 0; j < dim; ++j) {
+            dot += user_emb[j] * item[j];
+        }
+        double denom = user_norm * item_norms[i];
+        scores.emplace_back(item_ids[i], denom > 0.0 ? dot / denom : 0.0);
     }
     
     // Sort by similarity (descending)
@@ -79,25 +115,26 @@ double Recommender::get_similarity(const std::string& user_id, const std::string
 
 // Private helper methods
 std::vector<float> Recommender::get_user_embedding(const std::string& user_id) {
-    auto it = std::find(user_ids.begin(), user_ids.end(), user_id);
-    if (it == user_ids.end()) {
+    auto it = user_index.find(user_id);
+    if (it == user_index.end()) {
         return {};
     }
-    size_t index = std::distance(user_ids.begin(), it);
-    size_t emb_size = user_embeddings.size() / user_ids.size();
-    return std::vector<float>(user_embeddings.begin() + index * emb_size,
-                             user_embeddings.begin() + (index + 1) * emb_size);
+    return get_embedding_row(user_embeddings, user_ids.size(), it->second);
 }
 
 std::vector<float> Recommender::get_item_embedding(const std::string& item_id) {
-    auto it = std::find(item_ids.begin(), item_ids.end(), item_id);
-    if (it == item_ids.end()) {
+    auto it = item_index.find(item_id);
+    if (it == item_index.end()) {
         return {};
     }
-    size_t index = std::distance(item_ids.begin(), it);
-    size_t emb_size = item_embeddings.size() / item_ids.size();
-    return std::vector<float>(item_embeddings.begin() + index * emb_size,
-                             item_embeddings.begin() + (index + 1) * emb_size);
+    return get_embedding_row(item_embeddings, item_ids.size(), it->second);
+}
+
+std::vector<float> Recommender::get_embedding_row(const std::vector<float>& embeddings,
+                                                  size_t num_rows, size_t index) const {
+    size_t emb_size = embeddings.size() / num_rows;
+    return std::vector<float>(embeddings.begin() + index * emb_size,
+                             embeddings.begin() + (index + 1) * emb_size);
 }
 
 double Recommender::cosine_similarity(const std::vector<float>& vec1, const std::vector<float>& vec2) {
@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import argparse
+import itertools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from scipy.sparse import csr_matrix
+
+import embedding_io
+import train_model
+from atomic_file import atomic_write
+from evaluate import (SPLIT_METHODS, TRAINING_METHODS, TEST_FILE, split_interactions,
+                      build_matrices, train_embeddings, evaluate_model)
+from benchmark import peak_rss_mb
+from scoring_engine import SCORING_METRICS
+from seen_items import SEEN_FILE, save_seen_items
+
+# Barrido de hiperparámetros de ALS/SVD:
+#   1. Las reseñas se parsean y se dividen en train/test una sola vez.
+#   2. Las matrices CSR de entrenamiento se publican en memoria compartida
+#      (data, indices, indptr) y los workers las usan sin copiarlas.
+#   3. Cada worker entrena y evalúa configuraciones de la rejilla con un
+#      número limitado de hilos de BLAS.
+#   4. La mejor configuración se reentrena con todos los datos.
+
+LEADERBOARD_FILE = 'leaderboard.json'
+
+# Variables que limitan los hilos de las bibliotecas BLAS/OpenMP al arrancar
+BLAS_THREAD_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                    'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+# Estado de cada worker (lo fija `_init_worker`)
+_MATRICES = {}
+_SHARED = []
+_IDS = None
+_THREADS = 1
+
+
+def share_csr(matrix):
+    """Copia los buffers de una matriz CSR a memoria compartida.
+
+    Devuelve la descripción que necesita `attach_csr` y los segmentos, que
+    el llamante debe cerrar y liberar (`unlink`) al terminar.
+    """
+    spec = {'shape': matrix.shape, 'arrays': {}}
+    segments = []
+    for name in ('data', 'indices', 'indptr'):
+        array = getattr(matrix, name)
+        segment = SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[:] = array
+        spec['arrays'][name] = (segment.name, array.dtype.str, array.shape)
+        segments.append(segment)
+    return spec, segments
+
+
+def attach_csr(spec):
+    """Matriz CSR sobre los buffers compartidos de `share_csr` (sin copia)."""
+    arrays, segments = {}, []
+    for name, (segment_name, dtype, shape) in spec['arrays'].items():
+        segment = SharedMemory(name=segment_name)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        segments.append(segment)
+    matrix = csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                        shape=spec['shape'], copy=False)
+    return matrix, segments
+
+
+def limit_blas_threads(threads):
+    """Limita los hilos de BLAS/OpenMP del proceso actual (si threadpoolctl está)."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return None
+    return threadpool_limits(limits=threads)
+
+
+def build_grid(methods, factors, iterations, regularization, bm25_k1, bm25_b):
+    """Configuraciones a probar: producto cartesiano por método.
+
+    SVD solo depende del número de factores.
+    """
+    grid = []
+    for method in methods:
+        if method == 'als':
+            for f, i, r, k1, b in itertools.product(factors, iterations, regularization,
+                                                    bm25_k1, bm25_b):
+                grid.append({'method': 'als', 'factors': f, 'iterations': i,
+                             'regularization': r, 'bm25_k1': k1, 'bm25_b': b})
+        else:
+            grid.extend({'method': 'svd', 'factors': f} for f in factors)
+    for trial in grid:
+        trial['name'] = '-'.join(f"{key}={value}" for key, value in trial.items())
+    return grid
+
+
+def _train(matrix, trial, num_threads=0):
+    return train_embeddings(matrix, trial['method'], trial['factors'],
+                            trial.get('iterations', 15), trial.get('regularization', 0.01),
+                            trial.get('bm25_k1', 100), trial.get('bm25_b', 0.8), num_threads)
+
+
+def _init_worker(specs, ids, threads):
+    global _MATRICES, _SHARED, _IDS, _THREADS
+    limit_blas_threads(threads)
+    for method, spec in specs.items():
+        _MATRICES[method], segments = attach_csr(spec)
+        _SHARED.extend(segments)
+    _IDS = ids
+    _THREADS = threads
+
+
+def _run_trial(trial, sweep_dir, test_users, k_values, metric, block_size):
+    """Entrena y evalúa una configuración; guarda su modelo en sweep_dir/<índice>."""
+    start = time.perf_counter()
+    user_embeddings, item_embeddings = _train(_MATRICES[trial['method']], trial, _THREADS)
+    train_time = time.perf_counter() - start
+
+    model_dir = os.path.join(sweep_dir, trial['dir'])
+    os.makedirs(model_dir, exist_ok=True)
+    user_ids, item_ids = _IDS
+    embedding_io.save_embeddings(os.path.join(model_dir, 'user_embeddings.bin'),
+                                 user_embeddings, user_ids, with_index=False)
+    embedding_io.save_embeddings(os.path.join(model_dir, 'item_embeddings.bin'),
+                                 item_embeddings, item_ids, with_index=False)
+
+    start = time.perf_counter()
+    results = evaluate_model(model_dir, test_users, k_values, metric, workers=1,
+                             block_size=block_size, split_dir=sweep_dir)
+    return {
+        'trial': trial,
+        'metrics': results,
+        'train_s': train_time,
+        'evaluate_s': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def run_sweep(interactions, grid, sweep_dir, split='time', test_fraction=0.2, holdout=1,
+              k_values=(10,), metric='cosine', workers=None, threads=None, block_size=1024,
+              seed=42):
+    """Evalúa todas las configuraciones de `grid` en paralelo; devuelve sus resultados."""
+    workers = min(workers or os.cpu_count() or 1, len(grid))
+    threads = threads or max((os.cpu_count() or 1) // workers, 1)
+
+    test_mask = split_interactions(interactions, split, test_fraction, holdout, seed)
+    matrices, test_matrix = {}, None
+    for method in sorted({trial['method'] for trial in grid}):
+        matrices[method], test_matrix, _ = build_matrices(interactions, test_mask, method)
+    train_matrix = next(iter(matrices.values()))
+    test_users = np.flatnonzero((np.diff(test_matrix.indptr) > 0) &
+                                (np.diff(train_matrix.indptr) > 0))
+    save_seen_items(os.path.join(sweep_dir, SEEN_FILE), train_matrix)
+    save_seen_items(os.path.join(sweep_dir, TEST_FILE), test_matrix)
+    print(f"{len(grid)} configuraciones, {workers} workers x {threads} hilos, "
+          f"{len(test_users)} usuarios de test")
+
+    for index, trial in enumerate(grid):
+        trial['dir'] = f'trial_{index:03d}'
+
+    specs, segments = {}, []
+    for method, matrix in matrices.items():
+        specs[method], method_segments = share_csr(matrix)
+        segments.extend(method_segments)
+    del matrices
+
+    # Las variables de entorno solo surten efecto en procesos nuevos: los
+    # workers se crean con 'spawn' para que BLAS las lea al importarse
+    previous = {var: os.environ.get(var) for var in BLAS_THREAD_VARS}
+    os.environ.update({var: str(threads) for var in BLAS_THREAD_VARS})
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(specs, (interactions.user_ids, interactions.item_ids),
+                                           threads)) as executor:
+            futures = [executor.submit(_run_trial, trial, sweep_dir, test_users, k_values,
+                                       metric, block_size) for trial in grid]
+            for future in futures:
+                result = future.result()
+                results.append(result)
+                print(f"{result['trial']['name']}: {json.dumps(result['metrics'])}")
+    finally:
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+    return results
+
+
+def leaderboard(results, target='ndcg', k=10):
+    """Resultados ordenados de mejor a peor según `target`@`k`."""
+    return sorted(results, key=lambda result: result['metrics'][str(k)][target], reverse=True)
+
+
+def refit_best(interactions, trial, output_dir, dtype='float32'):
+    """Reentrena la mejor configuración con todas las interacciones y la guarda."""
+    os.makedirs(output_dir, exist_ok=True)
+    ratings, _, _ = train_model.prepare_data(interactions)
+    if trial['method'] == 'als':
+        model = train_model.train_model(ratings, trial['factors'], trial['iterations'],
+                                        trial['regularization'], trial['bm25_k1'],
+                                        trial['bm25_b'])
+        train_model.save_trained_model(model, interactions, ratings, output_dir, dtype)
+        return
+
+    matrix, _ = build_matrices(interactions, np.zeros(len(interactions), dtype=bool), 'svd')[:2]
+    user_embeddings, item_embeddings = _train(matrix, trial)
+    embedding_io.save_embeddings(os.path.join(output_dir, 'user_embeddings.bin'),
+                                 user_embeddings, interactions.user_ids, dtype=dtype)
+    embedding_io.save_embeddings(os.path.join(output_dir, 'item_embeddings.bin'),
+                                 item_embeddings, interactions.item_ids, dtype=dtype)
+    save_seen_items(os.path.join(output_dir, SEEN_FILE), matrix)
+
+
+def main():
+    training = train_model.load_training_config()
+
+    parser = argparse.ArgumentParser(description='Barrido de hiperparámetros de ALS/SVD')
+    parser.add_argument('--data', default=os.path.join(
+        'data', 'Magazine_Subscriptions_5.json', 'Magazine_Subscriptions_5.json'))
+    parser.add_argument('--method', choices=TRAINING_METHODS, nargs='+', default=['als'])
+    parser.add_argument('--factors', type=int, nargs='+', default=[training['factors']])
+    parser.add_argument('--iterations', type=int, nargs='+', default=[training['iterations']])
+    parser.add_argument('--regularization', type=float, nargs='+',
+                        default=[training['regularization']])
+    parser.add_argument('--bm25-k1', type=float, nargs='+', default=[training['bm25_k1']])
+    parser.add_argument('--bm25-b', type=float, nargs='+', default=[training['bm25_b']])
+    parser.add_argument('--split', choices=SPLIT_METHODS, default='time')
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--holdout', type=int, default=1)
+    parser.add_argument('--k', type=int, nargs='+', default=[10])
+    parser.add_argument('--target', choices=['recall', 'ndcg', 'map'], default='ndcg',
+                        help='Métrica (en el primer K) para ordenar la tabla')
+    parser.add_argument('--metric', choices=SCORING_METRICS, default='cosine')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Hilos de BLAS por worker (por defecto núcleos / workers)')
+    parser.add_argument('--block-size', type=int, default=1024)
+    parser.add_argument('--sweep-dir', default=None,
+                        help='Carpeta donde conservar los modelos de cada configuración')
+    parser.add_argument('--output-dir', default='models',
+                        help='Carpeta donde guardar la mejor configuración reentrenada')
+    parser.add_argument('--dtype', choices=list(embedding_io.STORAGE_DTYPES), default='float32')
+    parser.add_argument('--no-refit', action='store_true',
+                        help='No reentrenar la mejor configuración con todos los datos')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    print("Cargando datos...")
+    interactions = train_model.load_data(args.data)
+    grid = build_grid(args.method, args.factors, args.iterations, args.regularization,
+                      args.bm25_k1, args.bm25_b)
+
+    with tempfile.TemporaryDirectory(prefix='sweep_') as tmp_dir:
+        sweep_dir = args.sweep_dir or tmp_dir
+        os.makedirs(sweep_dir, exist_ok=True)
+        results = run_sweep(interactions, grid, sweep_dir, args.split, args.test_fraction,
+                            args.holdout, args.k, args.metric, args.workers, args.threads,
+                            args.block_size, args.seed)
+
+    ranking = leaderboard(results, args.target, args.k[0])
+    print(f"\nClasificación por {args.target}@{args.k[0]}:")
+    for position, result in enumerate(ranking, 1):
+        print(f"{position:3d}. {result['metrics'][str(args.k[0])][args.target]:.4f}  "
+              f"{result['trial']['name']}  ({result['train_s']:.1f}s)")
+
+    best = ranking[0]['trial']
+    if not args.no_refit:
+        print(f"\nReentrenando {best['name']} con todos los datos en {args.output_dir}...")
+        refit_best(interactions, best, args.output_dir, args.dtype)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with atomic_write(os.path.join(args.output_dir, LEADERBOARD_FILE), 'w',
+                      encoding='utf-8') as f:
+        json.dump({
+            'target': f"{args.target}@{args.k[0]}",
+            'split': args.split,
+            'best': best,
+            'results': ranking,
+            'wall_s': time.perf_counter() - start,
+            'peak_rss_mb': {'main': peak_rss_mb(), 'workers': peak_rss_mb(children=True)}
+        }, f, indent=4)
+    print(f"Clasificación guardada en {os.path.join(args.output_dir, LEADERBOARD_FILE)}")
+
+
+if __name__ == '__main__':
+    main()
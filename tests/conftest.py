@@ -0,0 +1,27 @@
+import sys
+import pathlib
+
+import numpy as np
+import pytest
+
+# Los módulos de Python están en la raíz del proyecto
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from embedding_io import save_embeddings
+
+
+@pytest.fixture
+def write_model(tmp_path):
+    """Escribe un modelo aleatorio en `tmp_path` y devuelve las dos rutas."""
+
+    def write(num_users=40, num_items=300, dim=8, seed=0, dtype='float32'):
+        rng = np.random.default_rng(seed)
+        user_path = str(tmp_path / 'user_embeddings.bin')
+        item_path = str(tmp_path / 'item_embeddings.bin')
+        save_embeddings(user_path, rng.standard_normal((num_users, dim)).astype(np.float32),
+                        [f'user_{i}' for i in range(num_users)], dtype=dtype)
+        save_embeddings(item_path, rng.standard_normal((num_items, dim)).astype(np.float32),
+                        [f'item_{i}' for i in range(num_items)], dtype=dtype)
+        return user_path, item_path
+
+    return write
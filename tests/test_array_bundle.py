@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from array_bundle import (ALIGNMENT, allocate_array_bundle, open_array_bundle,
+                          save_array_bundle)
+
+MAGIC = b'TESTBNDL'
+
+
+@pytest.fixture
+def arrays():
+    # Tamaños impares para que cada array acabe fuera de un múltiplo de 64
+    return {
+        'a': np.arange(7, dtype=np.uint8),
+        'b': np.linspace(0, 1, 15, dtype=np.float32).reshape(3, 5),
+        'c': np.arange(3, dtype=np.int64),
+        'vacio': np.zeros((0, 4), dtype=np.float32)
+    }
+
+
+def test_round_trip_and_alignment(tmp_path, arrays):
+    path = str(tmp_path / 'bundle.bin')
+    save_array_bundle(path, MAGIC, arrays, {'version': 2, 'nombre': 'ñ'})
+
+    loaded, meta = open_array_bundle(path, MAGIC)
+    assert meta == {'version': 2, 'nombre': 'ñ'}
+    assert set(loaded) == set(arrays)
+    for name, array in arrays.items():
+        assert loaded[name].dtype == array.dtype
+        np.testing.assert_array_equal(loaded[name], array)
+        if array.size:
+            assert isinstance(loaded[name], np.memmap)
+            assert loaded[name].offset % ALIGNMENT == 0
+
+
+def test_read_only_by_default(tmp_path, arrays):
+    path = str(tmp_path / 'bundle.bin')
+    save_array_bundle(path, MAGIC, arrays)
+
+    loaded, _ = open_array_bundle(path, MAGIC)
+    with pytest.raises(ValueError):
+        loaded['a'][0] = 1
+
+
+def test_allocate_then_fill(tmp_path):
+    path = str(tmp_path / 'bundle.bin')
+    allocate_array_bundle(path, MAGIC, {'x': (np.float32, (4, 3)), 'y': (np.uint16, (5,))},
+                          {'filas': 4})
+
+    arrays, meta = open_array_bundle(path, MAGIC, mode='r+')
+    assert meta == {'filas': 4}
+    assert not arrays['x'].any() and not arrays['y'].any()
+    assert all(array.offset % ALIGNMENT == 0 for array in arrays.values())
+    arrays['x'][2] = [1, 2, 3]
+    arrays['y'][:] = 7
+    for array in arrays.values():
+        array.flush()
+    del arrays
+
+    arrays, _ = open_array_bundle(path, MAGIC)
+    np.testing.assert_array_equal(arrays['x'][2], [1, 2, 3])
+    np.testing.assert_array_equal(arrays['y'], np.full(5, 7))
+
+
+def test_rejects_wrong_magic(tmp_path, arrays):
+    path = str(tmp_path / 'bundle.bin')
+    save_array_bundle(path, MAGIC, arrays)
+    with pytest.raises(ValueError):
+        open_array_bundle(path, b'OTRMAGIC')
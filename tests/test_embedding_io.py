@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from embedding_io import (ALIGNMENT, FLAG_NORMALIZED, HEADER, MAGIC, _read_header,
+                          file_fingerprint, load_embeddings, load_quantized_embeddings,
+                          open_norms, open_quantized_embeddings, save_embeddings)
+from id_index import index_path
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((37, 12)).astype(np.float32)
+
+
+@pytest.fixture
+def ids():
+    # IDs de longitudes distintas y con caracteres no ASCII
+    return [f'item_{i}' + 'ñ' * (i % 3) for i in range(37)]
+
+
+@pytest.mark.parametrize('dtype, atol', [('float32', 0.0), ('float16', 1e-2), ('int8', None)])
+def test_round_trip(tmp_path, embeddings, ids, dtype, atol):
+    path = str(tmp_path / 'emb.bin')
+    save_embeddings(path, embeddings, ids, dtype=dtype)
+
+    loaded_ids, matrix = load_embeddings(path)
+    assert list(loaded_ids) == ids
+    assert loaded_ids[-1] == ids[-1]
+    assert matrix.dtype == np.float32
+    if atol is None:
+        # int8: error de redondeo de media escala por fila como mucho
+        atol = np.abs(embeddings).max(axis=1, keepdims=True) / 127 / 2 + 1e-6
+    assert np.all(np.abs(matrix - embeddings) <= atol)
+
+    _, stored, scales = load_quantized_embeddings(path)
+    assert stored.dtype == np.dtype(dtype)
+    assert (scales is not None) == (dtype == 'int8')
+
+    norms, normalized = open_norms(path)
+    np.testing.assert_allclose(norms, np.linalg.norm(matrix, axis=1), rtol=1e-5)
+    assert not normalized
+
+
+def test_float32_matrix_is_mapped_and_aligned(tmp_path, embeddings, ids):
+    path = str(tmp_path / 'emb.bin')
+    save_embeddings(path, embeddings, ids)
+
+    _, matrix, _ = open_quantized_embeddings(path)
+    assert isinstance(matrix, np.memmap)
+    assert matrix.offset % ALIGNMENT == 0
+    np.testing.assert_array_equal(matrix, embeddings)
+
+
+def test_normalized_flag(tmp_path, embeddings, ids):
+    path = str(tmp_path / 'emb.bin')
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    save_embeddings(path, unit, ids)
+
+    _, normalized = open_norms(path)
+    assert normalized
+    assert _read_header(path)[5] & FLAG_NORMALIZED
+
+
+def test_index_written_alongside(tmp_path, embeddings, ids):
+    path = str(tmp_path / 'emb.bin')
+    save_embeddings(path, embeddings, ids, with_index=False)
+    assert not (tmp_path / 'emb.idx').exists()
+
+    save_embeddings(path, embeddings, ids)
+    assert (tmp_path / 'emb.idx').exists()
+    assert index_path(path) == str(tmp_path / 'emb.idx')
+
+
+def test_empty_file(tmp_path):
+    path = str(tmp_path / 'emb.bin')
+    save_embeddings(path, np.zeros((0, 8), dtype=np.float32), [])
+
+    loaded_ids, matrix = load_embeddings(path)
+    assert len(loaded_ids) == 0
+    assert len(matrix) == 0
+
+
+def test_rejects_bad_magic(tmp_path, embeddings, ids):
+    path = tmp_path / 'emb.bin'
+    save_embeddings(str(path), embeddings, ids)
+    data = bytearray(path.read_bytes())
+    data[:len(MAGIC)] = b'NOTEMB02'
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(ValueError, match='v2'):
+        open_quantized_embeddings(str(path))
+
+
+def test_rejects_unknown_dtype_and_truncated_header(tmp_path, embeddings, ids):
+    path = tmp_path / 'emb.bin'
+    save_embeddings(str(path), embeddings, ids)
+    data = bytearray(path.read_bytes())
+
+    # Código de tipo de datos inexistente (tercer campo de la cabecera)
+    fields = list(HEADER.unpack(bytes(data[:HEADER.size])))
+    fields[2] = 99
+    path.write_bytes(HEADER.pack(*fields) + bytes(data[HEADER.size:]))
+    with pytest.raises(ValueError):
+        open_quantized_embeddings(str(path))
+
+    path.write_bytes(bytes(data[:HEADER.size - 1]))
+    with pytest.raises(ValueError, match='truncado'):
+        open_quantized_embeddings(str(path))
+
+
+def test_rejects_unknown_storage_dtype(tmp_path, embeddings, ids):
+    with pytest.raises(ValueError):
+        save_embeddings(str(tmp_path / 'emb.bin'), embeddings, ids, dtype='float64')
+
+
+def test_fingerprint_changes_with_factors_only(tmp_path):
+    # Con muchos IDs el comienzo del archivo es solo cabecera e IDs
+    path = str(tmp_path / 'emb.bin')
+    ids = [f'item_{i}' for i in range(20000)]
+    rng = np.random.default_rng(1)
+    save_embeddings(path, rng.standard_normal((20000, 8)).astype(np.float32), ids,
+                    with_index=False)
+    before = file_fingerprint(path)
+    assert file_fingerprint(path) == before
+
+    save_embeddings(path, rng.standard_normal((20000, 8)).astype(np.float32), ids,
+                    with_index=False)
+    after = file_fingerprint(path)
+    assert after['size'] == before['size']
+    assert after != before
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from evaluate import ranking_metrics
+
+
+def reference_metrics(ranked, relevant, k):
+    """recall, NDCG y AP@K de un usuario, calculados uno a uno."""
+    top = [item for item in ranked[:k] if item >= 0]
+    hits = [item in relevant for item in top]
+    recall = sum(hits) / len(relevant)
+    dcg = sum(1.0 / np.log2(i + 2) for i, hit in enumerate(hits) if hit)
+    idcg = sum(1.0 / np.log2(i + 2) for i in range(min(len(relevant), k)))
+    precisions = [sum(hits[:i + 1]) / (i + 1) for i, hit in enumerate(hits) if hit]
+    return {'recall': recall, 'ndcg': dcg / idcg,
+            'map': sum(precisions) / min(len(relevant), k)}
+
+
+def as_pairs(relevant):
+    positions = np.concatenate([np.full(len(items), pos) for pos, items in enumerate(relevant)])
+    items = np.concatenate([sorted(items) for items in relevant])
+    return positions.astype(np.int64), items.astype(np.int64)
+
+
+def test_hand_computed_example():
+    # Aciertos en las posiciones 1 y 3 de 2 relevantes
+    ranked = np.array([[7, 3, 9, 5]])
+    sums = ranking_metrics(ranked, *as_pairs([{3, 5}]), k_values=(2, 4))
+
+    assert sums[2]['recall'] == pytest.approx(0.5)
+    assert sums[2]['ndcg'] == pytest.approx((1 / np.log2(3)) / (1 + 1 / np.log2(3)))
+    assert sums[2]['map'] == pytest.approx(0.5 / 2)
+    assert sums[4]['recall'] == pytest.approx(1.0)
+    assert sums[4]['map'] == pytest.approx((1 / 2 + 2 / 4) / 2)
+
+
+def test_matches_per_user_reference():
+    rng = np.random.default_rng(5)
+    num_users, num_items, max_k = 30, 50, 20
+    ranked = np.array([rng.permutation(num_items)[:max_k] for _ in range(num_users)])
+    # Huecos al final de algunas filas (ítems vistos excluidos)
+    ranked[::4, 15:] = -1
+    relevant = [set(rng.choice(num_items, rng.integers(1, 8), replace=False).tolist())
+                for _ in range(num_users)]
+
+    k_values = (1, 5, 10, 20)
+    sums = ranking_metrics(ranked, *as_pairs(relevant), k_values)
+    for k in k_values:
+        for name in ('recall', 'ndcg', 'map'):
+            expected = sum(reference_metrics(ranked[u], relevant[u], k)[name]
+                           for u in range(num_users))
+            assert sums[k][name] == pytest.approx(expected), (k, name)
+
+
+def test_padding_never_counts_as_a_hit():
+    # Con anchura 5, el hueco (-1) del usuario 1 tiene la misma clave que el
+    # ítem relevante 4 del usuario 0
+    ranked = np.array([[2, 3], [-1, -1]])
+    sums = ranking_metrics(ranked, *as_pairs([{4}, {0}]), k_values=(2,))
+    assert sums[2] == pytest.approx({'recall': 0.0, 'ndcg': 0.0, 'map': 0.0})
+
+
+def test_perfect_ranking_scores_one_per_user():
+    ranked = np.array([[0, 1, 2], [5, 6, 7]])
+    sums = ranking_metrics(ranked, *as_pairs([{0, 1, 2}, {5, 6, 7}]), k_values=(3,))
+    assert sums[3] == pytest.approx({'recall': 2.0, 'ndcg': 2.0, 'map': 2.0})
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from embedding_io import quantize, dequantize
+from fold_in import FoldInSolver
+from scoring_engine import ScoringEngine
+
+
+@pytest.fixture
+def factors():
+    return np.random.default_rng(4).standard_normal((120, 6)).astype(np.float32)
+
+
+def dense_solution(factors, rows, confidences, regularization):
+    """Solución de ALS implícito con la matriz de confianzas completa."""
+    Y = factors.astype(np.float64)
+    c = np.ones(len(Y))
+    p = np.zeros(len(Y))
+    c[rows] = confidences
+    p[rows] = 1.0
+    A = (Y.T * c) @ Y + regularization * np.eye(Y.shape[1])
+    return np.linalg.solve(A, (Y.T * c) @ p)
+
+
+def test_solve_matches_dense_least_squares(factors):
+    solver = FoldInSolver(factors, regularization=0.1)
+    rows = np.array([3, 17, 40, 99])
+    confidences = np.array([1.0, 4.0, 2.5, 10.0])
+    np.testing.assert_allclose(solver.solve(rows, confidences),
+                               dense_solution(factors, rows, confidences, 0.1), rtol=1e-4)
+
+
+def test_gram_is_accumulated_by_blocks(factors):
+    whole = FoldInSolver(factors, regularization=0.5)
+    blocks = FoldInSolver(factors, regularization=0.5, block_size=7)
+    np.testing.assert_allclose(blocks.gram, whole.gram, rtol=1e-10)
+    Y = factors.astype(np.float64)
+    np.testing.assert_allclose(whole.gram, Y.T @ Y + 0.5 * np.eye(6), rtol=1e-10)
+
+
+def test_quantized_factors_use_scales(factors):
+    stored, scales = quantize(factors, 'int8')
+    solver = FoldInSolver(stored, regularization=0.1, scales=scales)
+    rows, confidences = np.array([1, 2, 3]), np.array([2.0, 1.0, 5.0])
+    np.testing.assert_allclose(solver.solve(rows, confidences),
+                               dense_solution(dequantize(stored, scales), rows, confidences, 0.1),
+                               rtol=1e-4)
+
+
+def test_empty_history_gives_zero_vector(factors):
+    solver = FoldInSolver(factors)
+    vector = solver.solve([], [])
+    assert vector.shape == (6,) and not vector.any()
+
+
+def test_solve_rows_matches_solve(factors):
+    solver = FoldInSolver(factors, regularization=0.1)
+    matrix = csr_matrix(([2.0, 1.0, 3.0, 1.0], ([0, 0, 2, 2], [5, 9, 5, 70])), shape=(3, 120))
+    result = solver.solve_rows(matrix, [0, 1, 2])
+    np.testing.assert_allclose(result[0], solver.solve([5, 9], [2.0, 1.0]))
+    assert not result[1].any()
+    np.testing.assert_allclose(result[2], solver.solve([5, 70], [3.0, 1.0]))
+
+
+@pytest.fixture
+def engine(write_model):
+    return ScoringEngine(*write_model(), regularization=0.1, fold_in=True)
+
+
+def test_engine_fold_in_sums_repeats_and_skips_unknown_items(engine):
+    vector, rows = engine.fold_in(['item_5', 'item_2', 'desconocido', 'item_5'], [1, 2, 7, 3])
+    np.testing.assert_array_equal(rows, [2, 5])
+    np.testing.assert_allclose(vector, engine._fold_in.solve([2, 5], [2.0, 4.0]))
+
+    assert engine.fold_in(['desconocido']) is None
+    with pytest.raises(ValueError):
+        engine.fold_in(['item_1', 'item_2'], [1.0])
+
+
+def test_engine_recommends_for_posted_history(engine):
+    items = ['item_1', 'item_8', 'item_13']
+    result = engine.get_recommendations('usuario_nuevo', 10, items)
+    assert len(result) == 10
+    # Los ítems enviados no se recomiendan
+    assert not set(items) & set(result)
+
+    vector, rows = engine.fold_in(items)
+    expected = engine.top_items(vector, 10, exclude=rows)
+    assert result == [engine.item_ids[i] for i in expected]
+    # El vector se guarda por historial
+    assert engine.fold_in_cache.stats()['hits'] >= 1
+
+
+def test_engine_without_fold_in(write_model):
+    engine = ScoringEngine(*write_model(), fold_in=False)
+    assert engine.fold_in(['item_1']) is None
+    assert engine.get_recommendations('usuario_nuevo', 5, ['item_1']) == []
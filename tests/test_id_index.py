@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import id_index
+from id_index import IdIndex, build_id_index, index_path, save_id_index
+
+IDS = [f'user_{i}' for i in range(100)] + ['ñandú', '']
+
+
+@pytest.fixture(params=['memoria', 'archivo'])
+def index(request, tmp_path):
+    if request.param == 'memoria':
+        return IdIndex(IDS)
+    path = str(tmp_path / 'ids.idx')
+    save_id_index(path, IDS)
+    return IdIndex(IDS, path)
+
+
+def test_present_ids(index):
+    for row, item_id in enumerate(IDS):
+        assert index.get(item_id) == row
+        assert index[item_id] == row
+        assert item_id in index
+    np.testing.assert_array_equal(index.get_many(IDS), np.arange(len(IDS)))
+    assert len(index) == len(IDS)
+
+
+def test_absent_ids(index):
+    assert index.get('desconocido') is None
+    assert index.get('desconocido', -1) == -1
+    assert 'desconocido' not in index
+    with pytest.raises(KeyError):
+        index['desconocido']
+    rows = index.get_many(['user_3', 'desconocido', 'user_99', 'otro'])
+    np.testing.assert_array_equal(rows, [3, -1, 99, -1])
+
+
+def test_hash_collisions_in_one_bucket(monkeypatch, tmp_path):
+    # Todos los IDs comparten hash (y por tanto cubeta)
+    monkeypatch.setattr(id_index, 'hash_id', lambda item_id: 42)
+    path = str(tmp_path / 'ids.idx')
+    save_id_index(path, IDS)
+
+    for index in (IdIndex(IDS), IdIndex(IDS, path)):
+        for row, item_id in enumerate(IDS):
+            assert index.get(item_id) == row
+        np.testing.assert_array_equal(index.get_many(IDS[::-1]), np.arange(len(IDS))[::-1])
+        assert index.get('desconocido') is None
+        np.testing.assert_array_equal(index.get_many(['desconocido', 'user_7']), [-1, 7])
+
+
+def test_buckets_cover_all_entries():
+    arrays, meta = build_id_index(IDS)
+    directory = arrays['directory']
+    assert len(directory) == (1 << meta['bits']) + 1
+    assert directory[0] == 0 and directory[-1] == len(IDS)
+    assert np.all(np.diff(directory.astype(np.int64)) >= 0)
+    assert np.all(arrays['hashes'][:-1] <= arrays['hashes'][1:])
+
+
+def test_empty_index():
+    index = IdIndex([])
+    assert index.get('user_0') is None
+    assert len(index.get_many([])) == 0
+
+
+def test_for_embeddings_uses_fresh_index_only(tmp_path):
+    embeddings = tmp_path / 'emb.bin'
+    embeddings.write_bytes(b'')
+    assert IdIndex.for_embeddings(str(embeddings), IDS)._path is None
+
+    save_id_index(index_path(str(embeddings)), IDS)
+    index = IdIndex.for_embeddings(str(embeddings), IDS)
+    assert index._path == str(tmp_path / 'emb.idx')
+    assert index['user_5'] == 5
+
+
+def test_rejects_index_of_other_ids(tmp_path):
+    path = str(tmp_path / 'ids.idx')
+    save_id_index(path, IDS)
+    with pytest.raises(ValueError):
+        IdIndex(IDS[:10], path).get('user_0')
@@ -0,0 +1,88 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from ingest import stream_interactions, parallel_interactions
+
+REVIEWS = [
+    {'reviewerID': 'u1', 'asin': 'i1', 'overall': 5.0, 'unixReviewTime': 10},
+    {'reviewerID': 'u2', 'asin': 'i1', 'overall': 3.0, 'unixReviewTime': 11},
+    {'reviewerID': 'u1', 'asin': 'i2', 'overall': 4.0, 'unixReviewTime': 12},
+    {'reviewerID': 'u3', 'asin': 'i3', 'unixReviewTime': 13},
+    {'reviewerID': 'u3', 'asin': 'i2', 'overall': 1.0, 'unixReviewTime': 14},
+]
+
+
+def write_reviews(path, bad_lines=()):
+    """Escribe las reseñas intercalando líneas inválidas tras la segunda."""
+    lines = [json.dumps(review) for review in REVIEWS]
+    lines[2:2] = bad_lines
+    data = ('\n'.join(lines) + '\n').encode('utf-8')
+    if str(path).endswith('.gz'):
+        with gzip.open(path, 'wb') as f:
+            f.write(data)
+    else:
+        path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture(params=['reviews.json', 'reviews.json.gz'])
+def reviews_path(tmp_path, request):
+    return write_reviews(tmp_path / request.param,
+                         bad_lines=['{"reviewerID": "u9", "asin"', '', '[1, 2]', '\xff'])
+
+
+def assert_same(serial, parallel):
+    assert serial.user_ids == parallel.user_ids
+    assert serial.item_ids == parallel.item_ids
+    np.testing.assert_array_equal(serial.user_codes, parallel.user_codes)
+    np.testing.assert_array_equal(serial.item_codes, parallel.item_codes)
+    np.testing.assert_array_equal(serial.ratings, parallel.ratings)
+    np.testing.assert_array_equal(serial.timestamps, parallel.timestamps)
+    assert serial.errors == parallel.errors
+
+
+def test_bad_lines_are_skipped_and_counted(reviews_path):
+    interactions = stream_interactions(reviews_path, time_field='unixReviewTime')
+
+    # La reseña sin valoración se ignora sin contarse como error
+    assert len(interactions) == 4
+    assert interactions.errors == 3
+    assert interactions.user_ids == ['u1', 'u2', 'u3']
+    np.testing.assert_array_equal(interactions.timestamps, [10, 11, 12, 14])
+
+
+def test_serial_and_parallel_agree_on_bad_lines(reviews_path):
+    serial = stream_interactions(reviews_path, time_field='unixReviewTime')
+    # Bloques diminutos para que las líneas inválidas caigan en varios bloques
+    parallel = parallel_interactions(reviews_path, workers=2, block_size=64,
+                                     time_field='unixReviewTime')
+    assert_same(serial, parallel)
+
+
+def test_clean_file_has_no_errors(tmp_path):
+    path = write_reviews(tmp_path / 'clean.json')
+    assert stream_interactions(path).errors == 0
+    assert parallel_interactions(path, workers=2).errors == 0
+
+
+@pytest.mark.parametrize('name', ['values.json', 'values.json.gz'])
+def test_non_numeric_values_are_skipped_and_counted(tmp_path, name):
+    path = write_reviews(tmp_path / name, bad_lines=[
+        json.dumps({'reviewerID': 'u8', 'asin': 'i8', 'overall': 'five', 'unixReviewTime': 1}),
+        json.dumps({'reviewerID': 'u9', 'asin': 'i9', 'overall': 2.0, 'unixReviewTime': None}),
+        json.dumps({'reviewerID': 'u9', 'asin': 'i9', 'overall': [2.0], 'unixReviewTime': 1}),
+    ])
+    serial = stream_interactions(path, time_field='unixReviewTime')
+    parallel = parallel_interactions(path, workers=2, block_size=64,
+                                     time_field='unixReviewTime')
+    assert_same(serial, parallel)
+
+    # Los usuarios e ítems de las filas omitidas no llegan a registrarse
+    assert serial.errors == 3
+    assert serial.user_ids == ['u1', 'u2', 'u3']
+    assert serial.item_ids == ['i1', 'i2']
+    # Sin `time_field` la fecha nula no importa
+    assert stream_interactions(path).errors == 2
@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pytest
+
+from materialize_topk import TopKTable, materialize_topk
+from scoring_engine import ScoringEngine
+
+
+@pytest.fixture
+def config(tmp_path):
+    def write(metric='cosine'):
+        path = tmp_path / 'config.json'
+        path.write_text(json.dumps({
+            'model_paths': {
+                'user_embeddings': 'user_embeddings.bin',
+                'item_embeddings': 'item_embeddings.bin',
+                'user_topk': 'user_topk.bin'
+            },
+            'recommendation': {'metric': metric, 'exclude_seen': False},
+            'serving': {'shards': 1}
+        }), encoding='utf-8')
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def table(write_model, config, tmp_path):
+    write_model()
+    path = materialize_topk(config(), str(tmp_path), top_k=10, block_size=16, workers=1)
+    return TopKTable(path)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_rows_match_live_scoring(write_model, config, tmp_path, workers):
+    user_path, item_path = write_model()
+    path = materialize_topk(config(), str(tmp_path), top_k=10, block_size=16, workers=workers)
+    table = TopKTable(path)
+    engine = ScoringEngine(user_path, item_path, shards=1)
+
+    assert (len(table), table.top_k) == (40, 10)
+    np.testing.assert_array_equal(table.rows(np.arange(40)),
+                                  engine.top_item_rows(np.arange(40), 10))
+    _, scores = engine.top_item_rows(np.arange(40), 10, return_scores=True)
+    np.testing.assert_allclose(table.scores, scores, rtol=1e-6)
+
+
+def test_width_bounds(table):
+    np.testing.assert_array_equal(table.row(3), table.items[3])
+    assert len(table.row(3, 4)) == 4
+    assert table.rows([0, 5], 2).shape == (2, 2)
+    for top_k in (0, -2, 11):
+        with pytest.raises(ValueError):
+            table.row(0, top_k)
+        with pytest.raises(ValueError):
+            table.rows([0], top_k)
+
+
+def test_engine_reads_table_within_its_width(table, config):
+    engine = ScoringEngine.from_config(config(), materialized=True)
+    assert engine.topk_table is not None
+    live = ScoringEngine.from_config(config())
+
+    # Se marca la tabla para distinguir las lecturas de la puntuación en vivo
+    marked = np.asarray(table.items).copy()
+    marked[0, 0] = marked[0, 1]
+    engine.topk_table.items = marked
+    assert engine.get_recommendations('user_0', 3)[0] == engine.item_ids[marked[0, 1]]
+    assert engine.recommend_batch(['user_0'], 3)['user_0'][0] == engine.item_ids[marked[0, 1]]
+    # Un top_k mayor que la tabla se puntúa en vivo
+    assert engine.get_recommendations('user_0', 12) == live.get_recommendations('user_0', 12)
+
+
+def test_table_is_rejected_after_retraining(table, write_model, config, capsys):
+    assert ScoringEngine.from_config(config(), materialized=True).topk_table is not None
+
+    # Mismas dimensiones, otros factores
+    write_model(seed=1)
+    assert ScoringEngine.from_config(config(), materialized=True).topk_table is None
+    assert 'ADVERTENCIA' in capsys.readouterr().out
+
+
+def test_table_is_rejected_for_other_metric(table, config):
+    assert ScoringEngine.from_config(config('dot'), materialized=True).topk_table is None
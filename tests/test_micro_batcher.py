@@ -0,0 +1,134 @@
+import asyncio
+import threading
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+class FakeEngine:
+    """`score_batch` que registra cada lote y devuelve ítems deterministas."""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+
+    def score_batch(self, user_ids, top_k):
+        self.release.wait(5)
+        self.calls.append((list(user_ids), top_k))
+        if self.fail:
+            raise RuntimeError('fallo al puntuar')
+        return {user_id: [f'{user_id}_item_{i}' for i in range(top_k)]
+                for user_id in user_ids if user_id != 'desconocido'}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def with_batcher(engine, body, **kwargs):
+    batcher = MicroBatcher(engine.score_batch, **kwargs)
+    batcher.start()
+    try:
+        return await body(batcher)
+    finally:
+        await batcher.close()
+
+
+def test_concurrent_requests_share_one_batch():
+    engine = FakeEngine()
+
+    async def body(batcher):
+        results = await asyncio.gather(*(batcher.submit(f'u{i}', 3) for i in range(5)))
+        return results, batcher
+
+    results, batcher = run(with_batcher(engine, body, max_batch_size=64, max_wait_ms=50))
+    assert engine.calls == [([f'u{i}' for i in range(5)], 3)]
+    assert results[2] == ['u2_item_0', 'u2_item_1', 'u2_item_2']
+    assert (batcher.batches, batcher.requests) == (1, 5)
+
+
+def test_each_request_is_cut_to_its_top_k():
+    engine = FakeEngine()
+
+    async def body(batcher):
+        return await asyncio.gather(batcher.submit('a', 1), batcher.submit('b', 4),
+                                    batcher.submit('desconocido', 2))
+
+    a, b, unknown = run(with_batcher(engine, body, max_wait_ms=50))
+    # El lote se puntúa con el mayor top_k
+    assert engine.calls[0][1] == 4
+    assert a == ['a_item_0']
+    assert len(b) == 4
+    assert unknown == []
+
+
+def test_batches_are_capped_at_max_batch_size():
+    engine = FakeEngine()
+
+    async def body(batcher):
+        return await asyncio.gather(*(batcher.submit(f'u{i}', 1) for i in range(5)))
+
+    run(with_batcher(engine, body, max_batch_size=2, max_wait_ms=50))
+    assert [len(users) for users, _ in engine.calls] == [2, 2, 1]
+
+
+def test_errors_reach_every_request_in_the_batch():
+    engine = FakeEngine(fail=True)
+
+    async def body(batcher):
+        results = await asyncio.gather(batcher.submit('a', 1), batcher.submit('b', 1),
+                                       return_exceptions=True)
+        # El bucle sigue funcionando después de un fallo
+        engine.fail = False
+        return results, await batcher.submit('c', 1)
+
+    results, after = run(with_batcher(engine, body, max_wait_ms=50))
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert after == ['c_item_0']
+
+
+def test_cancelled_requests_are_not_scored():
+    engine = FakeEngine()
+    engine.release.clear()
+
+    async def body(batcher):
+        # El primer lote queda bloqueado en el hilo mientras llegan los demás
+        first = asyncio.ensure_future(batcher.submit('primero', 1))
+        await asyncio.sleep(0.05)
+        cancelled = asyncio.ensure_future(batcher.submit('cancelada', 1))
+        kept = asyncio.ensure_future(batcher.submit('sigue', 1))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        engine.release.set()
+        return await first, await kept
+
+    first, kept = run(with_batcher(engine, body, max_wait_ms=1))
+    assert first == ['primero_item_0'] and kept == ['sigue_item_0']
+    assert all('cancelada' not in users for users, _ in engine.calls)
+
+
+def test_close_stops_the_loop():
+    engine = FakeEngine()
+
+    async def body():
+        batcher = MicroBatcher(engine.score_batch)
+        batcher.start()
+        task = batcher._task
+        await batcher.close()
+        return task
+
+    assert run(body()).cancelled()
+
+
+@pytest.mark.parametrize('max_wait_ms', [0, 1])
+def test_single_request_is_not_delayed_past_max_wait(max_wait_ms):
+    engine = FakeEngine()
+
+    async def body(batcher):
+        return await asyncio.wait_for(batcher.submit('solo', 2), timeout=2)
+
+    assert run(with_batcher(engine, body, max_wait_ms=max_wait_ms)) == \
+        ['solo_item_0', 'solo_item_1']
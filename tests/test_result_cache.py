@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+import result_cache
+from result_cache import FileVersion, ResultCache
+
+
+class FakeClock:
+    """Sustituto del módulo `time` con un reloj monótono controlable."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache, 'time', clock)
+    return clock
+
+
+def test_hit_and_miss():
+    cache = ResultCache(max_size=2)
+    assert cache.get('a') is None
+    cache.put('a', [1])
+    assert cache.get('a') == [1]
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    # Leer 'a' la convierte en la más reciente: se expulsa 'b'
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_put_existing_key_refreshes_without_evicting():
+    cache = ResultCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.put('a', 10)
+    cache.put('c', 3)
+
+    assert cache.get('a') == 10
+    assert cache.get('b') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_expiration(clock):
+    cache = ResultCache(max_size=10, ttl=5)
+    cache.put('a', 1)
+    clock.now += 4.9
+    assert cache.get('a') == 1
+
+    clock.now += 0.1
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert stats['expirations'] == 1
+    assert stats['size'] == 0
+
+
+def test_without_ttl_entries_do_not_expire(clock):
+    cache = ResultCache(max_size=10)
+    cache.put('a', 1)
+    clock.now += 10 ** 9
+    assert cache.get('a') == 1
+
+
+def test_zero_size_disables_cache():
+    cache = ResultCache(max_size=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_clear_counts_invalidation():
+    cache = ResultCache()
+    cache.put('a', 1)
+    cache.clear()
+    assert cache.get('a') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_file_version_detects_changes(tmp_path):
+    path = tmp_path / 'emb.bin'
+    path.write_bytes(b'v1')
+    version = FileVersion([path, tmp_path / 'falta.bin'], check_interval=0)
+    first, changed = version.current()
+    assert not changed
+
+    path.write_bytes(b'v2 con otro tamano')
+    second, changed = version.current()
+    assert changed and second != first
+    assert version.current() == (second, False)
+
+    os.remove(path)
+    third, changed = version.current()
+    assert changed and third[0] is None
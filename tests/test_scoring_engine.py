@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+import scoring_engine
+from scoring_engine import ScoringEngine, top_k_indices
+
+
+@pytest.fixture(autouse=True)
+def small_shards(monkeypatch):
+    # Permitir fragmentos de pocos ítems para probar la búsqueda repartida
+    monkeypatch.setattr(scoring_engine, 'MIN_SHARD_ITEMS', 10)
+
+
+def assert_same_ranking(rows, expected, scores):
+    """Mismo top-K salvo empates.
+
+    El producto por fragmentos puede diferir en el último bit del de toda la
+    matriz e invertir dos ítems casi empatados.
+    """
+    assert len(rows) == len(expected)
+    assert len(np.unique(rows)) == len(rows)
+    np.testing.assert_allclose(scores[rows], scores[expected], rtol=1e-5, atol=1e-6)
+
+
+def engines(user_path, item_path, metric='cosine'):
+    single = ScoringEngine(user_path, item_path, metric=metric, shards=1)
+    sharded = ScoringEngine(user_path, item_path, metric=metric, shards=4)
+    assert single._num_shards() == 1 and sharded._num_shards() == 4
+    return single, sharded
+
+
+@pytest.mark.parametrize('metric', ['cosine', 'dot', 'euclidean'])
+@pytest.mark.parametrize('dtype', ['float32', 'int8'])
+def test_sharded_merge_matches_single_thread(write_model, metric, dtype):
+    single, sharded = engines(*write_model(dtype=dtype), metric=metric)
+    try:
+        for row in range(len(single.user_ids)):
+            user = single.user_vectors(row)
+            scores = single._scores(user)
+            for top_k in (1, 10, 120, 300):
+                assert_same_ranking(sharded.top_items(user, top_k),
+                                    single.top_items(user, top_k), scores)
+    finally:
+        sharded.close()
+
+
+def test_sharded_merge_with_exclusions(write_model):
+    single, sharded = engines(*write_model())
+    # Excluir un fragmento entero (filas 0-74) y algunas filas sueltas
+    exclude = np.concatenate([np.arange(0, 75), [100, 150, 299]])
+    try:
+        for row in range(len(single.user_ids)):
+            user = single.user_vectors(row)
+            expected = single.top_items(user, 20, exclude=exclude)
+            result = sharded.top_items(user, 20, exclude=exclude)
+            assert_same_ranking(result, expected, single._scores(user))
+            assert not np.isin(result, exclude).any()
+
+        # Si quedan menos ítems que top_k se devuelven solo los que quedan
+        everything_but_two = np.setdiff1d(np.arange(300), [7, 250])
+        result = sharded.top_items(single.user_vectors(0), 10, exclude=everything_but_two)
+        assert sorted(result.tolist()) == [7, 250]
+    finally:
+        sharded.close()
+
+
+def test_sharded_matches_brute_force(write_model):
+    user_path, item_path = write_model()
+    _, sharded = engines(user_path, item_path)
+    try:
+        users = sharded.user_vectors(np.arange(len(sharded.user_ids)))
+        items = np.asarray(sharded.item_embeddings)
+        cosine = (users @ items.T) / np.outer(np.linalg.norm(users, axis=1),
+                                              np.linalg.norm(items, axis=1))
+        for row in range(len(users)):
+            assert_same_ranking(sharded.top_items(users[row], 15),
+                                np.argsort(-cosine[row])[:15], cosine[row])
+    finally:
+        sharded.close()
+
+
+def test_batch_agrees_with_single_requests(write_model):
+    single, sharded = engines(*write_model())
+    try:
+        user_ids = ['user_3', 'desconocido', 'user_0', 'user_3']
+        batch = sharded.recommend_batch(user_ids, 7, block_size=2)
+        assert batch['desconocido'] == []
+        for user_id in ('user_0', 'user_3'):
+            row = single.user_index[user_id]
+            scores = single._scores(single.user_vectors(row))
+            expected = single.top_items(single.user_vectors(row), 7)
+            rows = [single.item_index[item_id] for item_id in batch[user_id]]
+            assert_same_ranking(np.array(rows), expected, scores)
+    finally:
+        sharded.close()
+
+
+def test_close_stops_shard_threads(write_model):
+    _, sharded = engines(*write_model())
+    sharded.top_items(sharded.user_vectors(0), 5)
+    assert sharded._executor is not None
+    sharded.close()
+    assert sharded._executor is None
+
+
+def test_top_k_indices():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [3.0, 2.0, 1.0, 0.0]])
+    np.testing.assert_array_equal(top_k_indices(scores, 2), [[1, 3], [0, 1]])
+    np.testing.assert_array_equal(top_k_indices(scores, 10), [[1, 3, 2, 0], [0, 1, 2, 3]])
+    assert top_k_indices(scores, 0).shape == (2, 0)
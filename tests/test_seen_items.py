@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from scoring_engine import ScoringEngine
+from seen_items import SeenItems, save_seen_items
+
+NUM_USERS, NUM_ITEMS = 40, 300
+
+
+@pytest.fixture
+def seen(tmp_path):
+    rng = np.random.default_rng(3)
+    users = rng.integers(0, NUM_USERS, 600)
+    items = rng.integers(0, NUM_ITEMS, 600)
+    # El usuario 5 no ha visto nada y el 7 lo ha visto todo salvo tres ítems
+    keep = (users != 5) & (users != 7)
+    users, items = users[keep], items[keep]
+    rest = np.setdiff1d(np.arange(NUM_ITEMS), [10, 20, 30])
+    users = np.concatenate([users, np.full(len(rest), 7)])
+    items = np.concatenate([items, rest])
+    matrix = csr_matrix((np.ones(len(users)), (users, items)), shape=(NUM_USERS, NUM_ITEMS))
+
+    path = str(tmp_path / 'seen_items.bin')
+    save_seen_items(path, matrix)
+    return SeenItems(path), matrix
+
+
+def test_rows_match_the_matrix(seen):
+    table, matrix = seen
+    assert (table.num_users, table.num_items) == (NUM_USERS, NUM_ITEMS)
+    for user in range(NUM_USERS):
+        row = table.row(user)
+        np.testing.assert_array_equal(row, np.sort(matrix[user].indices))
+        assert np.all(np.diff(row) > 0)
+    assert len(table.row(5)) == 0
+    # Filas fuera de la tabla (usuarios nuevos): sin ítems vistos
+    assert len(table.row(NUM_USERS + 3)) == 0
+
+
+def test_rows_coo_masks_a_block(seen):
+    table, matrix = seen
+    block = np.array([7, 0, NUM_USERS + 1, 5, 0])
+    positions, items = table.rows_coo(block)
+
+    mask = np.zeros((len(block), NUM_ITEMS), dtype=bool)
+    mask[positions, items] = True
+    for pos, user in enumerate(block):
+        expected = matrix[user].indices if user < NUM_USERS else []
+        assert set(np.flatnonzero(mask[pos])) == set(expected)
+
+
+def test_engine_excludes_seen_items(write_model, seen):
+    table, _ = seen
+    paths = write_model(num_users=NUM_USERS, num_items=NUM_ITEMS)
+    plain = ScoringEngine(*paths, shards=1)
+    engine = ScoringEngine(*paths, shards=1, seen_items=table)
+
+    for user in range(NUM_USERS):
+        user_id = f'user_{user}'
+        seen_ids = {f'item_{i}' for i in table.row(user)}
+        result = engine.get_recommendations(user_id, 10)
+        assert not seen_ids & set(result)
+        # Es el top-K sin filtrar una vez quitados los vistos
+        unfiltered = plain.get_recommendations(user_id, NUM_ITEMS)
+        expected = [item for item in unfiltered if item not in seen_ids][:10]
+        assert result == expected
+
+    # Al usuario 7 solo le quedan tres ítems por ver
+    assert sorted(engine.get_recommendations('user_7', 10)) == ['item_10', 'item_20', 'item_30']
+
+
+def test_batch_masking_matches_single_requests(write_model, seen):
+    table, _ = seen
+    engine = ScoringEngine(*write_model(num_users=NUM_USERS, num_items=NUM_ITEMS), shards=1,
+                           seen_items=table)
+    user_ids = [f'user_{i}' for i in range(NUM_USERS)]
+    batch = engine.recommend_batch(user_ids, 10, block_size=7)
+    for user_id in user_ids:
+        assert batch[user_id] == engine.get_recommendations(user_id, 10)
+
+    rows, scores = engine.top_item_rows([7, 5], 10, return_scores=True)
+    # Huecos al final (-1 / -inf) cuando no quedan ítems suficientes
+    assert sorted(rows[0, :3]) == [10, 20, 30]
+    assert np.all(rows[0, 3:] == -1) and np.all(np.isneginf(scores[0, 3:]))
+    assert np.all(rows[1] >= 0)
+
+
+def test_engine_ignores_table_of_other_model(write_model, seen, capsys):
+    table, _ = seen
+    engine = ScoringEngine(*write_model(num_users=NUM_USERS, num_items=NUM_ITEMS + 1),
+                           seen_items=table)
+    assert engine.seen_items is None
+    assert 'ADVERTENCIA' in capsys.readouterr().out
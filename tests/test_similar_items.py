@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from embedding_io import load_embeddings
+from scoring_engine import ScoringEngine
+from similar_items import SimilarItems, build_similar_items, save_similar_items
+
+
+def brute_force(item_path, top_m):
+    _, items = load_embeddings(item_path)
+    unit = items / np.linalg.norm(items, axis=1, keepdims=True)
+    cosine = unit @ unit.T
+    np.fill_diagonal(cosine, -np.inf)
+    return np.argsort(-cosine, axis=1)[:, :top_m], cosine
+
+
+@pytest.mark.parametrize('workers, tile_size', [(1, 8192), (1, 37), (2, 50)])
+def test_neighbours_match_brute_force(write_model, workers, tile_size):
+    _, item_path = write_model(num_items=200)
+    neighbours, similarities = build_similar_items(item_path, top_m=8, block_size=30,
+                                                   tile_size=tile_size, workers=workers)
+    expected, cosine = brute_force(item_path, 8)
+
+    assert neighbours.shape == similarities.shape == (200, 8)
+    for row in range(200):
+        # Un ítem no es vecino de sí mismo y las similitudes van en orden descendente
+        assert row not in neighbours[row]
+        assert np.all(np.diff(similarities[row]) <= 1e-6)
+        np.testing.assert_allclose(similarities[row], cosine[row, expected[row]], atol=1e-5)
+        np.testing.assert_allclose(cosine[row, neighbours[row]], similarities[row], atol=1e-5)
+
+
+def test_top_m_is_capped_by_catalogue(write_model):
+    _, item_path = write_model(num_items=5)
+    neighbours, _ = build_similar_items(item_path, top_m=20, workers=1)
+    assert neighbours.shape == (5, 4)
+
+
+@pytest.fixture
+def table(write_model, tmp_path):
+    _, item_path = write_model(num_items=50)
+    path = str(tmp_path / 'similar_items.bin')
+    save_similar_items(path, *build_similar_items(item_path, top_m=5, workers=1), item_path)
+    return SimilarItems(path), item_path
+
+
+def test_row(table):
+    table, _ = table
+    assert (len(table), table.top_m) == (50, 5)
+    rows, similarities = table.row(3)
+    assert len(rows) == len(similarities) == 5
+    np.testing.assert_array_equal(table.row(3, 2)[0], rows[:2])
+    # Más de top_m: se devuelven los guardados
+    assert len(table.row(3, 50)[0]) == 5
+
+
+@pytest.mark.parametrize('top_k', [0, -2])
+def test_row_rejects_non_positive_top_k(table, top_k):
+    table, _ = table
+    with pytest.raises(ValueError):
+        table.row(0, top_k)
+
+
+def test_engine_serves_and_validates_table(table, write_model, capsys):
+    table, item_path = table
+    user_path = item_path.replace('item_', 'user_')
+    engine = ScoringEngine(user_path, item_path, similar_items=table)
+
+    similar = engine.get_similar_items('item_3', 2)
+    rows, similarities = table.row(3, 2)
+    assert [entry['item_id'] for entry in similar] == [f'item_{row}' for row in rows]
+    assert [entry['similarity'] for entry in similar] == pytest.approx(similarities.tolist())
+    assert engine.get_similar_items('desconocido') == []
+
+    # Reentrenar con el mismo catálogo deja la tabla obsoleta
+    write_model(num_items=50, seed=1)
+    engine = ScoringEngine(user_path, item_path, similar_items=table)
+    assert engine.similar_items is None
+    assert engine.get_similar_items('item_3') is None
+    assert 'ADVERTENCIA' in capsys.readouterr().out
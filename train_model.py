@@ -1,109 +1,313 @@
 import json
+import argparse
 import numpy as np
-import pandas as pd
 from scipy.sparse import csr_matrix
 from implicit.als import AlternatingLeastSquares
 from implicit.nearest_neighbours import bm25_weight
 import os
+import shutil
+import tempfile
+import embedding_io
+from atomic_file import atomic_write
+from fold_in import FoldInSolver
+from ingest import stream_interactions
+from model_registry import CHECKPOINT_FILE, current_version, publish_version
+from seen_items import SEEN_FILE, save_seen_items
 
-def load_data(filepath):
-    """Carga los datos del archivo JSON"""
-    reviews = []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            reviews.append(json.loads(line))
-    return pd.DataFrame(reviews)
+TIME_FIELD = 'unixReviewTime'
+# Archivos que describe el checkpoint (con su huella, para detectar mezclas)
+MODEL_FILES = ('user_embeddings.bin', 'item_embeddings.bin', SEEN_FILE)
 
-def prepare_data(df):
+# Hiperparámetros por defecto (el bloque "training" de config.json los sustituye)
+DEFAULT_TRAINING = {
+    'factors': 50,
+    'iterations': 15,
+    'regularization': 0.01,
+    'bm25_k1': 100,
+    'bm25_b': 0.8
+}
+
+def load_data(filepath, chunk_size=100_000):
+    """Carga las interacciones del archivo JSON (.json o .json.gz) por bloques"""
+    return stream_interactions(filepath, chunk_size=chunk_size, time_field=TIME_FIELD)
+
+def prepare_data(interactions):
     """Prepara los datos para el modelo"""
-    # Filtrar solo las columnas necesarias
-    df = df[['reviewerID', 'asin', 'overall']].copy()
-    
-    # Crear índices numéricos para usuarios e ítems
-    df['user_idx'] = df['reviewerID'].astype('category').cat.codes
-    df['item_idx'] = df['asin'].astype('category').cat.codes
-    
     # Mapeo de índices a IDs originales
-    user_mapping = dict(enumerate(df['reviewerID'].astype('category').cat.categories))
-    item_mapping = dict(enumerate(df['asin'].astype('category').cat.categories))
+    user_mapping = interactions.user_ids
+    item_mapping = interactions.item_ids
     
     # Crear matriz usuario-ítem
-    ratings = csr_matrix((df['overall'], (df['user_idx'], df['item_idx'])))
+    ratings = interactions.to_csr()
     
     return ratings, user_mapping, item_mapping
 
-def train_model(ratings, factors=50, iterations=15):
-    """Entrena el modelo ALS"""
+def load_training_config(config_path='config.json'):
+    """Hiperparámetros del bloque "training" de config.json (o los por defecto)"""
+    training = dict(DEFAULT_TRAINING)
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            training.update(json.load(f).get('training', {}))
+    return training
+
+def train_model(ratings, factors=50, iterations=15, regularization=0.01, K1=100, B=0.8,
+                num_threads=0):
+    """Entrena el modelo ALS (`num_threads=0` usa todos los núcleos)"""
     # Ponderar las calificaciones con BM25
-    ratings = bm25_weight(ratings, K1=100, B=0.8)
+    ratings = bm25_weight(ratings, K1=K1, B=B).tocsr()
     
     # Crear y entrenar el modelo
     model = AlternatingLeastSquares(
         factors=factors,
         iterations=iterations,
+        regularization=regularization,
         calculate_training_loss=True,
+        num_threads=num_threads,
         random_state=42
     )
     
     model.fit(ratings)
     return model
 
-def save_embeddings(model, user_mapping, item_mapping, output_dir='models'):
-    """Guarda los embeddings en formato binario"""
+def save_embeddings(model, user_mapping, item_mapping, output_dir='models', dtype='float32'):
+    """Guarda los embeddings en formato binario ('float32', 'float16' o 'int8')"""
     os.makedirs(output_dir, exist_ok=True)
     
     # Guardar embeddings de usuarios
-    with open(os.path.join(output_dir, 'user_embeddings.bin'), 'wb') as f:
-        # Número de usuarios y dimensión
-        num_users = len(user_mapping)
-        dim = model.user_factors.shape[1]
-        f.write(np.int32(num_users).tobytes())
-        f.write(np.int32(dim).tobytes())
-        
-        # Guardar mapeo de usuarios
-        for idx in range(num_users):
-            user_id = user_mapping[idx].encode('utf-8')
-            f.write(np.int32(len(user_id)).tobytes())
-            f.write(user_id)
-        
-        # Guardar embeddings
-        model.user_factors.astype(np.float32).tofile(f)
+    user_ids = [user_mapping[idx] for idx in range(len(user_mapping))]
+    embedding_io.save_embeddings(os.path.join(output_dir, 'user_embeddings.bin'),
+                                 model.user_factors, user_ids, dtype=dtype)
     
     # Guardar embeddings de ítems
-    with open(os.path.join(output_dir, 'item_embeddings.bin'), 'wb') as f:
-        # Número de ítems y dimensión
-        num_items = len(item_mapping)
-        dim = model.item_factors.shape[1]
-        f.write(np.int32(num_items).tobytes())
-        f.write(np.int32(dim).tobytes())
-        
-        # Guardar mapeo de ítems
-        for idx in range(num_items):
-            item_id = item_mapping[idx].encode('utf-8')
-            f.write(np.int32(len(item_id)).tobytes())
-            f.write(item_id)
+    item_ids = [item_mapping[idx] for idx in range(len(item_mapping))]
+    embedding_io.save_embeddings(os.path.join(output_dir, 'item_embeddings.bin'),
+                                 model.item_factors, item_ids, dtype=dtype)
+
+def load_checkpoint(output_dir='models'):
+    """Lee el checkpoint del último entrenamiento (o None si no existe)"""
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_checkpoint(checkpoint, output_dir='models'):
+    """Guarda el checkpoint de forma atómica con la huella de los archivos del modelo"""
+    checkpoint = dict(checkpoint, files={
+        name: embedding_io.file_fingerprint(os.path.join(output_dir, name))
+        for name in MODEL_FILES if os.path.exists(os.path.join(output_dir, name))
+    })
+    with atomic_write(os.path.join(output_dir, CHECKPOINT_FILE), 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=4)
+    return checkpoint
+
+def verify_checkpoint(checkpoint, output_dir='models'):
+    """Comprueba que los archivos de `output_dir` son los que describe el checkpoint"""
+    for name, fingerprint in checkpoint.get('files', {}).items():
+        path = os.path.join(output_dir, name)
+        if not os.path.exists(path) or embedding_io.file_fingerprint(path) != fingerprint:
+            raise ValueError(f"{path} no corresponde al checkpoint (¿actualización "
+                             "interrumpida?): ejecuta un entrenamiento completo")
+
+def save_trained_model(model, interactions, ratings, output_dir='models', dtype='float32'):
+    """Guarda un entrenamiento completo: embeddings, ítems vistos y checkpoint"""
+    save_embeddings(model, interactions.user_ids, interactions.item_ids, output_dir, dtype)
+    save_seen_items(os.path.join(output_dir, SEEN_FILE), ratings)
+    previous = load_checkpoint(output_dir)
+    save_checkpoint({
+        'version': previous['version'] + 1 if previous else 1,
+        'last_timestamp': int(interactions.timestamps.max()) if len(interactions) else 0,
+        'num_interactions': len(interactions),
+        'pending_interactions': 0
+    }, output_dir)
+
+def _extend_ids(known_ids, new_ids):
+    """Añade a `known_ids` los IDs nuevos y devuelve el mapeo código -> fila"""
+    index = {item_id: row for row, item_id in enumerate(known_ids)}
+    rows = np.empty(len(new_ids), dtype=np.int64)
+    for code, item_id in enumerate(new_ids):
+        row = index.get(item_id)
+        if row is None:
+            row = index[item_id] = len(known_ids)
+            known_ids.append(item_id)
+        rows[code] = row
+    return rows
+
+def _publish_files(stage_dir, output_dir):
+    """Mueve los archivos preparados a `output_dir`, con el checkpoint al final"""
+    names = sorted(os.listdir(stage_dir), key=lambda name: name == CHECKPOINT_FILE)
+    for name in names:
+        # os.replace conserva las fechas: el .idx sigue siendo posterior a su .bin
+        os.replace(os.path.join(stage_dir, name), os.path.join(output_dir, name))
+
+def train_incremental(data_path, output_dir='models', drift_threshold=0.1, sweeps=3,
+                      regularization=0.01, dtype='float32', K1=100, B=0.8, registry_dir=None):
+    """Actualiza el modelo existente con las interacciones posteriores al checkpoint.
+    
+    Los usuarios e ítems nuevos se incorporan con un fold-in de mínimos
+    cuadrados contra los factores congelados del otro lado. Solo si las
+    interacciones acumuladas desde el último ALS superan `drift_threshold`
+    (como fracción del total) se ejecutan `sweeps` iteraciones de ALS
+    partiendo de los factores actuales.
+    
+    El historial se relee completo: los pesos BM25 dependen de la
+    frecuencia de cada ítem y de la longitud de cada fila en todo el
+    historial, el fold-in de un ítem nuevo necesita todos sus usuarios, y
+    tanto las iteraciones de ALS como seen_items.bin usan la matriz entera.
+    Del checkpoint solo se toma qué interacciones son nuevas.
+    
+    La nueva versión se escribe entera en un directorio temporal. Con
+    `registry_dir` parte de la versión activa del registro y se publica
+    como versión nueva (un solo cambio de CURRENT); si no, los archivos
+    se mueven a `output_dir` con el checkpoint al final.
+    """
+    base_dir = output_dir
+    if registry_dir is not None:
+        version = current_version(registry_dir)
+        if version is None:
+            raise FileNotFoundError(f"No hay ninguna versión activa en {registry_dir}")
+        base_dir = os.path.join(registry_dir, version)
+    
+    checkpoint = load_checkpoint(base_dir)
+    if checkpoint is None:
+        raise FileNotFoundError("No hay checkpoint: ejecuta primero un entrenamiento completo")
+    verify_checkpoint(checkpoint, base_dir)
+    
+    user_path = os.path.join(base_dir, 'user_embeddings.bin')
+    item_path = os.path.join(base_dir, 'item_embeddings.bin')
+    user_ids, user_factors = embedding_io.load_embeddings(user_path)
+    item_ids, item_factors = embedding_io.load_embeddings(item_path)
+    user_ids, item_ids = list(user_ids), list(item_ids)
+    num_old_users, num_old_items = len(user_ids), len(item_ids)
+    
+    print("Cargando datos...")
+    interactions = load_data(data_path)
+    is_new = interactions.timestamps > checkpoint['last_timestamp']
+    num_new = int(is_new.sum())
+    if num_new == 0:
+        print("No hay interacciones nuevas desde el último checkpoint")
+        return checkpoint
+    
+    # Filas del modelo para cada usuario/ítem (los nuevos se añaden al final)
+    user_rows = _extend_ids(user_ids, interactions.user_ids)
+    item_rows = _extend_ids(item_ids, interactions.item_ids)
+    ratings = csr_matrix(
+        (interactions.ratings, (user_rows[interactions.user_codes], item_rows[interactions.item_codes])),
+        shape=(len(user_ids), len(item_ids))
+    )
+    weighted = bm25_weight(ratings, K1=K1, B=B).tocsr().astype(np.float32)
+    
+    new_users = np.arange(num_old_users, len(user_ids))
+    new_items = np.arange(num_old_items, len(item_ids))
+    print(f"{num_new} interacciones nuevas, {len(new_users)} usuarios y {len(new_items)} ítems nuevos")
+    
+    # Fold-in: usuarios nuevos contra los ítems existentes (los nuevos aún valen 0)
+    dim = item_factors.shape[1]
+    item_factors = np.vstack([item_factors, np.zeros((len(new_items), dim), dtype=np.float32)])
+    user_factors = np.vstack([
+        user_factors,
+        FoldInSolver(item_factors, regularization).solve_rows(weighted, new_users)
+    ])
+    # ... e ítems nuevos contra todos los usuarios
+    item_factors[new_items] = FoldInSolver(user_factors, regularization).solve_rows(
+        weighted.T.tocsr(), new_items)
+    
+    # Unas pocas iteraciones de ALS en caliente si la deriva es grande
+    pending = checkpoint.get('pending_interactions', 0) + num_new
+    drift = pending / max(checkpoint['num_interactions'], 1)
+    if drift > drift_threshold:
+        print(f"Deriva {drift:.1%} > {drift_threshold:.1%}: {sweeps} iteraciones de ALS en caliente...")
+        model = AlternatingLeastSquares(
+            factors=dim,
+            regularization=regularization,
+            iterations=sweeps,
+            random_state=42
+        )
+        model.user_factors = np.ascontiguousarray(user_factors, dtype=np.float32)
+        model.item_factors = np.ascontiguousarray(item_factors, dtype=np.float32)
+        model.fit(weighted)
+        user_factors, item_factors = model.user_factors, model.item_factors
+        pending = 0
+    else:
+        print(f"Deriva {drift:.1%} <= {drift_threshold:.1%}: solo fold-in")
+    
+    # Preparar la nueva versión completa antes de publicar nada
+    publish_dir = registry_dir if registry_dir is not None else output_dir
+    os.makedirs(publish_dir, exist_ok=True)
+    stage_dir = tempfile.mkdtemp(prefix='.incremental-', dir=publish_dir)
+    try:
+        embedding_io.save_embeddings(os.path.join(stage_dir, 'user_embeddings.bin'),
+                                     user_factors, user_ids, dtype=dtype)
+        embedding_io.save_embeddings(os.path.join(stage_dir, 'item_embeddings.bin'),
+                                     item_factors, item_ids, dtype=dtype)
+        save_seen_items(os.path.join(stage_dir, SEEN_FILE), ratings)
+        checkpoint = save_checkpoint({
+            'version': checkpoint['version'] + 1,
+            'last_timestamp': int(interactions.timestamps.max()),
+            'num_interactions': len(interactions),
+            'pending_interactions': pending
+        }, stage_dir)
         
-        # Guardar embeddings
-        model.item_factors.astype(np.float32).tofile(f)
+        if registry_dir is not None:
+            checkpoint['registry_version'] = publish_version(stage_dir, registry_dir)
+        else:
+            _publish_files(stage_dir, output_dir)
+    finally:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+    return checkpoint
 
 def main():
+    parser = argparse.ArgumentParser(description='Entrena el modelo ALS')
+    parser.add_argument('--data', default=os.path.join(
+        'data', 'Magazine_Subscriptions_5.json', 'Magazine_Subscriptions_5.json'))
+    parser.add_argument('--output-dir', default='models')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Actualiza el modelo existente con las interacciones nuevas')
+    parser.add_argument('--drift-threshold', type=float, default=0.1,
+                        help='Fracción de interacciones nuevas que dispara ALS en caliente')
+    parser.add_argument('--sweeps', type=int, default=3,
+                        help='Iteraciones de ALS en caliente en modo incremental')
+    parser.add_argument('--dtype', choices=list(embedding_io.STORAGE_DTYPES), default='float32',
+                        help='Tipo de almacenamiento de los embeddings exportados')
+    parser.add_argument('--config', default='config.json',
+                        help='Archivo con los hiperparámetros en el bloque "training"')
+    parser.add_argument('--registry', default=None,
+                        help='En modo incremental, parte de la versión activa de este '
+                             'registro y publica el resultado como versión nueva')
+    args = parser.parse_args()
+    training = load_training_config(args.config)
+    
+    if args.incremental:
+        checkpoint = train_incremental(args.data, args.output_dir,
+                                       args.drift_threshold, args.sweeps,
+                                       regularization=training['regularization'],
+                                       dtype=args.dtype, K1=training['bm25_k1'],
+                                       B=training['bm25_b'], registry_dir=args.registry)
+        print(f"Modelo actualizado a la versión {checkpoint['version']}")
+        if 'registry_version' in checkpoint:
+            print(f"Publicada en el registro como {checkpoint['registry_version']}")
+        return
+    
     # Rutas de los archivos
-    data_path = os.path.join('data', 'Magazine_Subscriptions_5.json', 'Magazine_Subscriptions_5.json')
+    data_path = args.data
     
     print("Cargando datos...")
-    df = load_data(data_path)
+    interactions = load_data(data_path)
     
     print("Preparando datos...")
-    ratings, user_mapping, item_mapping = prepare_data(df)
+    ratings, user_mapping, item_mapping = prepare_data(interactions)
     
     print(f"Entrenando modelo con {len(user_mapping)} usuarios y {len(item_mapping)} ítems...")
-    model = train_model(ratings)
+    model = train_model(ratings, factors=training['factors'],
+                        iterations=training['iterations'],
+                        regularization=training['regularization'],
+                        K1=training['bm25_k1'], B=training['bm25_b'])
     
     print("Guardando embeddings...")
-    save_embeddings(model, user_mapping, item_mapping)
+    save_trained_model(model, interactions, ratings, args.output_dir, args.dtype)
     
     print("¡Entrenamiento completado!")
-    print(f"Embeddings guardados en la carpeta 'models'")
+    print(f"Embeddings guardados en la carpeta '{args.output_dir}'")
 
 if __name__ == "__main__":
     main()
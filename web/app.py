@@ -1,7 +1,11 @@
 import os
+import re
 import json
+import time
 import subprocess
-from flask import Flask, render_template, request, jsonify
+import threading
+from contextlib import contextmanager
+from flask import Flask, Response, g, render_template, request, jsonify
 
 app = Flask(__name__)
 
@@ -11,6 +15,14 @@
 
 # Obtener la ruta base del proyecto
 BASE_DIR = pathlib.Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(BASE_DIR))
+
+from scoring_engine import ScoringEngine
+from result_cache import ResultCache, FileVersion
+from model_registry import ModelWatcher
+import metrics
+
+CONFIG_PATH = BASE_DIR / 'config.json'
 
 # Construir la ruta al ejecutable
 if sys.platform == 'win32':
@@ -27,59 +39,340 @@
 else:
     print(f"Ejecutable encontrado en: {RECOMMENDER_EXECUTABLE}")
 
+# Cargar configuración
+with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+    CONFIG = json.load(f)
+
+DEFAULT_TOP_K = CONFIG.get('recommendation', {}).get('top_k', 10)
+
+# Modo de servicio: 'engine' (en proceso), 'materialized' (en proceso, con los
+# usuarios conocidos servidos desde el top-K precalculado de
+# materialize_topk.py) o 'subprocess' (ejecutable C++)
+SERVING_MODE = os.environ.get(
+    'RECOMMENDER_MODE',
+    CONFIG.get('serving', {}).get('mode', 'engine')
+)
+ENGINE_MODES = ('engine', 'materialized')
+MATERIALIZED = SERVING_MODE == 'materialized'
+
+# Caché de resultados (clave: usuario, top_k y versión del modelo)
+SYSTEM_CONFIG = CONFIG.get('system', {})
+RESULT_CACHE = ResultCache(
+    max_size=SYSTEM_CONFIG.get('cache_size', 1000),
+    ttl=SYSTEM_CONFIG.get('cache_ttl')
+)
+MODEL_VERSION = FileVersion(
+    [BASE_DIR / path for path in CONFIG['model_paths'].values()] +
+    ([BASE_DIR / CONFIG['ann']['index_path']] if 'index_path' in CONFIG.get('ann', {}) else [])
+)
+
+def load_registry_engine(model_dir):
+    """Carga el motor de una versión del registro de modelos."""
+    with metrics.stage('model_load'):
+        return ScoringEngine.from_config(str(CONFIG_PATH), model_dir=model_dir,
+                                         materialized=MATERIALIZED)
+
+# Cargar los embeddings una sola vez al arrancar la aplicación. Con el
+# registro activado se sirve la versión de models/CURRENT y se cambia en
+# caliente cuando se publica otra.
+REGISTRY_CONFIG = CONFIG.get('registry', {})
+# Sin registro: el motor y la versión de los archivos con que se cargó. Se
+# sustituyen juntos (una sola tupla) cuando una recarga termina, nunca antes
+ENGINE_STATE = (None, None)
+ENGINE_LOCK = threading.Lock()
+WATCHER = None
+if SERVING_MODE in ENGINE_MODES:
+    try:
+        if REGISTRY_CONFIG.get('enabled', False):
+            WATCHER = ModelWatcher(
+                str(BASE_DIR / REGISTRY_CONFIG.get('path', 'models')),
+                load_registry_engine,
+                check_interval=REGISTRY_CONFIG.get('check_interval', 2.0),
+                warmup_queries=REGISTRY_CONFIG.get('warmup_queries', 8),
+                verify_checksums=REGISTRY_CONFIG.get('verify_checksums', True),
+                on_swap=lambda version: RESULT_CACHE.clear()
+            )
+            WATCHER.start()
+            with WATCHER.lease() as model:
+                print(f"Modelo {model.version} cargado: {len(model.engine.user_ids)} usuarios, "
+                      f"{len(model.engine.item_ids)} ítems")
+        else:
+            # La versión se lee antes de cargar: un cambio durante la carga
+            # provoca una recarga en lugar de pasar desapercibido
+            version, _ = MODEL_VERSION.current()
+            with metrics.stage('model_load'):
+                engine = ScoringEngine.from_config(str(CONFIG_PATH), materialized=MATERIALIZED)
+            ENGINE_STATE = (engine, version)
+            print(f"Motor en proceso cargado: {len(engine.user_ids)} usuarios, "
+                  f"{len(engine.item_ids)} ítems")
+    except Exception as e:
+        print(f"ADVERTENCIA: No se pudo cargar el motor en proceso: {e}")
+        print("Se usará el ejecutable C++ como alternativa.")
+        SERVING_MODE = 'subprocess'
+
+# Perfilador opcional de peticiones lentas (pilas en formato flame graph)
+METRICS_CONFIG = CONFIG.get('metrics', {})
+PROFILER = None
+if METRICS_CONFIG.get('profile_slow_requests', False):
+    PROFILER = metrics.SlowRequestProfiler(
+        threshold_ms=METRICS_CONFIG.get('slow_request_ms', 500),
+        interval_ms=METRICS_CONFIG.get('profile_interval_ms', 5),
+        output_dir=str(BASE_DIR / METRICS_CONFIG.get('profile_dir', 'profiles'))
+    )
+
+# Tiempos por etapa que el ejecutable C++ escribe en stderr
+TIMING_PATTERN = re.compile(r'timing load_ms=([\d.]+) recommend_ms=([\d.]+)')
+
+def current_engine():
+    """Devuelve el motor y la versión del modelo, recargándolo si cambió en disco.
+
+    Mientras se carga el motor nuevo las peticiones siguen usando el anterior
+    con su versión, así que la caché nunca guarda resultados antiguos con la
+    versión nueva. Si la carga falla se sigue sirviendo el motor anterior y se
+    reintenta con el siguiente cambio de los archivos.
+    """
+    global ENGINE_STATE
+    version, changed = MODEL_VERSION.current()
+    if changed:
+        with ENGINE_LOCK:
+            if ENGINE_STATE[1] != version:
+                print("Los embeddings cambiaron en disco; recargando el motor...")
+                try:
+                    with metrics.stage('model_load'):
+                        engine = ScoringEngine.from_config(str(CONFIG_PATH),
+                                                           materialized=MATERIALIZED)
+                except Exception as e:
+                    print(f"ADVERTENCIA: No se pudo recargar el motor: {e}")
+                else:
+                    ENGINE_STATE = (engine, version)
+                    RESULT_CACHE.clear()
+    return ENGINE_STATE
+
+@contextmanager
+def engine_lease():
+    """Motor y versión del modelo durante una petición.
+
+    Con el registro, la petición retiene su versión aunque se publique otra
+    mientras tanto.
+    """
+    if WATCHER is not None:
+        with WATCHER.lease() as model:
+            yield model.engine, model.version
+    else:
+        yield current_engine()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if PROFILER is not None:
+        PROFILER.begin()
+
+@app.after_request
+def record_request_metrics(response):
+    duration = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or 'unknown'
+    metrics.REQUEST_LATENCY.observe(duration, endpoint=endpoint)
+    metrics.REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    if response.status_code >= 500:
+        metrics.ERRORS.inc(endpoint=endpoint)
+    if PROFILER is not None:
+        path = PROFILER.end(duration, endpoint)
+        if path:
+            print(f"Petición lenta ({duration * 1000:.0f} ms), pilas guardadas en {path}")
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def read_json():
+    """Cuerpo JSON de la petición como dict (vacío si falta o no es un objeto)."""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else {}
+
+def parse_top_k(data, default):
+    """`top_k` de la petición como entero positivo (None si no es válido)."""
+    try:
+        top_k = int(data.get('top_k', default))
+    except (TypeError, ValueError):
+        return None
+    return top_k if top_k >= 1 else None
+
 @app.route('/api/recommend', methods=['POST'])
 def get_recommendation():
     try:
-        data = request.json
+        data = read_json()
         user_id = data.get('user_id')
+        # Historial opcional para usuarios que no están en el modelo (fold-in)
+        items = data.get('items')
+        ratings = data.get('ratings')
         
+        if not user_id and not items:
+            return jsonify({'error': 'Se requiere un ID de usuario o una lista de ítems'}), 400
+        if user_id is not None and not isinstance(user_id, str):
+            return jsonify({'error': 'user_id debe ser una cadena'}), 400
+
+        if items is not None and not isinstance(items, list):
+            return jsonify({'error': 'items debe ser una lista de IDs de ítems'}), 400
+        if ratings is not None and (
+                not isinstance(ratings, list) or len(ratings) != len(items or [])
+                or not all(isinstance(r, (int, float)) for r in ratings)):
+            return jsonify({'error': 'ratings debe tener una valoración numérica por ítem'}), 400
+
+        top_k = parse_top_k(data, DEFAULT_TOP_K)
+        if top_k is None:
+            return jsonify({'error': 'top_k debe ser un entero positivo'}), 400
+
+        if SERVING_MODE in ENGINE_MODES:
+            with engine_lease() as (engine, version):
+                key = (user_id, top_k, version)
+                if items:
+                    # El historial enviado forma parte de la clave
+                    key += (tuple(str(item) for item in items), tuple(ratings or ()))
+                recommendations = RESULT_CACHE.get(key)
+                if recommendations is None:
+                    recommendations = engine.get_recommendations(user_id, top_k, items, ratings)
+                    RESULT_CACHE.put(key, recommendations)
+
+            return jsonify({
+                'user_id': user_id,
+                'recommendations': recommendations
+            })
+
         if not user_id:
-            return jsonify({'error': 'Se requiere un ID de usuario'}), 400
+            return jsonify({
+                'error': 'Las recomendaciones a partir de ítems requieren el modo engine'
+            }), 503
+        return recommend_with_subprocess(user_id)
+        
+    except Exception as e:
+        import traceback
+        return jsonify({
+            'error': 'Error interno del servidor',
+            'details': str(e),
+            'traceback': traceback.format_exc()
+        }), 500
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def get_batch_recommendations():
+    try:
+        data = read_json()
+        user_ids = data.get('user_ids')
+
+        if not isinstance(user_ids, list) or not user_ids:
+            return jsonify({'error': 'Se requiere una lista de IDs de usuario'}), 400
+
+        if SERVING_MODE not in ENGINE_MODES:
+            return jsonify({
+                'error': 'Las recomendaciones por lotes requieren el modo engine'
+            }), 503
+
+        top_k = parse_top_k(data, DEFAULT_TOP_K)
+        if top_k is None:
+            return jsonify({'error': 'top_k debe ser un entero positivo'}), 400
+
+        with engine_lease() as (engine, _):
+            recommendations = engine.recommend_batch([str(u) for u in user_ids], top_k)
+        return jsonify({'recommendations': recommendations})
+
+    except Exception as e:
+        import traceback
+        return jsonify({
+            'error': 'Error interno del servidor',
+            'details': str(e),
+            'traceback': traceback.format_exc()
+        }), 500
+
+@app.route('/api/similar/<item_id>', methods=['GET'])
+def get_similar_items(item_id):
+    """Ítems parecidos a uno dado, leídos de la tabla precalculada."""
+    top_k = parse_top_k(request.args, DEFAULT_TOP_K)
+    if top_k is None:
+        return jsonify({'error': 'top_k debe ser un entero positivo'}), 400
+
+    if SERVING_MODE not in ENGINE_MODES:
+        return jsonify({'error': 'Los ítems similares requieren el modo engine'}), 503
+
+    with engine_lease() as (engine, _):
+        similar = engine.get_similar_items(item_id, top_k)
+    if similar is None:
+        return jsonify({
+            'error': 'No hay tabla de ítems similares; ejecuta similar_items.py'
+        }), 503
+
+    return jsonify({'item_id': item_id, 'similar_items': similar})
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(RESULT_CACHE.stats())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Métricas en formato de texto de Prometheus."""
+    cache = RESULT_CACHE.stats()
+    text = metrics.render({
+        'recommender_cache_size': cache['size'],
+        'recommender_cache_hits': cache['hits'],
+        'recommender_cache_misses': cache['misses'],
+        'recommender_cache_evictions': cache['evictions']
+    })
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+def recommend_with_subprocess(user_id):
+    """Obtiene las recomendaciones ejecutando el motor C++ en un proceso hijo."""
+    # Verificar que el ejecutable existe
+    if not os.path.exists(RECOMMENDER_EXECUTABLE):
+        return jsonify({
+            'error': 'Motor de recomendaciones no encontrado',
+            'path': RECOMMENDER_EXECUTABLE
+        }), 500
         
-        # Verificar que el ejecutable existe
-        if not os.path.exists(RECOMMENDER_EXECUTABLE):
+    print(f"Ejecutando: {RECOMMENDER_EXECUTABLE} {user_id}")
+    
+    # Ejecutar el motor de recomendaciones
+    try:
+        start = time.perf_counter()
+        result = subprocess.run(
+            [RECOMMENDER_EXECUTABLE, user_id],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(RECOMMENDER_EXECUTABLE)  # Ejecutar desde el directorio del ejecutable
+        )
+        elapsed = time.perf_counter() - start
+
+        # Repartir el tiempo total entre arranque, carga del modelo y puntuación
+        timing = TIMING_PATTERN.search(result.stderr)
+        if timing:
+            load, recommend = float(timing.group(1)) / 1000, float(timing.group(2)) / 1000
+            metrics.observe_stage('model_load', load)
+            metrics.observe_stage('scoring', recommend)
+            metrics.observe_stage('spawn', max(elapsed - load - recommend, 0.0))
+        else:
+            metrics.observe_stage('spawn', elapsed)
+        
+        print(f"Salida estándar: {result.stdout}")
+        print(f"Error estándar: {result.stderr}")
+        print(f"Código de salida: {result.returncode}")
+        
+        if result.returncode != 0:
             return jsonify({
-                'error': 'Motor de recomendaciones no encontrado',
-                'path': RECOMMENDER_EXECUTABLE
+                'error': 'Error al ejecutar el motor de recomendaciones',
+                'details': result.stderr,
+                'returncode': result.returncode
             }), 500
-            
-        print(f"Ejecutando: {RECOMMENDER_EXECUTABLE} {user_id}")
         
-        # Ejecutar el motor de recomendaciones
-        try:
-            result = subprocess.run(
-                [RECOMMENDER_EXECUTABLE, user_id],
-                capture_output=True,
-                text=True,
-                cwd=os.path.dirname(RECOMMENDER_EXECUTABLE)  # Ejecutar desde el directorio del ejecutable
-            )
-            
-            print(f"Salida estándar: {result.stdout}")
-            print(f"Error estándar: {result.stderr}")
-            print(f"Código de salida: {result.returncode}")
-            
-            if result.returncode != 0:
-                return jsonify({
-                    'error': 'Error al ejecutar el motor de recomendaciones',
-                    'details': result.stderr,
-                    'returncode': result.returncode
-                }), 500
+        # Procesar la salida
+        if not result.stdout.strip():
+            return jsonify({
+                'error': 'El motor no devolvió ningún resultado',
+                'user_id': user_id,
+                'recommendations': []
+            })
             
-            # Procesar la salida
-            if not result.stdout.strip():
-                return jsonify({
-                    'error': 'El motor no devolvió ningún resultado',
-                    'user_id': user_id,
-                    'recommendations': []
-                })
-                
+        with metrics.stage('parse_output'):
             lines = result.stdout.strip().split('\n')
             print(f"Líneas de salida: {lines}")
-            
+
             # Buscar recomendaciones (pueden comenzar con '-' o con otro formato)
             recommendations = []
             for line in lines:
@@ -88,28 +381,20 @@ def get_recommendation():
                     recommendations.append(line[2:].strip())
                 elif line and not line.startswith('Recommendations for user'):
                     recommendations.append(line)
-            
-            print(f"Recomendaciones procesadas: {recommendations}")
-            
-            return jsonify({
-                'user_id': user_id,
-                'recommendations': recommendations
-            })
-            
-        except subprocess.CalledProcessError as e:
-            return jsonify({
-                'error': 'Error al ejecutar el motor',
-                'details': str(e),
-                'output': e.output,
-                'stderr': e.stderr if hasattr(e, 'stderr') else ''
-            }), 500
         
-    except Exception as e:
-        import traceback
+        print(f"Recomendaciones procesadas: {recommendations}")
+        
         return jsonify({
-            'error': 'Error interno del servidor',
+            'user_id': user_id,
+            'recommendations': recommendations
+        })
+        
+    except subprocess.CalledProcessError as e:
+        return jsonify({
+            'error': 'Error al ejecutar el motor',
             'details': str(e),
-            'traceback': traceback.format_exc()
+            'output': e.output,
+            'stderr': e.stderr if hasattr(e, 'stderr') else ''
         }), 500
 
 if __name__ == '__main__':
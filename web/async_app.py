@@ -0,0 +1,264 @@
+import os
+import re
+import sys
+import json
+import time
+import pathlib
+import asyncio
+import argparse
+
+from aiohttp import web
+
+# Obtener la ruta base del proyecto
+BASE_DIR = pathlib.Path(__file__).parent.parent.absolute()
+WEB_DIR = pathlib.Path(__file__).parent.absolute()
+sys.path.insert(0, str(BASE_DIR))
+
+from scoring_engine import ScoringEngine
+from micro_batcher import MicroBatcher
+from result_cache import ResultCache
+from model_registry import ModelWatcher
+import metrics
+
+CONFIG_PATH = BASE_DIR / 'config.json'
+
+# Servidor asíncrono alternativo a app.py: las peticiones concurrentes a
+# /api/recommend se agrupan durante unos milisegundos y se puntúan juntas
+# con un único producto de matrices contra los embeddings de ítems.
+
+
+def render_index():
+    """index.html con las rutas estáticas resueltas (sin Jinja)."""
+    html = (WEB_DIR / 'templates' / 'index.html').read_text(encoding='utf-8')
+    return re.sub(r"\{\{\s*url_for\('static',\s*filename='([^']+)'\)\s*\}\}",
+                  r'/static/\1', html)
+
+
+def _endpoint(request):
+    """Nombre del endpoint como en Flask: el del handler, 'static' o 'unknown'."""
+    match_info = request.match_info
+    if match_info.http_exception is not None:
+        return 'unknown'
+    if isinstance(match_info.route.resource, web.StaticResource):
+        return 'static'
+    return match_info.handler.__name__
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    """Latencia, peticiones y errores por endpoint (las mismas series que app.py)."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        endpoint = _endpoint(request)
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+        metrics.REQUESTS.inc(endpoint=endpoint, status=status)
+        if status >= 500:
+            metrics.ERRORS.inc(endpoint=endpoint)
+
+
+async def index(request):
+    return web.Response(text=request.app['index_html'], content_type='text/html')
+
+
+async def read_json(request):
+    """Cuerpo JSON de la petición como dict (vacío si falta o no es un objeto)."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def parse_top_k(data, default):
+    """`top_k` de la petición como entero positivo (None si no es válido)."""
+    try:
+        top_k = int(data.get('top_k', default))
+    except (TypeError, ValueError):
+        return None
+    return top_k if top_k >= 1 else None
+
+
+async def get_recommendation(request):
+    data = await read_json(request)
+
+    user_id = data.get('user_id')
+    # Historial opcional para usuarios que no están en el modelo (fold-in)
+    items = data.get('items')
+    ratings = data.get('ratings')
+    if not user_id and not items:
+        return web.json_response(
+            {'error': 'Se requiere un ID de usuario o una lista de ítems'}, status=400)
+    if user_id is not None and not isinstance(user_id, str):
+        return web.json_response({'error': 'user_id debe ser una cadena'}, status=400)
+
+    if items is not None and not isinstance(items, list):
+        return web.json_response({'error': 'items debe ser una lista de IDs de ítems'}, status=400)
+    if ratings is not None and (
+            not isinstance(ratings, list) or len(ratings) != len(items or [])
+            or not all(isinstance(r, (int, float)) for r in ratings)):
+        return web.json_response(
+            {'error': 'ratings debe tener una valoración numérica por ítem'}, status=400)
+
+    top_k = parse_top_k(data, request.app['default_top_k'])
+    if top_k is None:
+        return web.json_response({'error': 'top_k debe ser un entero positivo'}, status=400)
+
+    cache = request.app['cache']
+    key = (user_id, top_k)
+    if items:
+        key += (tuple(str(item) for item in items), tuple(ratings or ()))
+    recommendations = cache.get(key)
+    if recommendations is None:
+        if items:
+            # Con historial no se agrupa: el fold-in es un sistema dim x dim por petición
+            recommendations = await asyncio.get_running_loop().run_in_executor(
+                None, request.app['recommend_items'], user_id, items, ratings, top_k)
+        else:
+            recommendations = await request.app['batcher'].submit(user_id, top_k)
+        cache.put(key, recommendations)
+
+    return web.json_response({'user_id': user_id, 'recommendations': recommendations})
+
+
+async def get_batch_recommendations(request):
+    data = await read_json(request)
+    user_ids = data.get('user_ids')
+    if not isinstance(user_ids, list) or not user_ids:
+        return web.json_response({'error': 'Se requiere una lista de IDs de usuario'}, status=400)
+
+    top_k = parse_top_k(data, request.app['default_top_k'])
+    if top_k is None:
+        return web.json_response({'error': 'top_k debe ser un entero positivo'}, status=400)
+    results = await asyncio.get_running_loop().run_in_executor(
+        None, request.app['score_batch'], [str(u) for u in user_ids], top_k)
+    return web.json_response({'recommendations': results})
+
+
+async def get_similar_items(request):
+    top_k = parse_top_k(request.query, request.app['default_top_k'])
+    if top_k is None:
+        return web.json_response({'error': 'top_k debe ser un entero positivo'}, status=400)
+
+    item_id = request.match_info['item_id']
+    similar = request.app['similar_items'](item_id, top_k)
+    if similar is None:
+        return web.json_response(
+            {'error': 'No hay tabla de ítems similares; ejecuta similar_items.py'}, status=503)
+    return web.json_response({'item_id': item_id, 'similar_items': similar})
+
+
+async def get_batcher_stats(request):
+    batcher = request.app['batcher']
+    return web.json_response({
+        'batches': batcher.batches,
+        'requests': batcher.requests,
+        'mean_batch_size': batcher.requests / batcher.batches if batcher.batches else 0.0,
+        'max_batch_size': batcher.max_batch_size,
+        'max_wait_ms': batcher.max_wait * 1000,
+        'cache': request.app['cache'].stats()
+    })
+
+
+async def get_metrics(request):
+    cache = request.app['cache'].stats()
+    text = metrics.render({
+        'recommender_cache_size': cache['size'],
+        'recommender_cache_hits': cache['hits'],
+        'recommender_cache_misses': cache['misses'],
+        'recommender_cache_evictions': cache['evictions']
+    })
+    return web.Response(text=text, content_type='text/plain')
+
+
+def create_app(config_path=CONFIG_PATH):
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    serving = config.get('serving', {})
+    system = config.get('system', {})
+
+    registry = config.get('registry', {})
+    # Con el modo 'materialized' los usuarios conocidos se leen del top-K precalculado
+    materialized = serving.get('mode') == 'materialized'
+    app = web.Application(middlewares=[metrics_middleware])
+    app['cache'] = ResultCache(system.get('cache_size', 1000), system.get('cache_ttl'))
+
+    if registry.get('enabled', False):
+        # Versión del registro con cambio en caliente; cada lote retiene la suya
+        watcher = ModelWatcher(
+            str(pathlib.Path(config_path).parent / registry.get('path', 'models')),
+            lambda model_dir: ScoringEngine.from_config(str(config_path), model_dir=model_dir,
+                                                        materialized=materialized),
+            check_interval=registry.get('check_interval', 2.0),
+            warmup_queries=registry.get('warmup_queries', 8),
+            verify_checksums=registry.get('verify_checksums', True),
+            on_swap=lambda version: app['cache'].clear()
+        )
+        watcher.start()
+        print(f"Modelo {watcher.version} cargado desde el registro")
+
+        def score_batch(user_ids, top_k):
+            with watcher.lease() as model:
+                return model.engine.recommend_batch(user_ids, top_k)
+
+        def similar_items(item_id, top_k):
+            with watcher.lease() as model:
+                return model.engine.get_similar_items(item_id, top_k)
+
+        def recommend_items(user_id, items, ratings, top_k):
+            with watcher.lease() as model:
+                return model.engine.get_recommendations(user_id, top_k, items, ratings)
+    else:
+        engine = ScoringEngine.from_config(str(config_path), materialized=materialized)
+        print(f"Motor en proceso cargado: {len(engine.user_ids)} usuarios, "
+              f"{len(engine.item_ids)} ítems")
+        score_batch = engine.recommend_batch
+        similar_items = engine.get_similar_items
+
+        def recommend_items(user_id, items, ratings, top_k):
+            return engine.get_recommendations(user_id, top_k, items, ratings)
+
+    app['score_batch'] = score_batch
+    # Lectura de una fila mapeada: se responde sin pasar por el micro-batcher
+    app['similar_items'] = similar_items
+    app['recommend_items'] = recommend_items
+    app['default_top_k'] = config.get('recommendation', {}).get('top_k', 10)
+    app['index_html'] = render_index()
+    app['batcher'] = MicroBatcher(
+        score_batch,
+        max_batch_size=serving.get('max_batch_size', 64),
+        max_wait_ms=serving.get('max_wait_ms', 5)
+    )
+
+    async def start_batcher(app):
+        app['batcher'].start()
+
+    async def stop_batcher(app):
+        await app['batcher'].close()
+
+    app.on_startup.append(start_batcher)
+    app.on_cleanup.append(stop_batcher)
+
+    app.router.add_get('/', index)
+    app.router.add_post('/api/recommend', get_recommendation)
+    app.router.add_post('/api/recommend/batch', get_batch_recommendations)
+    app.router.add_get('/api/similar/{item_id}', get_similar_items)
+    app.router.add_get('/api/batcher/stats', get_batcher_stats)
+    app.router.add_get('/metrics', get_metrics)
+    app.router.add_static('/static/', WEB_DIR / 'static')
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor asíncrono con micro-batching')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)